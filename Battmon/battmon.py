@@ -16,10 +16,60 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-# local imports
-from values import help_and_values_parser
-from monitor import battery_monitor
+import sys
+import time
+
+# program start, for measuring time to first sample, wall clock like sample timestamps,
+# it's taken before local imports, so their cost is measured too
+startup_time = time.time()
+
+# local imports, other modules are imported only when their mode is used
+from values import help_and_values_parser, internal_config  # noqa: E402
 
 if __name__ == '__main__':
-    bt = battery_monitor.Monitor(**vars(help_and_values_parser.args))
+    options = vars(help_and_values_parser.parse_args())
+    instance_command = options.pop('instance_command')
+    # only talk to running instance
+    if instance_command:
+        from monitor import single_instance
+
+        if instance_command == single_instance.SUBSCRIBE_COMMAND:
+            running = False
+            for line in single_instance.subscribe():
+                running = True
+                print(line)
+                sys.stdout.flush()
+            if not running:
+                print("%s isn't running" % internal_config.PROGRAM_NAME)
+            sys.exit(0 if running else 1)
+        answer = single_instance.send_command(instance_command)
+        print(answer if answer is not None else "%s isn't running" % internal_config.PROGRAM_NAME)
+        sys.exit(0 if answer is not None else 1)
+    # only print battery health, running instance has the latest values
+    if options.pop('health'):
+        from monitor import single_instance
+
+        answer = single_instance.send_command('health')
+        if answer is None:
+            from values import battery_health
+
+            health = battery_health.BatteryHealth.load(internal_config.HEALTH_FILE_PATH)
+            answer = battery_health.format_report(health.report())
+        print(answer)
+        sys.exit(0)
+    # only write status lines for status bar
+    stream = options.pop('stream')
+    stream_template = options.pop('stream_template')
+    i3bar = options.pop('i3bar')
+    if stream:
+        from monitor import status_stream
+
+        status_stream.run_stream(stream_template, i3bar, options['battery_update_timeout'],
+                                 options['device_rescan_interval'], options['battery_critical_value'],
+                                 options['use_power_supply_events'])
+        sys.exit(0)
+
+    from monitor import battery_monitor
+
+    bt = battery_monitor.Monitor(startup_time=startup_time, **options)
     bt.run_main_loop()
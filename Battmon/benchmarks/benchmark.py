@@ -0,0 +1,227 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# local imports
+from values import formatting, internal_config, power_supply_sources, read_battery_values
+from monitor import battery_states, poll_scheduler
+from notifications import battery_notifications
+
+# most precise clock for measuring wall time
+_perf_counter = getattr(time, 'perf_counter', time.time)
+
+# supplies in synthetic sysfs, (device, type, uevent values), first n of them are used
+SUPPLIES = [
+    ('BAT0', 'Battery', {'PRESENT': 1, 'STATUS': 'Discharging', 'ENERGY_NOW': 30000000, 'ENERGY_FULL': 50000000,
+                         'POWER_NOW': 10000000, 'VOLTAGE_NOW': 11400000, 'CAPACITY': 60}),
+    ('AC', 'Mains', {'ONLINE': 0}),
+    ('BAT1', 'Battery', {'PRESENT': 1, 'STATUS': 'Unknown', 'CHARGE_NOW': 2000000, 'CHARGE_FULL': 4000000,
+                         'CURRENT_NOW': 0, 'VOLTAGE_NOW': 11100000, 'CAPACITY': 50}),
+    ('hidpp_battery_0', 'Battery', {'SCOPE': 'Device', 'PRESENT': 1, 'STATUS': 'Discharging', 'CAPACITY': 70}),
+    ('ucsi-source-psy-USBC000:001', 'USB', {'ONLINE': 0, 'USB_TYPE': 'C'}),
+    ('ucsi-source-psy-USBC000:002', 'USB', {'ONLINE': 0, 'USB_TYPE': 'C'}),
+    ('hid-keyboard-battery', 'Battery', {'SCOPE': 'Device', 'PRESENT': 1, 'STATUS': 'Discharging', 'CAPACITY': 40}),
+    ('ADP1', 'Mains', {'ONLINE': 0}),
+]
+
+# number of supplies benchmarked
+SUPPLY_COUNTS = (1, 2, 8)
+
+# battery levels used by state evaluation
+LOW_VALUE, CRITICAL_VALUE, MINIMAL_VALUE = 23, 7, 3
+
+
+# write synthetic sysfs directory with first count supplies
+def make_sysfs(path, count):
+    for device, device_type, values in SUPPLIES[:count]:
+        device_path = os.path.join(path, device)
+        os.makedirs(device_path)
+        with open(os.path.join(device_path, 'type'), 'w') as type_file:
+            type_file.write(device_type + '\n')
+        with open(os.path.join(device_path, 'uevent'), 'w') as uevent_file:
+            uevent_file.write('POWER_SUPPLY_NAME=%s\n' % device)
+            for key, value in sorted(values.items()):
+                uevent_file.write('POWER_SUPPLY_%s=%s\n' % (key, value))
+
+
+# source counting files opened and directories listed
+class CountingSource(power_supply_sources.SysfsSource):
+    def __init__(self, path):
+        power_supply_sources.SysfsSource.__init__(self, path)
+        self.opens = 0
+        self.listings = 0
+
+    def devices(self):
+        self.listings += 1
+        return power_supply_sources.SysfsSource.devices(self)
+
+    def read(self, device, name):
+        self.opens += 1
+        return power_supply_sources.SysfsSource.read(self, device, name)
+
+
+# read syscalls done by this process so far, None when /proc/self/io isn't available
+def read_syscalls():
+    try:
+        with open('/proc/self/io') as io:
+            for line in io:
+                if line.startswith('syscr:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+# benchmarked operations, name -> function(battery values, state machine, scheduler)
+def _state_evaluation(battery_values, state_machine, scheduler):
+    sample = battery_values.sample()
+    state_machine.update(sample)
+    return scheduler.interval(sample)
+
+
+def _legacy_condition(battery_values, state_machine, scheduler):
+    return not battery_values.is_ac_present() and battery_values.battery_current_capacity() > LOW_VALUE
+
+
+# remaining times in seconds, every call formats the next one, 10 hours in 7 second steps
+_remaining_times = itertools.cycle(range(0, 36000, 7))
+
+
+def _format_time(battery_values, state_machine, scheduler):
+    return formatting.format_time(next(_remaining_times))
+
+
+def _notification_body(battery_values, state_machine, scheduler):
+    return battery_notifications.CAPACITY_BODY.render(capacity=LOW_VALUE,
+                                                      time=formatting.format_time(next(_remaining_times)))
+
+
+OPERATIONS = [
+    ('is_battery_present', lambda values, machine, scheduler: values.is_battery_present()),
+    ('battery_current_capacity', lambda values, machine, scheduler: values.battery_current_capacity()),
+    ('battery_time', lambda values, machine, scheduler: values.battery_time()),
+    ('is_battery_discharging', lambda values, machine, scheduler: values.is_battery_discharging()),
+    ('legacy_low_level_condition', _legacy_condition),
+    ('state_evaluation', _state_evaluation),
+]
+
+
+# operations not reading batteries, measured once without supplies
+FORMATTING_OPERATIONS = [
+    ('format_time', _format_time),
+    ('notification_body', _notification_body),
+]
+
+
+# measure one operation, return dict of per call costs
+def measure(operation, source, rescan_interval, iterations):
+    battery_values = read_battery_values.BatteryValues(rescan_interval, source)
+    state_machine = battery_states.BatteryStateMachine(LOW_VALUE, CRITICAL_VALUE, MINIMAL_VALUE)
+    scheduler = poll_scheduler.AdaptiveScheduler([LOW_VALUE, CRITICAL_VALUE, MINIMAL_VALUE], 1, 120, 6)
+    # warm up, first call discovers devices
+    operation(battery_values, state_machine, scheduler)
+
+    # reading /proc/self/io costs syscalls too, measure it without operation and subtract
+    empty_syscalls = read_syscalls()
+    empty_syscalls = read_syscalls() - empty_syscalls if empty_syscalls is not None else None
+
+    source.opens = source.listings = 0
+    syscalls = read_syscalls()
+    start = _perf_counter()
+    for _ in range(iterations):
+        operation(battery_values, state_machine, scheduler)
+    wall_time = _perf_counter() - start
+    if syscalls is not None:
+        syscalls = float(read_syscalls() - syscalls - empty_syscalls) / iterations
+
+    result = {'wall_time_us': wall_time / iterations * 1000000,
+              'read_syscalls': syscalls,
+              'file_opens': float(source.opens) / iterations,
+              'directory_listings': float(source.listings) / iterations,
+              'allocated_bytes': None}
+
+    # separate pass, tracing makes everything slower
+    if tracemalloc is not None:
+        tracemalloc.start()
+        current = tracemalloc.get_traced_memory()[0]
+        operation(battery_values, state_machine, scheduler)
+        result['allocated_bytes'] = tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+    return result
+
+
+# run formatting operations and all other operations on 1, 2 and 8 supplies, return list of results
+def run_benchmark(iterations, rescan_interval):
+    results = []
+    for count in (0,) + SUPPLY_COUNTS:
+        path = tempfile.mkdtemp(prefix='battmon-sysfs-')
+        try:
+            make_sysfs(path, count)
+            for name, operation in (OPERATIONS if count else FORMATTING_OPERATIONS):
+                result = measure(operation, CountingSource(path), rescan_interval, iterations)
+                result.update({'supplies': count, 'operation': name})
+                results.append(result)
+        finally:
+            shutil.rmtree(path)
+    return results
+
+
+# print results as table
+def print_table(results):
+    print("%-8s %-28s %10s %8s %7s %9s %10s"
+          % ('supplies', 'operation', 'wall us', 'syscr', 'opens', 'listings', 'alloc B'))
+    for result in results:
+        print("%-8d %-28s %10.1f %8s %7.1f %9.2f %10s"
+              % (result['supplies'], result['operation'], result['wall_time_us'],
+                 '-' if result['read_syscalls'] is None else '%.1f' % result['read_syscalls'],
+                 result['file_opens'], result['directory_listings'],
+                 '-' if result['allocated_bytes'] is None else result['allocated_bytes']))
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Measure cost of Battmon battery reads and decisions on synthetic "
+                                             "sysfs, run from Battmon directory: python -m benchmarks.benchmark")
+    ap.add_argument("-n", "--iterations", type=int, default=2000, help="calls of every operation")
+    ap.add_argument("-ri", "--device-rescan-interval", type=int,
+                    default=internal_config.DEFAULT_DEVICE_RESCAN_INTERVAL,
+                    help="device rescan interval used by BatteryValues, 0 finds devices on every call")
+    ap.add_argument("-j", "--json", action="store_true", help="print results as json")
+    options = ap.parse_args()
+
+    benchmark_results = run_benchmark(options.iterations, options.device_rescan_interval)
+    if options.json:
+        json.dump({'version': internal_config.VERSION,
+                   'python': platform.python_version(),
+                   'iterations': options.iterations,
+                   'device_rescan_interval': options.device_rescan_interval,
+                   'results': benchmark_results}, sys.stdout, indent=1, sort_keys=True)
+        print('')
+    else:
+        print_table(benchmark_results)
@@ -21,12 +21,34 @@ from values import internal_config
 # example configuration file #
 ##############################
 
+# ini file with options, they are overwritten by command line parameters, changes of thresholds,
+# intervals, notifications and sounds are used by running battmon right away
+CONFIG_FILE_PATH = internal_config.DEFAULT_CONFIG_FILE_PATH
+
 # will be overwrite when command line parameter was given
 SCREEN_LOCK_COMMAND = ''
 
 # how oft update battery values in seconds
 BATTERY_UPDATE_INTERVAL = 6
 
+# bounds of adaptive update interval in seconds, battery is checked shortly before
+# next battery level value is reached, without power supply events always minimal interval is used
+BATTERY_MIN_UPDATE_INTERVAL = 1
+BATTERY_MAX_UPDATE_INTERVAL = 120
+
+# how oft look for added or removed batteries and ac adapters in seconds
+DEVICE_RESCAN_INTERVAL = internal_config.DEFAULT_DEVICE_RESCAN_INTERVAL
+
+# wake up right after ac or battery change instead of checking them every second
+USE_POWER_SUPPLY_EVENTS = True
+
+# keep battery history in binary ring file, see values/battery_history.py
+RECORD_HISTORY = False
+HISTORY_FILE_PATH = internal_config.DEFAULT_HISTORY_FILE_PATH
+
+# status line written with --stream, fields are: {capacity}, {status}, {time}, {power}, {source}
+STREAM_TEMPLATE = '{status} {capacity}% {time}'
+
 # battery low, critical and minimal values in percent
 BATTERY_LOW_LEVEL_VALUE = 23
 BATTERY_CRITICAL_LEVEL_VALUE = 7
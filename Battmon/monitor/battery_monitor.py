@@ -14,24 +14,48 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-from ctypes import cdll, c_char_p
 import os
-import subprocess
+import signal
 import sys
 import time
 
 # local imports
-from values import read_battery_values, internal_config
-from notifications import battery_notifications
+from values import ini_config, option_checks, program_index, read_battery_values, internal_config
+from notifications import battery_notifications, notification_dispatcher, notification_queue
+from monitor import battery_states, countdown, event_loop, poll_scheduler, single_instance
+
+# sound volume level of beeps before minimal battery level command
+ALARM_SOUND_VOLUME = 10
+
+# steps of minimal battery level countdown
+STEP_BEEP = 'beep'
+STEP_LAST_CHANCE = 'last_chance'
+STEP_RUN_COMMAND = 'run_command'
+STEP_TEST_COMMAND = 'test_command'
+STEP_START_OVER = 'start_over'
+
+# minimal battery level countdown, (seconds after minimal level was reached, step), beep 5 times every two
+# seconds, last chance popup, 4 more beeps and lock screen and run minimal battery level command
+MINIMAL_LEVEL_STEPS = ([(2 * i, STEP_BEEP) for i in range(1, 7)] + [(12, STEP_LAST_CHANCE)] +
+                       [(22 + 5 * i, STEP_BEEP) for i in range(1, 5)] +
+                       [(43, STEP_RUN_COMMAND), (43, STEP_START_OVER)])
+
+# the same in test mode, nothing is run
+TEST_MINIMAL_LEVEL_STEPS = ([(2 * i, STEP_BEEP) for i in range(5)] +
+                            [(10, STEP_TEST_COMMAND), (20, STEP_START_OVER)])
 
 
 # main class
 class Monitor(object):
     def __init__(self, debug=None, test=None, foreground=None, more_then_one_instance=None, lock_command=None,
                  disable_notifications=None, critical=None, sound_file=None, play_sound=None, sound_volume=None,
-                 timeout=None, battery_update_timeout=None, battery_low_value=None, battery_critical_value=None,
-                 battery_minimal_value=None, minimal_battery_level_command=None, set_no_battery_remainder=None,
-                 disable_startup_notifications=None):
+                 timeout=None, battery_update_timeout=None, battery_min_update_interval=None,
+                 battery_max_update_interval=None, device_rescan_interval=None, battery_low_value=None,
+                 battery_critical_value=None, battery_minimal_value=None, minimal_battery_level_command=None,
+                 set_no_battery_remainder=None, disable_startup_notifications=None, use_power_supply_events=None,
+                 record_history=None, history_file=None, config_file=None, startup_time=None, source=None,
+                 clock=None, sleep=None, dispatcher=None, health_file=internal_config.HEALTH_FILE_PATH,
+                 command_line_options=None, programs=None):
 
         # parameters
         self.__debug = debug
@@ -46,63 +70,108 @@ class Monitor(object):
         self.__sound_volume = sound_volume
         self.__timeout = timeout * 1000
         self.__battery_update_timeout = battery_update_timeout
+        self.__battery_min_update_interval = battery_min_update_interval
+        self.__battery_max_update_interval = battery_max_update_interval
+        self.__device_rescan_interval = device_rescan_interval
         self.__battery_low_value = battery_low_value
         self.__battery_critical_value = battery_critical_value
         self.__battery_minimal_value = battery_minimal_value
         self.__minimal_battery_level_command = minimal_battery_level_command
         self.__set_no_battery_remainder = set_no_battery_remainder
         self.__disable_startup_notifications = disable_startup_notifications
+        self.__use_power_supply_events = use_power_supply_events
+        self.__record_history = record_history
+        self.__history_file = history_file
+        self.__config_file = config_file
+        # options given in command line, they win over config file when it's read again
+        self.__command_line_options = dict(command_line_options or {})
+        # time when program was started, for measuring time to first sample
+        self.__startup_time = startup_time
+        self.__first_sample_delay = None
+        # power supplies are read from source (sysfs by default) and time goes by clock and sleep functions,
+        # simulation replaces them and dispatcher, so it runs the same checks as real monitor
+        self.__source = source
+        self.__dispatcher = dispatcher
+        # battery health file, empty keeps health only in memory
+        self.__health_file = health_file
+        # index of external programs, simulation passes one without cache file
+        self.__programs = programs
+
+        # set default arguments for debug
+        if self.__debug:
+            self.__disable_startup_notifications = False
+            self.__foreground = True
+            self.__show_only_critical = False
+            self.__disable_notifications = False
+
+        # set argument for startup notifications if notification is disabled
+        if self.__disable_notifications:
+            self.__disable_startup_notifications = True
+
+        # sound file path is compared with the one from changed config file
+        self.__sound_file = os.path.abspath(self.__sound_file)
+        if 'sound_file' in self.__command_line_options:
+            self.__command_line_options['sound_file'] = os.path.abspath(self.__command_line_options['sound_file'])
+
+        # run in background, before dependencies are probed and startup notifications are shown,
+        # launcher waits until we are ready and fails when we exit before
+        self.__daemon = None
+        if not self.__foreground:
+            from monitor import daemon
+
+            # daemon works in '/'
+            self.__history_file = os.path.abspath(self.__history_file)
+            self.__config_file = os.path.abspath(self.__config_file)
+            self.__daemon = daemon.daemonize(internal_config.LOG_FILE_PATH, internal_config.PID_FILE_PATH)
 
         # external programs
-        self.__current_program_path = ''
+        if self.__programs is None:
+            self.__programs = program_index.ProgramIndex()
         self.__found_notify_send_command = ''
-        self.__sound_player = ''
-        self.__sound_command = ''
+        self.__sound_player_path = ''
+        self.__sound_player = None
 
         # minimal battery command in short for notifying . eg 'HIBERNATE'
         self.__short_minimal_battery_command = ''
 
+        # instance socket, last sample and stop request for commands from other instances
+        self.__instance_server = None
+        self.__last_sample = None
+        self.__stop_requested = False
+        # power supply event came while waiting
+        self.__wake_up = False
+
         # initialize BatteryValues class instance
-        self.__battery_values = read_battery_values.BatteryValues()
+        self.__battery_values = read_battery_values.BatteryValues(self.__device_rescan_interval, self.__source, clock)
+
+        # timers, sounds and notifications run on event loop while waiting for next battery check
+        self.__event_loop = event_loop.EventLoop(clock, sleep)
 
-        # check if we can send notifications via notify-send
+        # check if we can send notifications over D-Bus or via notify-send
         self.__check_notify_send()
         # check play command and if file sounds are in PATH's
         self.__check_play()
-        self.__set_sound_file_and_volume()
+        self.__set_sound_player()
 
         # check if program already running otherwise set name
         if not self.__more_then_one_instance:
             self.__check_if_battmon_already_running()
 
-        # set Battmon process name
-        self.__set_proc_name(internal_config.PROGRAM_NAME)
-
-        # set default arguments for debug
-        if self.__debug:
-            self.__disable_startup_notifications = False
-            self.__foreground = True
-            self.__show_only_critical = False
-            self.__disable_notifications = False
-
-        # set argument for startup notifications if notification is disabled
-        if self.__disable_notifications:
-            self.__disable_startup_notifications = True
+        # set Battmon process name, simulated monitor doesn't take over process name and signals
+        if self.__source is None:
+            self.__set_proc_name(internal_config.PROGRAM_NAME)
 
         # set lock and min battery command
         self.__set_lock_command()
         self.__set_minimal_battery_level_command()
 
-        # initialize notification
+        # initialize notification, flapping ac or battery is coalesced and rate limited by queue
+        self.__notification_queue = notification_queue.NotificationQueue(self.__event_loop)
         self.notification = battery_notifications.BatteryNotifications(self.__disable_notifications,
                                                                        self.__found_notify_send_command,
                                                                        self.__show_only_critical, self.__play_sound,
-                                                                       self.__sound_command, self.__timeout)
-
-        # fork in background
-        if not self.__foreground:
-            if os.fork() != 0:
-                sys.exit(0)
+                                                                       self.__sound_player, self.__timeout,
+                                                                       self.__dispatcher, self.__notification_queue)
 
         # debug
         if self.__debug:
@@ -111,7 +180,79 @@ class Monitor(object):
             print("**********************\n")
             self.__print_debug_info()
 
-        self.__SOUND_VOLUME = self.__sound_volume
+        # battery state machine
+        self.__battery_state = battery_states.BatteryStateMachine(self.__battery_low_value,
+                                                                  self.__battery_critical_value,
+                                                                  self.__battery_minimal_value,
+                                                                  self.__set_no_battery_remainder)
+        # wait until shortly before next threshold is reached
+        self.__scheduler = poll_scheduler.AdaptiveScheduler((self.__battery_low_value,
+                                                             self.__battery_critical_value,
+                                                             self.__battery_minimal_value),
+                                                            self.__battery_min_update_interval,
+                                                            self.__battery_max_update_interval,
+                                                            self.__battery_update_timeout)
+        # minimal battery level countdown runs on event loop while battery is still checked,
+        # so ac plugged in cancels it right away
+        self.__countdown = countdown.Countdown(self.__event_loop,
+                                               TEST_MINIMAL_LEVEL_STEPS if self.__test else MINIMAL_LEVEL_STEPS,
+                                               self.__countdown_step)
+
+        # listen for power supply events
+        self.__power_supply_events = None
+        if self.__use_power_supply_events:
+            from monitor import power_supply_events
+
+            self.__power_supply_events = power_supply_events.PowerSupplyEvents.open()
+        if self.__power_supply_events is not None:
+            self.__event_loop.add_reader(self.__power_supply_events, self.__on_power_supply_events)
+
+        # watch config file, changed options are checked right away and used from next tick on
+        self.__config_values = {}
+        self.__pending_options = None
+        self.__config_watcher = None
+        if self.__config_file:
+            self.__config_values = ini_config.read_config_file(self.__config_file)[0]
+            self.__config_watcher = ini_config.ConfigWatcher.open(self.__config_file)
+        if self.__config_watcher is not None:
+            self.__event_loop.add_reader(self.__config_watcher, self.__on_config_file_changed)
+
+        # counters for 'stats' command, time spent in every battery state
+        self.__ticks = 0
+        self.__started = self.__event_loop.time()
+        self.__state_since = self.__started
+        self.__state_times = {}
+
+        # SIGUSR1 starts sampling profiler, second one stops it and writes report
+        self.__profiler = None
+        if self.__source is None:
+            signal.signal(signal.SIGUSR1, self.__on_profiler_signal)
+
+        # battery history recorder
+        self.__history = None
+        if self.__record_history:
+            try:
+                from values import battery_history
+                self.__history = battery_history.BatteryHistory(self.__history_file)
+            except (IOError, OSError, ValueError) as err:
+                print("Error: can't record battery history: " + str(err))
+
+        # battery health aggregates, updated from every sample and saved from time to time
+        from values import battery_health
+
+        if self.__health_file:
+            self.__health = battery_health.BatteryHealth.load(self.__health_file)
+        else:
+            self.__health = battery_health.BatteryHealth()
+        self.__health_saved = self.__event_loop.time()
+
+        # startup finished, launcher or service manager can go on
+        if self.__daemon is not None:
+            self.__daemon.ready()
+        elif os.environ.get('NOTIFY_SOCKET'):
+            from monitor import daemon
+
+            daemon.sd_notify('READY=1')
 
     def __print_debug_info(self):
         print("- Battmon version: %s" % internal_config.VERSION)
@@ -126,64 +267,60 @@ class Monitor(object):
         print("- play sounds: %s" % self.__play_sound)
         print("- sound file path: '%s'" % self.__sound_file)
         print("- sound volume level: %s" % self.__sound_volume)
-        print("- sound command: '%s'" % self.__sound_command)
+        print("- sound player: '%s'" % self.__sound_player_path)
         print("- notification timeout: %ssec" % int(self.__timeout / 1000))
         print("- battery update timeout: %ssec" % self.__battery_update_timeout)
+        print("- battery min update interval: %ssec" % self.__battery_min_update_interval)
+        print("- battery max update interval: %ssec" % self.__battery_max_update_interval)
+        print("- device rescan interval: %ssec" % self.__device_rescan_interval)
         print("- battery low level value: %s%%" % self.__battery_low_value)
         print("- battery critical level value: %s%%" % self.__battery_critical_value)
         print("- battery hibernate level value: %s%%" % self.__battery_minimal_value)
         print("- battery minimal level value command: '%s'" % self.__minimal_battery_level_command)
         print("- no battery remainder: %smin" % self.__set_no_battery_remainder)
-        print("- disable startup notifications: %s\n" % self.__disable_startup_notifications)
+        print("- disable startup notifications: %s" % self.__disable_startup_notifications)
+        print("- power supply events: %s" % self.__use_power_supply_events)
+        print("- record history: %s" % self.__record_history)
+        print("- history file path: '%s'" % self.__history_file)
+        print("- config file path: '%s'\n" % self.__config_file)
 
     # set name for this program, thus works 'killall Battmon'
     def __set_proc_name(self, name):
+        # the same as prctl(PR_SET_NAME) without loading ctypes
+        try:
+            with open('/proc/self/comm', 'w') as comm:
+                comm.write('Battmon' if sys.version_info[0] == 3 else name)
+            return
+        except IOError:
+            pass
         # dirty hack to set 'Battmon' process name under python3
+        from ctypes import cdll, c_char_p
         libc = cdll.LoadLibrary('libc.so.6')
         if sys.version_info[0] == 3:
             libc.prctl(15, c_char_p(b'Battmon'), 0, 0, 0)
         else:
             libc.prctl(15, name, 0, 0, 0)
 
-    # check if given program is running
-    def __check_if_running(self, name):
-        output = str(subprocess.check_output(['ps', '-A']))
-        # check if process is running
-        if name in output:
-            return True
-        else:
-            return False
-
-    # check if in path
-    def __check_in_path(self, program_name, path=internal_config.EXTRA_PROGRAMS_PATH):
-        try:
-            for p in path:
-                regular_path = os.path.join(p, program_name)
-                if os.path.isfile(regular_path):
-                    self.__current_program_path = (regular_path)
-                    return True
-            else:
-                return False
-        except OSError as ose:
-            print("Error: " + str(ose))
-
-    # check if Battmon is already running
+    # check if Battmon is already running, otherwise hold instance socket so other instances can talk to us
     def __check_if_battmon_already_running(self):
-        if self.__check_if_running(internal_config.PROGRAM_NAME):
+        try:
+            self.__instance_server = single_instance.InstanceServer(self.__answer_instance_command,
+                                                                    self.__event_loop)
+        except single_instance.AlreadyRunning:
             if self.__play_sound:
-                os.popen(self.__sound_command)
+                self.__sound_player.play()
             if self.__found_notify_send_command:
-                notify_send_string = '''notify-send "BATTMON IS ALREADY RUNNING" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__dispatcher.notify("BATTMON IS ALREADY RUNNING", "", self.__timeout)
                 sys.exit(1)
             else:
                 print("BATTMON IS ALREADY RUNNING")
                 sys.exit(1)
 
-    # check for notify-send command
+    # check if we can show notifications over D-Bus or with notify-send command
     def __check_notify_send(self):
-        if self.__check_in_path('notify-send'):
+        if self.__dispatcher is None:
+            self.__dispatcher = notification_dispatcher.NotificationDispatcher(self.__programs.find('notify-send'))
+        if self.__dispatcher.available():
             self.__found_notify_send_command = True
         else:
             self.__found_notify_send_command = False
@@ -192,45 +329,43 @@ class Monitor(object):
     # check if we have sound player
     def __check_play(self):
         for i in internal_config.DEFAULT_PLAYER_COMMAND:
-            if self.__check_in_path(i):
-                self.__sound_player = self.__current_program_path
+            program_path = self.__programs.find(i)
+            if program_path:
+                self.__sound_player_path = program_path
+                break
 
         # if none ware found in path, send notification about it
-        if self.__sound_player == '' and self.__found_notify_send_command:
-            self.__sound_command = "Not found"
+        if self.__sound_player_path == '' and self.__found_notify_send_command:
+            self.__sound_player_path = "Not found"
             self.__play_sound = False
-            notify_send_string = '''notify-send "DEPENDENCY MISSING\n" \
-                                    "You have to install sox or pulseaudio to play sounds" %s %s''' \
-                                 % ('-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-            os.popen(notify_send_string)
-        elif not self.__found_notify_send_command:
-            self.__sound_command = "Not found"
+            self.__dispatcher.notify("DEPENDENCY MISSING", "You have to install sox or pulseaudio to play sounds",
+                                     30 * 1000)
+        elif self.__sound_player_path == '':
+            self.__sound_player_path = "Not found"
             self.__play_sound = False
             print("DEPENDENCY MISSING:\n You have to install sox or pulseaudio to play sounds.\n")
 
-    # check if sound files exist
-    def __set_sound_file_and_volume(self):
+    # check if sound files exist and load it into player
+    def __set_sound_player(self):
         if os.path.exists(self.__sound_file):
-            if self.__sound_player.find('paplay') > -1 and os.popen('pidof pulseaudio'):
-                __pa_volume = self.__sound_volume * int(3855)
-                self.__sound_command = '%s --volume %s %s' % (self.__sound_player, __pa_volume, self.__sound_file)
-            elif self.__sound_player.find('play') > -1:
-                self.__sound_command = '%s -V1 -q -v%s %s' \
-                                       % (self.__sound_player, self.__sound_volume, self.__sound_file)
+            if self.__play_sound:
+                from notifications import sound_player
+
+                self.__sound_player = sound_player.SoundPlayer(self.__sound_player_path, self.__sound_file,
+                                                               self.__sound_volume, self.__event_loop,
+                                                               self.__dispatcher)
         else:
             if self.__found_notify_send_command:
                 # missing dependency notification will disappear after 30 seconds
                 message_string = ("Check if you have sound files exist:  \n %s\n"
                                   " If you've specified your own sound file path, "
                                   " please check if it was correctly") % self.__sound_file
-                notify_send_string = '''notify-send "DEPENDENCY MISSING\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__dispatcher.notify("DEPENDENCY MISSING", message_string, 30 * 1000)
             if not self.__found_notify_send_command:
                 print("DEPENDENCY MISSING:\n Check if you have sound files in %s. \n"
-                      "If you've specified your own sound file path, please check if it was correctly %s %s"
+                      "If you've specified your own sound file path, please check if it was correctly"
                       % self.__sound_file)
-            self.__sound_command = "Not found"
+            self.__play_sound = False
 
     # check for lock screen program
     def __set_lock_command(self):
@@ -240,14 +375,11 @@ class Monitor(object):
                 lock_command_as_list = c.split()
                 command = lock_command_as_list[0]
                 command_args = ' '.join(lock_command_as_list[1:len(lock_command_as_list)])
-                if self.__check_in_path(command):
+                if self.__programs.find(command):
                     self.__screenlock_command = command + ' ' + command_args
                     if self.__found_notify_send_command and not self.__disable_startup_notifications:
-                        notify_send_string = '''notify-send "Using '%s' to lock screen\n" "with args: %s" %s %s''' \
-                                             % (
-                                                 command, command_args, '-t ' + str(self.__timeout),
-                                                 '-a ' + internal_config.PROGRAM_NAME)
-                        os.popen(notify_send_string)
+                        self.__dispatcher.notify("Using '%s' to lock screen" % command, "with args: %s" % command_args,
+                                                 self.__timeout)
                     elif not self.__disable_startup_notifications:
                         print("%s %s will be used to lock screen" % (command, command_args))
                     elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
@@ -259,10 +391,7 @@ class Monitor(object):
                                       " you can specify your favorite screenlock\n"
                                       " program running battmon with -lp '[PATH] [ARGS]',\n"
                                       " otherwise your session won't be locked")
-                    notify_send_string = '''notify-send "DEPENDENCY MISSING\n" "%s" %s %s''' \
-                                         % (message_string, '-t ' + str(30 * 1000),
-                                            '-a ' + internal_config.PROGRAM_NAME)
-                    os.popen(notify_send_string)
+                    self.__dispatcher.notify("DEPENDENCY MISSING", message_string, 30 * 1000)
                 if not self.__found_notify_send_command:
                     print("DEPENDENCY MISSING:\n please check if you have installed any screenlock program, \
                             you can specify your favorite screen lock program \
@@ -273,10 +402,8 @@ class Monitor(object):
             command = lock_command_as_list[0]
             command_args = ' '.join(lock_command_as_list[1:len(lock_command_as_list)])
             if self.__found_notify_send_command and not self.__disable_startup_notifications:
-                notify_send_string = '''notify-send "Using '%s' to lock screen\n" "with args: %s" %s %s''' \
-                                     % (command, command_args, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__dispatcher.notify("Using '%s' to lock screen" % command, "with args: %s" % command_args,
+                                         self.__timeout)
             elif not self.__disable_startup_notifications:
                 print("%s %s will be used to lock screen" % (command, command_args))
             elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
@@ -302,28 +429,28 @@ class Monitor(object):
         #                      "/org/freedesktop/UPower org.freedesktop.UPower.Suspend"
 
         for c in minimal_battery_commands:
-            if self.__check_in_path(c):
+            program_path = self.__programs.find(c)
+            if program_path:
                 if c == 'pm-hibernate' and self.__minimal_battery_level_command == "hibernate":
-                    hibernate_command = "sudo %s" % self.__current_program_path
+                    hibernate_command = "sudo %s" % program_path
                     break
                 elif c == 'pm-suspend-hybrid' and self.__minimal_battery_level_command == "hybrid":
-                    suspend_hybrid_command = "sudo %s" % self.__current_program_path
+                    suspend_hybrid_command = "sudo %s" % program_path
                     break
                 elif c == 'pm-suspend' and self.__minimal_battery_level_command == "suspend":
-                    suspend_command = "sudo %s" % self.__current_program_path
+                    suspend_command = "sudo %s" % program_path
                     break
                 elif c == 'hibernate.sh' and (self.__minimal_battery_level_command == "hibernate"):
                     #    or self.__minimal_battery_level_command == "hybrid"):
-                    hibernate_command = "sudo %s" % self.__current_program_path
+                    hibernate_command = "sudo %s" % program_path
                     break
                 elif c == 'suspend.sh' and self.__minimal_battery_level_command == "suspend":
-                    suspend_command = "sudo %s" % self.__current_program_path
+                    suspend_command = "sudo %s" % program_path
                     break
                 elif c == 'shutdown.sh' and self.__minimal_battery_level_command == "poweroff":
-                    power_off_command = "sudo %s" % self.__current_program_path
+                    power_off_command = "sudo %s" % program_path
                     break
             else:
-                self.__check_in_path('shutdown.sh')
                 power_off_command = "sudo %s/bin/shutdown.sh" % internal_config.PROGRAM_PATH
 
         if hibernate_command:
@@ -346,259 +473,369 @@ class Monitor(object):
                                   " or be sure that you can execute hibernate.sh and\n"
                                   " suspend.sh files in bin folder, \n"
                                   " otherwise your system will be SHUTDOWN on critical\n battery level")
-                notify_send_string = '''notify-send "MINIMAL BATTERY VALUE PROGRAM NOT FOUND\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__dispatcher.notify("MINIMAL BATTERY VALUE PROGRAM NOT FOUND", message_string, 30 * 1000)
             elif not self.__found_notify_send_command:
                 print('''MINIMAL BATTERY VALUE PROGRAM NOT FOUND\n
                       please check if you have installed pm-utils,\n
                       otherwise your system will be SHUTDOWN at critical battery level''')
 
         if self.__found_notify_send_command and not self.__disable_startup_notifications:
-            notify_send_string = '''notify-send "System will be: %s\n" "below minimal battery level" %s %s''' \
-                                 % (self.__short_minimal_battery_command, '-t ' + str(self.__timeout),
-                                    '-a ' + internal_config.PROGRAM_NAME)
-            os.popen(notify_send_string)
+            self.__dispatcher.notify("System will be: %s" % self.__short_minimal_battery_command,
+                                     "below minimal battery level", self.__timeout)
         elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
             print("below minimal battery level system will be: %s" % self.__short_minimal_battery_command)
 
-    # check for battery update times
-    def __check_battery_update_times(self):
-        while self.__battery_values.battery_time() == 'Unknown':
+    # answer command sent by other instance
+    def __answer_instance_command(self, command):
+        if command == 'ping':
+            return "%s %d" % (internal_config.PROGRAM_NAME, os.getpid())
+        elif command == 'status':
+            sample = self.__last_sample
+            if sample is None:
+                return "pid: %d state: %s" % (os.getpid(), self.__battery_state.state)
+            return "pid: %d state: %s capacity: %s%% time left: %s" \
+                   % (os.getpid(), self.__battery_state.state, sample.capacity, sample.battery_time)
+        elif command == 'stats':
+            import json
+            return json.dumps(self.__stats(), separators=(',', ':'), sort_keys=True)
+        elif command == 'profile':
+            return self.__toggle_profiler()
+        elif command == 'health':
+            from values import battery_health
+
+            return battery_health.format_report(self.__health.report())
+        elif command in ('json', single_instance.SUBSCRIBE_COMMAND):
+            return self.__status_json(self.__last_sample)
+        elif command == 'stop':
+            self.__stop_requested = True
+            return "stopping %s %d" % (internal_config.PROGRAM_NAME, os.getpid())
+        return ("unknown command '%s', possible commands are: ping, status, json, subscribe, stats, health, profile, "
+                "stop" % command)
+
+    # counters of running instance
+    def __stats(self):
+        now = self.__event_loop.time()
+        state_times = dict(self.__state_times)
+        state = self.__battery_state.state
+        if state is not None:
+            state_times[state] = state_times.get(state, 0) + now - self.__state_since
+        return {'pid': os.getpid(),
+                'uptime': now - self.__started,
+                'ticks': self.__ticks,
+                'sysfs_reads': self.__battery_values.reads,
+                'device_rescans': self.__battery_values.rescans,
+                'subprocesses': self.__dispatcher.processes_spawned + (self.__sound_player.spawned
+                                                                       if self.__sound_player is not None else 0),
+                'notifications': self.__dispatcher.notifications_sent,
+                'notifications_coalesced': self.__notification_queue.coalesced,
+                'subscribers': self.__instance_server.subscribers() if self.__instance_server is not None else 0,
+                'state_times': state_times,
+                'first_sample_delay': self.__first_sample_delay,
+                'profiling': self.__profiler is not None and self.__profiler.running}
+
+    # start profiler or stop it and write its report, return message about it
+    def __toggle_profiler(self):
+        if self.__profiler is None:
+            from monitor import profiler
+            self.__profiler = profiler.SamplingProfiler()
+        if self.__profiler.toggle():
+            return "Profiling started, send SIGUSR1 or 'profile' command again to stop it"
+        path = internal_config.PROFILE_FILE_PATH % os.getpid()
+        try:
+            self.__profiler.dump(path)
+            return "Profiler report written to '%s'" % path
+        except (IOError, OSError) as err:
+            return "Error: can't write profiler report: " + str(err)
+
+    def __on_profiler_signal(self, signum, frame):
+        print(self.__toggle_profiler())
+
+    # one line json with sample, battery state and time when it was sent, clients can measure
+    # push latency from 'sent' and sample 'timestamp'
+    def __status_json(self, sample):
+        status = sample.as_dict() if sample is not None else {}
+        status['state'] = self.__battery_state.state
+        status['sent'] = time.time()
+        import json
+        return json.dumps(status, separators=(',', ':'), sort_keys=True)
+
+    # power supply changed, find devices again if some was added or removed, other kernel events
+    # (usb, block, input) don't wake main loop
+    def __on_power_supply_events(self):
+        from monitor import power_supply_events
+
+        events = self.__power_supply_events.read_events()
+        if events:
+            self.__wake_up = True
+        for action, values in events:
             if self.__debug:
-                print('''DEBUG: Battery value check in %s() is '%s', next check in %d sec'''
-                      % (self.__check_battery_update_times.__name__,
-                         str(self.__battery_values.battery_time()), self.__battery_update_timeout))
-            time.sleep(self.__battery_update_timeout)
-            if self.__battery_values.battery_time() == 'Unknown':
-                if self.__debug:
-                    print('''DEBUG: Second battery value check in %s() is '%s', continuing anyway...'''
-                          % (self.__check_battery_update_times.__name__, str(self.__battery_values.battery_time())))
-                    print("DEBUG: Back to %s()" % self.run_main_loop.__name__)
+                print("DEBUG: Power supply event '%s' from %s" % (action, values.get('POWER_SUPPLY_NAME', '?')))
+            if action in power_supply_events.HOTPLUG_ACTIONS:
+                self.__battery_values.rescan()
+
+    # options which can be changed while running
+    def __reloadable_options(self):
+        return {'disable_notifications': self.__disable_notifications,
+                'critical': self.__show_only_critical,
+                'sound_file': self.__sound_file,
+                'play_sound': self.__play_sound,
+                'sound_volume': self.__sound_volume,
+                'timeout': self.__timeout // 1000,
+                'battery_update_timeout': self.__battery_update_timeout,
+                'battery_min_update_interval': self.__battery_min_update_interval,
+                'battery_max_update_interval': self.__battery_max_update_interval,
+                'battery_low_value': self.__battery_low_value,
+                'battery_critical_value': self.__battery_critical_value,
+                'battery_minimal_value': self.__battery_minimal_value,
+                'set_no_battery_remainder': self.__set_no_battery_remainder}
+
+    # options as they are used, sounds aren't played without player or sound file and debug mode shows
+    # every notification, so saving config file without changes doesn't change anything
+    def __effective_options(self, options):
+        options = dict(options)
+        if self.__sound_player_path == "Not found" or not os.path.exists(options['sound_file']):
+            options['play_sound'] = False
+        if self.__debug:
+            options['critical'] = options['disable_notifications'] = False
+        return options
+
+    # config file was written, merge defaults, config file and command line options again, like at start,
+    # and keep them for next tick, which is done right away, nothing is used when some option is wrong
+    def __on_config_file_changed(self):
+        if not self.__config_watcher.read_events():
+            return
+        from values import help_and_values_parser
+
+        values, errors = ini_config.read_config_file(self.__config_file)
+        for name in set(values) | set(self.__config_values):
+            if name not in ini_config.RELOADABLE_OPTIONS and values.get(name) != self.__config_values.get(name):
+                print("Config file option '%s' is used after restart" % name)
+        merged = help_and_values_parser.merge_options(values, self.__command_line_options)
+        options = dict((name, merged[name]) for name in ini_config.RELOADABLE_OPTIONS)
+        errors.extend(option_checks.check_options(options))
+        if errors:
+            for error in errors:
+                print("Error: config file '%s' not used: %s" % (self.__config_file, error))
+            return
+        self.__config_values = values
+        options = self.__effective_options(options)
+        if options != self.__reloadable_options():
+            # check battery right away with new options
+            self.__pending_options = options
+            self.__wake_up = True
+
+    # use options from config file all at once
+    def __apply_options(self, options):
+        if self.__debug:
+            current = self.__reloadable_options()
+            print("DEBUG: Config file options used: %s"
+                  % ', '.join('%s=%s' % (name, options[name]) for name in sorted(options)
+                              if options[name] != current[name]))
+        sound_changed = (options['sound_file'], options['play_sound'], options['sound_volume']) != \
+                        (self.__sound_file, self.__play_sound, self.__sound_volume)
+        self.__disable_notifications = options['disable_notifications']
+        self.__show_only_critical = options['critical']
+        self.__sound_file = options['sound_file']
+        self.__play_sound = options['play_sound']
+        self.__sound_volume = options['sound_volume']
+        self.__timeout = options['timeout'] * 1000
+        self.__battery_update_timeout = options['battery_update_timeout']
+        self.__battery_min_update_interval = options['battery_min_update_interval']
+        self.__battery_max_update_interval = options['battery_max_update_interval']
+        self.__battery_low_value = options['battery_low_value']
+        self.__battery_critical_value = options['battery_critical_value']
+        self.__battery_minimal_value = options['battery_minimal_value']
+        self.__set_no_battery_remainder = options['set_no_battery_remainder']
+
+        if sound_changed:
+            if self.__sound_player is not None:
+                self.__sound_player.close()
+                self.__sound_player = None
+            if self.__sound_player_path != "Not found":
+                self.__set_sound_player()
+        self.notification = battery_notifications.BatteryNotifications(self.__disable_notifications,
+                                                                       self.__found_notify_send_command,
+                                                                       self.__show_only_critical, self.__play_sound,
+                                                                       self.__sound_player, self.__timeout,
+                                                                       self.__dispatcher, self.__notification_queue)
+        # current state is kept, new thresholds are used from next state change on
+        self.__battery_state.low_value = self.__battery_low_value
+        self.__battery_state.critical_value = self.__battery_critical_value
+        self.__battery_state.minimal_value = self.__battery_minimal_value
+        self.__battery_state.no_battery_remainder = self.__set_no_battery_remainder
+        self.__scheduler = poll_scheduler.AdaptiveScheduler((self.__battery_low_value,
+                                                             self.__battery_critical_value,
+                                                             self.__battery_minimal_value),
+                                                            self.__battery_min_update_interval,
+                                                            self.__battery_max_update_interval,
+                                                            self.__battery_update_timeout)
+
+    # wait for next battery check, listening for power supply events the check is done right after
+    # ac or battery change and capacity is checked shortly before next threshold is reached,
+    # otherwise ac must be polled and check is done every minimal update interval
+    def __wait(self, sample):
+        if self.__power_supply_events is not None:
+            interval = self.__scheduler.interval(sample)
+        else:
+            interval = self.__battery_min_update_interval
+        if self.__debug:
+            print("DEBUG: Next battery check in %.1f sec" % interval)
+        # instance socket commands are served meanwhile, only power supply event ends waiting early
+        deadline = self.__event_loop.time() + interval
+        self.__wake_up = False
+        while not self.__wake_up and not self.__stop_requested:
+            timeout = deadline - self.__event_loop.time()
+            if timeout <= 0:
                 break
-            else:
-                print("DEBUG: Got battery value: %s%%" % str(self.__battery_values.battery_current_capacity()))
-                print("DEBUG: Back to %s()" % self.run_main_loop.__name__)
+            self.__event_loop.run_once(timeout)
+
+    # battery level is on or below minimal value and ac isn't plugged
+    def __is_minimal_level(self, sample):
+        return not sample.ac_present and sample.capacity <= self.__battery_minimal_value
+
+    # loud beep before minimal battery level command
+    def __play_alarm(self):
+        if self.__play_sound:
+            self.__sound_player.play(ALARM_SOUND_VOLUME)
+
+    # minimal battery level, warn and start countdown to minimal battery level command
+    def __minimal_battery_level(self, sample):
+        self.notification.minimal_battery_level(sample.capacity, sample.battery_time,
+                                                self.__short_minimal_battery_command, (10 * 1000))
+        if self.__is_minimal_level(sample) and not self.__countdown.running:
+            if self.__debug:
+                print("DEBUG: Minimal battery level countdown started")
+            self.__countdown.start()
+        else:
+            self.__battery_state.reset()
 
-    # start main loop
+    # ac plugged, forget about minimal battery level command
+    def __cancel_countdown(self):
+        self.__countdown.cancel()
+        if self.__debug:
+            print("DEBUG: Minimal battery level countdown cancelled")
+
+    # step of minimal battery level countdown, steps use sample of last tick, which cancels countdown
+    # when ac was plugged, only the command is checked once more with fresh values
+    def __countdown_step(self, step):
+        sample = self.__last_sample
+        if step == STEP_RUN_COMMAND:
+            sample = self.__battery_values.read()
+        if not self.__is_minimal_level(sample):
+            self.__cancel_countdown()
+            return
+        if step == STEP_BEEP:
+            self.__play_alarm()
+        elif step == STEP_LAST_CHANCE:
+            message_string = ("Last chance to plug in AC cable...\n"
+                              " system will be %s in 10 seconds\n"
+                              " current capacity: %s%s\n"
+                              " time left: %s") % \
+                             (self.__short_minimal_battery_command,
+                              sample.capacity,
+                              '%',
+                              sample.battery_time)
+            self.__dispatcher.notify("!!! MINIMAL BATTERY LEVEL !!!", message_string, 10 * 1000,
+                                     notification_dispatcher.URGENCY_CRITICAL)
+        elif step == STEP_RUN_COMMAND:
+            # lock screen and hibernate
+            self.__dispatcher.run(self.__screenlock_command, shell=True)
+            self.__dispatcher.run(self.__minimal_battery_level_command, shell=True)
+        elif step == STEP_TEST_COMMAND:
+            print("TEST: Hibernating... starting over in 10 seconds")
+        elif step == STEP_START_OVER:
+            # still on minimal level after resume or test, start over again
+            self.__battery_state.reset()
+
+    # run state machine action
+    def __run_action(self, action, sample):
+        if action == battery_states.MINIMAL_LEVEL:
+            self.__minimal_battery_level(sample)
+        elif action in (battery_states.NOTIFY_DISCHARGING, battery_states.NOTIFY_LOW,
+                        battery_states.NOTIFY_CRITICAL, battery_states.NOTIFY_CHARGING):
+            getattr(self.notification, action)(sample.capacity, sample.battery_time)
+        else:
+            getattr(self.notification, action)()
+
+    # one scheduler tick, take one sample and let the state machine decide what to do,
+    # return (sample, state, actions)
+    def __tick(self):
+        if self.__pending_options is not None:
+            self.__apply_options(self.__pending_options)
+            self.__pending_options = None
+        sample = self.__battery_values.sample()
+        self.__last_sample = sample
+        self.__ticks += 1
+        if self.__first_sample_delay is None and self.__startup_time is not None:
+            self.__first_sample_delay = sample.timestamp - self.__startup_time
+            if self.__debug:
+                print("DEBUG: First sample taken %.1f ms after start" % (self.__first_sample_delay * 1000))
+        if self.__countdown.running and not self.__is_minimal_level(sample):
+            self.__cancel_countdown()
+        previous_state = self.__battery_state.state
+        state, actions = self.__battery_state.update(sample)
+        if state != previous_state:
+            now = self.__event_loop.time()
+            if previous_state is not None:
+                self.__state_times[previous_state] = (self.__state_times.get(previous_state, 0)
+                                                      + now - self.__state_since)
+            self.__state_since = now
+        if self.__history is not None:
+            self.__history.append(sample)
+        self.__health.add(sample)
+        if self.__event_loop.time() - self.__health_saved >= internal_config.HEALTH_SAVE_INTERVAL:
+            self.__save_health()
+        if self.__debug and state != previous_state:
+            print("DEBUG: Battery state '%s' -> '%s' in %s()" % (previous_state, state, self.run_main_loop.__name__))
+            for battery in sample.batteries:
+                print("DEBUG: %s: %s%% %s" % (battery.name, battery.capacity, battery.status))
+        for action in actions:
+            if self.__debug:
+                print("DEBUG: Action '%s' in %s()" % (action, self.run_main_loop.__name__))
+            shown_time = self.__dispatcher.last_shown_time
+            self.__run_action(action, sample)
+            if self.__debug and self.__dispatcher.last_shown_time != shown_time:
+                print("DEBUG: Notification shown %.1f ms after sample, dispatch took %.1f ms"
+                      % ((self.__dispatcher.last_shown_time - sample.timestamp) * 1000,
+                         self.__dispatcher.last_latency * 1000))
+        subscribers = self.__instance_server.subscribers() if self.__instance_server is not None else 0
+        if subscribers:
+            self.__instance_server.publish(self.__status_json(sample))
+            if self.__debug:
+                print("DEBUG: Status pushed to %d subscribers in %.2f ms"
+                      % (subscribers, self.__instance_server.last_publish_time * 1000))
+        return sample, state, actions
+
+    def __save_health(self):
+        self.__health_saved = self.__event_loop.time()
+        if not self.__health_file:
+            return
+        try:
+            self.__health.save(self.__health_file)
+        except (IOError, OSError) as err:
+            print("Error: can't save battery health: " + str(err))
+
+    # check battery once and wait for next check, timers (countdown, notifications) due meanwhile are run,
+    # return (sample, state, actions) of the check
+    def run_once(self):
+        sample, state, actions = self.__tick()
+        self.__wait(sample)
+        return sample, state, actions
+
+    # start main loop, runs until other instance asks to stop
     def run_main_loop(self):
-        while True:
-            # check if we have battery
-            while self.__battery_values.is_battery_present():
-                # check if battery is discharging to stay in normal battery level
-                if not self.__battery_values.is_ac_present() and self.__battery_values.is_battery_discharging():
-                    # discharging and battery level is greater then battery_low_value
-                    if (not self.__battery_values.is_ac_present()
-                            and self.__battery_values.battery_current_capacity() > self.__battery_low_value):
-                        if self.__debug:
-                            print("DEBUG: Discharging check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times()
-                        self.notification.battery_discharging(self.__battery_values.battery_current_capacity(),
-                                                              self.__battery_values.battery_time())
-                        # have enough power and check if we should stay in save battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_values.battery_current_capacity() > self.__battery_low_value):
-                            time.sleep(1)
-
-                    # low capacity level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_low_value >= self.__battery_values.battery_current_capacity()
-                            > self.__battery_critical_value):
-                        if self.__debug:
-                            print("DEBUG: Low level battery check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times()
-                        self.notification.low_capacity_level(self.__battery_values.battery_current_capacity(),
-                                                             self.__battery_values.battery_time())
-                        # battery have enough power and check if we should stay in low battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_low_value >= self.__battery_values.battery_current_capacity()
-                                > self.__battery_critical_value):
-                            time.sleep(1)
-
-                    # critical capacity level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_critical_value >= self.__battery_values.battery_current_capacity()
-                            > self.__battery_minimal_value):
-                        if self.__debug:
-                            print("DEBUG: Critical battery level check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times()
-                        self.notification.critical_battery_level(self.__battery_values.battery_current_capacity(),
-                                                                 self.__battery_values.battery_time())
-                        # battery have enough power and check if we should stay in critical battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_critical_value >= self.__battery_values.battery_current_capacity()
-                                > self.__battery_minimal_value):
-                            time.sleep(1)
-
-                    # hibernate level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_values.battery_current_capacity() <= self.__battery_minimal_value):
-                        if self.__debug:
-                            print("DEBUG: Hibernate battery level check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times()
-                        self.notification.minimal_battery_level(self.__battery_values.battery_current_capacity(),
-                                                                self.__battery_values.battery_time(),
-                                                                self.__short_minimal_battery_command,
-                                                                (10 * 1000))
-                        # check once more if system should be hibernate
-                        if (not self.__battery_values.is_ac_present()
-                                and self.__battery_values.battery_current_capacity() <= self.__battery_minimal_value):
-                            # the real thing
-                            if not self.__test:
-                                if (not self.__battery_values.is_ac_present()
-                                    and self.__battery_values.battery_current_capacity() <=
-                                        self.__battery_minimal_value):
-                                    # first warning, beep 5 times every two seconds, and display popup
-                                    for i in range(5):
-                                        # check if ac was plugged
-                                        if (not self.__battery_values.is_ac_present()
-                                            and self.__battery_values.battery_current_capacity()
-                                                <= self.__battery_minimal_value):
-                                            time.sleep(2)
-                                            self.__sound_volume = 10
-                                            self.__set_sound_file_and_volume()
-                                            os.popen(self.__sound_command)
-                                        # ac plugged, then bye
-                                        else:
-                                            break
-                                    # one more check if ac was plugged
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity()
-                                            <= self.__battery_minimal_value):
-                                        time.sleep(2)
-                                        os.popen(self.__sound_command)
-                                        message_string = ("Last chance to plug in AC cable...\n"
-                                                          " system will be %s in 10 seconds\n"
-                                                          " current capacity: %s%s\n"
-                                                          " time left: %s") % \
-                                                         (self.__short_minimal_battery_command,
-                                                          self.__battery_values.battery_current_capacity(),
-                                                          '%',
-                                                          self.__battery_values.battery_time())
-
-                                        notify_send_string = '''notify-send "!!! MINIMAL BATTERY LEVEL !!!\n" \
-                                                                "%s" %s %s''' \
-                                                             % (message_string, '-t ' + str(10 * 1000),
-                                                                '-a ' + internal_config.PROGRAM_NAME)
-                                        os.popen(notify_send_string)
-                                        time.sleep(10)
-                                    # LAST CHECK before hibernating
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity()
-                                            <= self.__battery_minimal_value):
-                                        # lock screen and hibernate
-                                        for i in range(4):
-                                            time.sleep(5)
-                                            os.popen(self.__sound_command)
-                                        time.sleep(1)
-                                        os.popen(self.__screenlock_command)
-                                        os.popen(self.__minimal_battery_level_command)
-                                    else:
-                                        self.__sound_volume = self.__SOUND_VOLUME
-                                        self.__set_sound_file_and_volume()
-                                        break
-                            # test block
-                            elif self.__test:
-                                self.__sound_volume = 10
-                                self.__set_sound_file_and_volume()
-                                for i in range(5):
-                                    if self.__play_sound:
-                                        os.popen(self.__sound_command)
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity() <=
-                                            self.__battery_minimal_value):
-                                        time.sleep(2)
-                                print("TEST: Hibernating... Program goes sleep for 10sek")
-                                self.__sound_volume = self.__SOUND_VOLUME
-                                self.__set_sound_file_and_volume()
-                                time.sleep(10)
-                        else:
-                            pass
-
-                # check if we have ac connected and we've battery
-                if self.__battery_values.is_ac_present() and not self.__battery_values.is_battery_discharging():
-                    # full charged
-                    if (self.__battery_values.is_battery_fully_charged() and not
-                            self.__battery_values.is_battery_discharging()):
-                        if self.__debug:
-                            print("DEBUG: Full battery check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        # simulate self.__check_battery_update_times() behavior
-                        time.sleep(self.__battery_update_timeout)
-                        self.notification.full_battery()
-                        # battery fully charged loop
-                        while (self.__battery_values.is_ac_present()
-                               and self.__battery_values.is_battery_fully_charged()
-                               and not self.__battery_values.is_battery_discharging()):
-                            if not self.__battery_values.is_battery_present():
-                                self.notification.battery_removed()
-                                if self.__debug:
-                                    print("DEBUG: Battery removed check in %s()" % self.run_main_loop.__name__)
-                                time.sleep(self.__timeout / 1000)
-                                break
-                            else:
-                                time.sleep(1)
-
-                    # ac plugged and battery is charging
-                    if (self.__battery_values.is_ac_present()
-                        and not self.__battery_values.is_battery_fully_charged()
-                            and not self.__battery_values.is_battery_discharging()):
-                        if self.__debug:
-                            print("DEBUG: Charging check in %s()" % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times()
-                        self.notification.battery_charging(self.__battery_values.battery_current_capacity(),
-                                                           self.__battery_values.battery_time())
-
-                        # battery charging loop
-                        while (self.__battery_values.is_ac_present()
-                               and not self.__battery_values.is_battery_fully_charged()
-                               and not self.__battery_values.is_battery_discharging()):
-                            if not self.__battery_values.is_battery_present():
-                                self.notification.battery_removed()
-                                if self.__debug:
-                                    print("DEBUG: Battery removed check in %s()" % self.run_main_loop.__name__)
-                                time.sleep(self.__timeout / 1000)
-                                break
-                            else:
-                                time.sleep(1)
-
-            # check for no battery
-            if not self.__battery_values.is_battery_present() and self.__battery_values.is_ac_present():
-                # notification
-                self.notification.no_battery()
-                if self.__debug:
-                    print("DEBUG: No battery check in %s()" % self.run_main_loop.__name__)
-                # no battery remainder loop counter
-                no_battery_counter = 1
-                # loop to deal with situation when we don't have battery
-                while not self.__battery_values.is_battery_present():
-                    if self.__set_no_battery_remainder > 0:
-                        remainder_time_in_sek = self.__set_no_battery_remainder * 60
-                        time.sleep(1)
-                        no_battery_counter += 1
-                        # check if battery was plugged
-                        if self.__battery_values.is_battery_present():
-                            self.notification.battery_plugged()
-                            if self.__debug:
-                                print("DEBUG: Battery plugged check in %s()" % self.run_main_loop.__name__)
-                            time.sleep(self.__timeout / 1000)
-                            break
-                        # send no battery notifications and reset no_battery_counter
-                        if no_battery_counter == remainder_time_in_sek:
-                            self.notification.no_battery()
-                            no_battery_counter = 1
-                    else:
-                        # no action wait
-                        time.sleep(1)
-                        # check if battery was plugged
-                        if self.__battery_values.is_battery_present():
-                            self.notification.battery_plugged()
-                            if self.__debug:
-                                print("DEBUG: Battery plugged check in %s()" % self.run_main_loop.__name__)
-                            time.sleep(self.__timeout / 1000)
-                            break
+        try:
+            while not self.__stop_requested:
+                self.run_once()
+        finally:
+            self.close()
+
+    # save battery health and release sound player, config watcher and instance socket
+    def close(self):
+        self.__save_health()
+        if self.__sound_player is not None:
+            self.__sound_player.close()
+        if self.__config_watcher is not None:
+            self.__config_watcher.close()
+        if self.__instance_server is not None:
+            self.__instance_server.close()
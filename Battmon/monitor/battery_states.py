@@ -0,0 +1,134 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# battery states
+NO_BATTERY = 'no_battery'
+DISCHARGING = 'discharging'
+LOW = 'low'
+CRITICAL = 'critical'
+MINIMAL = 'minimal'
+CHARGING = 'charging'
+FULL = 'full'
+
+# actions, named like BatteryNotifications methods
+NOTIFY_DISCHARGING = 'battery_discharging'
+NOTIFY_LOW = 'low_capacity_level'
+NOTIFY_CRITICAL = 'critical_battery_level'
+MINIMAL_LEVEL = 'minimal_battery_level'
+NOTIFY_CHARGING = 'battery_charging'
+NOTIFY_FULL = 'full_battery'
+NOTIFY_BATTERY_REMOVED = 'battery_removed'
+NOTIFY_BATTERY_PLUGGED = 'battery_plugged'
+NOTIFY_NO_BATTERY = 'no_battery'
+
+# matches every state in transition table
+ANY = '*'
+
+# actions run when state is entered
+ENTRY_ACTIONS = {
+    NO_BATTERY: (NOTIFY_NO_BATTERY,),
+    DISCHARGING: (NOTIFY_DISCHARGING,),
+    LOW: (NOTIFY_LOW,),
+    CRITICAL: (NOTIFY_CRITICAL,),
+    MINIMAL: (MINIMAL_LEVEL,),
+    CHARGING: (NOTIFY_CHARGING,),
+    FULL: (NOTIFY_FULL,),
+}
+
+# actions run on (from state, to state) change before entry actions
+TRANSITION_ACTIONS = {
+    (ANY, NO_BATTERY): (NOTIFY_BATTERY_REMOVED,),
+    (NO_BATTERY, ANY): (NOTIFY_BATTERY_PLUGGED,),
+}
+
+# actions showing remaining time, they wait one tick when the time isn't known yet
+TIMED_ACTIONS = frozenset([NOTIFY_DISCHARGING, NOTIFY_LOW, NOTIFY_CRITICAL, MINIMAL_LEVEL, NOTIFY_CHARGING])
+
+
+# find transition actions for state change, exact match first
+def transition_actions(from_state, to_state):
+    for key in ((from_state, to_state), (from_state, ANY), (ANY, to_state)):
+        if key in TRANSITION_ACTIONS:
+            return TRANSITION_ACTIONS[key]
+    return ()
+
+
+# battery state machine, update() is the only transition function and gets one BatterySample per tick,
+# it doesn't read or sleep anything, so recorded samples can be replayed through it
+class BatteryStateMachine(object):
+    def __init__(self, low_value, critical_value, minimal_value, no_battery_remainder=0):
+        self.low_value = low_value
+        self.critical_value = critical_value
+        self.minimal_value = minimal_value
+        # 'no battery' remainder in minutes, 0 disables
+        self.no_battery_remainder = no_battery_remainder
+
+        self.state = None
+        self.__deferred_actions = ()
+        self.__next_remainder_time = 0
+
+    # state for given sample
+    def classify(self, sample):
+        if not sample.battery_present:
+            return NO_BATTERY
+        if sample.ac_present or sample.status in ('Charging', 'Full'):
+            if sample.is_fully_charged:
+                return FULL
+            return CHARGING
+        if sample.capacity > self.low_value:
+            return DISCHARGING
+        if sample.capacity > self.critical_value:
+            return LOW
+        if sample.capacity > self.minimal_value:
+            return CRITICAL
+        return MINIMAL
+
+    # forget current state, next update() runs entry actions again
+    def reset(self):
+        self.state = None
+        self.__deferred_actions = ()
+
+    # move to the state of given sample, return (state, actions)
+    def update(self, sample):
+        state = self.classify(sample)
+        actions = []
+
+        if state != self.state:
+            if self.state is not None:
+                actions.extend(transition_actions(self.state, state))
+            entry_actions = ENTRY_ACTIONS[state]
+            # 'no battery' is only interesting when running on ac
+            if state == NO_BATTERY and not sample.ac_present:
+                entry_actions = ()
+            self.__deferred_actions = ()
+            if sample.remaining_time < 0 and TIMED_ACTIONS.intersection(entry_actions):
+                self.__deferred_actions = entry_actions
+            else:
+                actions.extend(entry_actions)
+            self.__next_remainder_time = sample.timestamp + self.no_battery_remainder * 60
+            self.state = state
+
+        elif self.__deferred_actions:
+            # remaining time known or not, don't wait longer
+            actions.extend(self.__deferred_actions)
+            self.__deferred_actions = ()
+
+        elif (state == NO_BATTERY and sample.ac_present and self.no_battery_remainder > 0
+              and sample.timestamp >= self.__next_remainder_time):
+            actions.append(NOTIFY_NO_BATTERY)
+            self.__next_remainder_time = sample.timestamp + self.no_battery_remainder * 60
+
+        return state, actions
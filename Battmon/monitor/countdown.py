@@ -0,0 +1,46 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+# sequence of steps run by event loop timers, steps are (seconds after start, step) and callback(step)
+# is called for each of them in order, the loop keeps running meanwhile and cancel() drops the rest
+class Countdown(object):
+    def __init__(self, loop, steps, callback):
+        self.__loop = loop
+        self.__steps = steps
+        self.__callback = callback
+        # timers of steps not run yet, in order
+        self.__timers = []
+
+    @property
+    def running(self):
+        return bool(self.__timers)
+
+    # start from the first step, running countdown starts over
+    def start(self):
+        self.cancel()
+        start = self.__loop.time()
+        self.__timers = [self.__loop.call_at(start + delay, self.__run_step, step) for delay, step in self.__steps]
+
+    def __run_step(self, step):
+        self.__timers.pop(0)
+        self.__callback(step)
+
+    # drop steps not run yet
+    def cancel(self):
+        for timer in self.__timers:
+            timer.cancel()
+        self.__timers = []
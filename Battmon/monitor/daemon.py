@@ -0,0 +1,172 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import atexit
+import os
+import select
+import signal
+import socket
+import sys
+
+# seconds launcher waits for daemon to become ready
+READY_TIMEOUT = 30
+
+# message daemon sends to launcher through readiness pipe
+READY_MESSAGE = b'READY\n'
+
+# log is moved to '<log>.old' when it gets bigger
+MAX_LOG_SIZE = 1024 * 1024
+
+# log lines shown by launcher when daemon failed to start
+FAILED_LOG_LINES = 5
+
+
+# notify systemd (or other service manager speaking its protocol) about service state, e.g. 'READY=1',
+# does nothing when not started by such manager
+def sd_notify(state):
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        notify_socket.sendto(state.encode('utf-8'), address)
+        return True
+    except socket.error as err:
+        print("Error: can't notify service manager: " + str(err))
+        return False
+    finally:
+        notify_socket.close()
+
+
+# last lines of file
+def _tail(path, lines):
+    try:
+        with open(path) as log:
+            return log.read().splitlines()[-lines:]
+    except IOError:
+        return []
+
+
+# launcher side, wait until daemon says it's ready or its end of pipe is closed, then exit
+def _wait_for_daemon(read_fd, child_pid, log_path):
+    # first child exits right after second fork
+    os.waitpid(child_pid, 0)
+    message = b''
+    readable, _, _ = select.select([read_fd], [], [], READY_TIMEOUT)
+    while readable:
+        data = os.read(read_fd, 4096)
+        if not data:
+            break
+        message += data
+        if message.endswith(READY_MESSAGE):
+            os._exit(0)
+    if not readable:
+        print("Error: battmon didn't get ready in %s seconds, see '%s'" % (READY_TIMEOUT, log_path))
+    else:
+        print("Error: battmon failed to start, last lines of '%s':" % log_path)
+        for line in _tail(log_path, FAILED_LOG_LINES):
+            print("  " + line)
+    os._exit(1)
+
+
+# move big log away, so it doesn't grow forever
+def _rotate_log(log_path):
+    try:
+        if os.path.getsize(log_path) > MAX_LOG_SIZE:
+            os.rename(log_path, log_path + '.old')
+    except OSError:
+        pass
+
+
+# point stdin to /dev/null and stdout, stderr to log file, python streams are line buffered again
+def _redirect_stdio(log_path):
+    directory = os.path.dirname(log_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    _rotate_log(log_path)
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(null_fd, 0)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(null_fd)
+    os.close(log_fd)
+    sys.stdout = os.fdopen(1, 'w', 1)
+    sys.stderr = os.fdopen(2, 'w', 1)
+
+
+# daemon side of readiness pipe and its pidfile, pidfile is written only by daemon which got ready
+class Daemon(object):
+    def __init__(self, ready_fd, pid_path):
+        self.__ready_fd = ready_fd
+        self.pid_path = pid_path
+
+    def __write_pid_file(self):
+        try:
+            with open(self.pid_path, 'w') as pid_file:
+                pid_file.write("%d\n" % os.getpid())
+            atexit.register(self.__remove_pid_file)
+        except IOError as err:
+            print("Error: can't write pid file: " + str(err))
+
+    def __remove_pid_file(self):
+        try:
+            os.remove(self.pid_path)
+        except OSError:
+            pass
+
+    # write pidfile and tell launcher that daemon is running, launcher exits with 0
+    def ready(self):
+        if self.__ready_fd is None:
+            return
+        self.__write_pid_file()
+        try:
+            os.write(self.__ready_fd, READY_MESSAGE)
+        except OSError:
+            pass
+        os.close(self.__ready_fd)
+        self.__ready_fd = None
+        sd_notify('READY=1')
+
+
+# detach from terminal and session with double fork, launcher waits until returned Daemon is ready()
+# and exits with 0, or with 1 when daemon exits before
+def daemonize(log_path, pid_path):
+    read_fd, write_fd = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    child_pid = os.fork()
+    if child_pid != 0:
+        os.close(write_fd)
+        _wait_for_daemon(read_fd, child_pid, log_path)
+
+    # new session without controlling terminal, second fork makes sure we never get one again
+    os.close(read_fd)
+    os.setsid()
+    if os.fork() != 0:
+        os._exit(0)
+
+    os.chdir('/')
+    os.umask(0o022)
+    _redirect_stdio(log_path)
+    # exit normally on 'kill', so pidfile is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    return Daemon(write_fd, pid_path)
@@ -0,0 +1,118 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import errno
+import heapq
+import itertools
+import select
+import time
+
+# monotonic clock if available, timers shouldn't jump with wall clock changes
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+# scheduled call, returned by EventLoop.call_later() and EventLoop.call_at()
+class Timer(object):
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    # timer won't fire, cancelling already fired timer does nothing
+    def cancel(self):
+        self.cancelled = True
+
+
+# single threaded loop waiting for file descriptors and timers, clock and sleep functions can be replaced,
+# e.g. by simulated clock, sleep is used only when there are no file descriptors to wait for
+class EventLoop(object):
+    def __init__(self, clock=None, sleep=None):
+        self.__clock = clock or _monotonic
+        self.__sleep = sleep or time.sleep
+        # time given by sleep function doesn't pass while select() waits, file descriptors are only polled
+        self.__polling = sleep is not None
+        # file descriptor -> (file object, callback)
+        self.__readers = {}
+        # heap of (when, sequence number, Timer)
+        self.__timers = []
+        self.__sequence = itertools.count()
+
+    # current loop time in seconds
+    def time(self):
+        return self.__clock()
+
+    # call callback() when file object (anything with fileno()) becomes readable
+    def add_reader(self, fileobj, callback):
+        self.__readers[fileobj.fileno()] = (fileobj, callback)
+
+    # stop watching file object
+    def remove_reader(self, fileobj):
+        self.__readers.pop(fileobj.fileno(), None)
+
+    # call callback(*args) at given loop time
+    def call_at(self, when, callback, *args):
+        timer = Timer(when, callback, args)
+        heapq.heappush(self.__timers, (when, next(self.__sequence), timer))
+        return timer
+
+    # call callback(*args) after delay seconds
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.time() + delay, callback, *args)
+
+    # drop cancelled timers from the top of the heap
+    def __drop_cancelled_timers(self):
+        while self.__timers and self.__timers[0][2].cancelled:
+            heapq.heappop(self.__timers)
+
+    # wait at most timeout seconds (None waits forever) for readable file or due timer,
+    # run their callbacks and return number of callbacks run
+    def run_once(self, timeout=None):
+        self.__drop_cancelled_timers()
+        if self.__timers:
+            timer_timeout = max(0, self.__timers[0][0] - self.time())
+            if timeout is None or timer_timeout < timeout:
+                timeout = timer_timeout
+
+        handled = 0
+        if self.__readers:
+            try:
+                readable, _, _ = select.select(list(self.__readers), [], [], 0 if self.__polling else timeout)
+            except (select.error, OSError) as err:
+                # interrupted by signal, just go back to caller
+                if err.args[0] != errno.EINTR:
+                    raise
+                readable = []
+            if self.__polling and not readable and timeout is not None:
+                self.__sleep(timeout)
+            for fd in readable:
+                reader = self.__readers.get(fd)
+                if reader is not None:
+                    reader[1]()
+                    handled += 1
+        elif timeout is not None:
+            self.__sleep(timeout)
+
+        now = self.time()
+        while self.__timers and self.__timers[0][0] <= now:
+            timer = heapq.heappop(self.__timers)[2]
+            if not timer.cancelled:
+                timer.cancelled = True
+                timer.callback(*timer.args)
+                handled += 1
+        return handled
@@ -0,0 +1,62 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# capacity in percent treated as fully charged, see BatterySample.is_fully_charged
+FULL_CAPACITY = 99
+
+# part of predicted time to next threshold we sleep, so we wake shortly before it's crossed
+SAFETY_FACTOR = 0.8
+
+
+# choose how long to wait before next battery check, from discharge or charge rate and
+# distance to next capacity threshold
+class AdaptiveScheduler(object):
+    def __init__(self, thresholds, min_interval, max_interval, default_interval):
+        # capacity thresholds in percent, e.g. low, critical and minimal values
+        self.thresholds = sorted(thresholds, reverse=True)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # used when rate is unknown
+        self.default_interval = default_interval
+
+    # keep interval between min and max
+    def __clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    # seconds until battery crosses next threshold, None when it can't be predicted
+    def time_to_next_threshold(self, sample):
+        if not sample.battery_present or sample.average_power <= 0 or sample.energy_full <= 0:
+            return None
+        if sample.is_discharging:
+            # capacity is at or below threshold when energy drops under (threshold + 1)% of full energy
+            for threshold in self.thresholds:
+                if sample.capacity > threshold:
+                    energy_left = sample.energy_now - (threshold + 1) * sample.energy_full / 100.0
+                    return max(0.0, energy_left * 60 * 60 / sample.average_power)
+            return None
+        if sample.capacity < FULL_CAPACITY:
+            energy_left = FULL_CAPACITY * sample.energy_full / 100.0 - sample.energy_now
+            return max(0.0, energy_left * 60 * 60 / sample.average_power)
+        return None
+
+    # seconds to wait before next battery check
+    def interval(self, sample):
+        if not sample.battery_present:
+            return self.max_interval
+        predicted = self.time_to_next_threshold(sample)
+        if predicted is None:
+            return self.__clamp(self.default_interval)
+        return self.__clamp(predicted * SAFETY_FACTOR)
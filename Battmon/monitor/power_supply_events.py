@@ -0,0 +1,90 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import errno
+import socket
+
+# netlink protocol and multicast group of kernel uevents
+NETLINK_KOBJECT_UEVENT = 15
+KERNEL_UEVENT_GROUP = 1
+
+# uevent actions meaning power supply was added or removed
+HOTPLUG_ACTIONS = ('add', 'remove')
+
+
+# parse raw kernel uevent message, return (action, {key: value}) or None if it's not a uevent
+def parse_uevent(message):
+    parts = message.split(b'\0')
+    action, sep, devpath = parts[0].partition(b'@')
+    if not sep:
+        return None
+    values = {}
+    for part in parts[1:]:
+        key, sep, value = part.partition(b'=')
+        if sep:
+            values[key.decode('ascii', 'replace')] = value.decode('utf-8', 'replace')
+    return action.decode('ascii', 'replace'), values
+
+
+# parse raw kernel uevent message, return (action, {key: value}) of power_supply event, None for other ones
+def parse_power_supply_event(message):
+    event = parse_uevent(message)
+    if event is not None and event[1].get('SUBSYSTEM') == 'power_supply':
+        return event
+    return None
+
+
+# listen for kernel power_supply uevents: ac plugged/unplugged, battery inserted/removed, status changes
+class PowerSupplyEvents(object):
+    def __init__(self):
+        self.__socket = socket.socket(getattr(socket, 'AF_NETLINK', 16), socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        try:
+            self.__socket.bind((0, KERNEL_UEVENT_GROUP))
+            self.__socket.setblocking(False)
+        except socket.error:
+            self.__socket.close()
+            raise
+
+    # open listener, return None when netlink isn't available (not linux, no permissions, sandbox)
+    @classmethod
+    def open(cls):
+        try:
+            return cls()
+        except (socket.error, AttributeError, ValueError) as err:
+            print("Can't listen for power supply events, falling back to polling: " + str(err))
+            return None
+
+    # socket file descriptor for select()
+    def fileno(self):
+        return self.__socket.fileno()
+
+    # read all pending messages, return list of (action, values) of power_supply events
+    def read_events(self):
+        events = []
+        while True:
+            try:
+                message = self.__socket.recv(8192)
+            except socket.error as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            event = parse_power_supply_event(message)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def close(self):
+        self.__socket.close()
@@ -0,0 +1,105 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import os
+import signal
+import time
+
+# seconds of cpu time between samples
+SAMPLE_INTERVAL = 0.005
+
+# functions shown in report
+REPORT_LIMIT = 25
+
+
+# sampling profiler, takes python stack every SAMPLE_INTERVAL of cpu time used by the process,
+# nothing is sampled while process sleeps, so idle daemon costs nothing
+class SamplingProfiler(object):
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.__interval = interval
+        self.__previous_handler = None
+        self.__started = None
+        self.__duration = 0.0
+        # (filename, line, function) -> samples with it on top of stack / anywhere in stack
+        self.__own_samples = {}
+        self.__total_samples = {}
+        self.samples = 0
+        self.running = False
+
+    def __sample(self, signum, frame):
+        self.samples += 1
+        seen = set()
+        top = True
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if top:
+                self.__own_samples[key] = self.__own_samples.get(key, 0) + 1
+                top = False
+            if key not in seen:
+                seen.add(key)
+                self.__total_samples[key] = self.__total_samples.get(key, 0) + 1
+            frame = frame.f_back
+
+    # start sampling, previous samples are dropped
+    def start(self):
+        if self.running:
+            return
+        self.__own_samples = {}
+        self.__total_samples = {}
+        self.samples = 0
+        self.__previous_handler = signal.signal(signal.SIGPROF, self.__sample)
+        signal.setitimer(signal.ITIMER_PROF, self.__interval, self.__interval)
+        self.__started = time.time()
+        self.running = True
+
+    def stop(self):
+        if not self.running:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.__previous_handler or signal.SIG_DFL)
+        self.__duration = time.time() - self.__started
+        self.running = False
+
+    # start when stopped, stop when running, return True when running
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    # text report of functions with most samples
+    def report(self, limit=REPORT_LIMIT):
+        duration = (time.time() - self.__started) if self.running else self.__duration
+        lines = ["%d samples every %.1f ms of cpu time in %.1f sec" % (self.samples, self.__interval * 1000,
+                                                                       duration),
+                 "%8s %8s  %s" % ('own', 'total', 'function')]
+        functions = sorted(self.__total_samples, key=lambda key: (-self.__own_samples.get(key, 0),
+                                                                  -self.__total_samples[key]))
+        for filename, line, name in functions[:limit]:
+            key = (filename, line, name)
+            lines.append("%8d %8d  %s (%s:%d)" % (self.__own_samples.get(key, 0), self.__total_samples[key], name,
+                                                  os.path.basename(filename), line))
+        return '\n'.join(lines)
+
+    # write report to file
+    def dump(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as report_file:
+            report_file.write(self.report() + '\n')
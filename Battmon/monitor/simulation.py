@@ -0,0 +1,249 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import argparse
+import math
+import time
+
+# local imports
+from values import internal_config, power_supply_sources, program_index
+from monitor import battery_monitor
+from notifications import notification_dispatcher
+
+# most precise clock for measuring decision cost
+_perf_counter = getattr(time, 'perf_counter', time.time)
+
+# default simulated battery, 50Wh in uWh
+DEFAULT_ENERGY_FULL = 50000000
+
+# simulation start, fixed so runs are reproducible
+START_TIME = 1500000000.0
+
+
+# clock which only moves when told to
+class SimulatedClock(object):
+    def __init__(self, start=START_TIME):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+# battery discharged with power changing like a real load, hours is time from full to empty
+class SimulatedBattery(object):
+    def __init__(self, hours, energy_full=DEFAULT_ENERGY_FULL):
+        self.energy_full = energy_full
+        self.energy_now = energy_full
+        self.average_power = energy_full / float(hours)
+        self.elapsed = 0.0
+        self.ac_present = False
+
+    # power drawn at given second, +-30% around average, mean over every 10 minutes is the average
+    def power_at(self, elapsed):
+        return self.average_power * (1 + 0.3 * math.sin(elapsed * 2 * math.pi / 600))
+
+    # discharge battery by seconds of load, energy is integral of power_at(), on ac it's kept as it is
+    def advance(self, seconds):
+        start, end = self.elapsed, self.elapsed + seconds
+        if not self.ac_present:
+            period = 600 / (2 * math.pi)
+            used = self.average_power * (seconds + 0.3 * period * (math.cos(start / period) - math.cos(end / period)))
+            self.energy_now = max(0, self.energy_now - used / 3600.0)
+        self.elapsed = end
+
+    # write battery and ac to fake source
+    def write(self, source):
+        source.set_device('BAT0', 'Battery', {'PRESENT': 1,
+                                              'STATUS': 'Not charging' if self.ac_present else 'Discharging',
+                                              'ENERGY_NOW': int(self.energy_now),
+                                              'ENERGY_FULL': self.energy_full,
+                                              'POWER_NOW': 0 if self.ac_present else int(self.power_at(self.elapsed))})
+        source.set_device('AC', 'Mains', {'ONLINE': 1 if self.ac_present else 0})
+
+
+# dispatcher keeping notifications and commands instead of showing and running them
+class RecordingDispatcher(notification_dispatcher.NotificationDispatcher):
+    def __init__(self, clock):
+        notification_dispatcher.NotificationDispatcher.__init__(self)
+        self.__clock = clock
+        # (time, summary, body, urgency, replaces_id) of shown notifications
+        self.notifications = []
+        # (time, command) of commands which would be run
+        self.commands = []
+
+    def available(self):
+        return True
+
+    def notify(self, summary, body='', timeout=-1, urgency=notification_dispatcher.URGENCY_NORMAL, replaces_id=0):
+        self.notifications.append((self.__clock(), summary, body, urgency, replaces_id))
+        self.last_shown_time = self.__clock()
+        self.last_latency = 0.0
+        self.notifications_sent += 1
+        return replaces_id or len(self.notifications)
+
+    def run(self, command, shell=False):
+        self.commands.append((self.__clock(), command))
+
+
+# Monitor running on fake source and simulated clock, nothing is shown, played, run, forked or cached,
+# its waits move the clock and call on_sleep(seconds), e.g. to discharge simulated battery,
+# other Monitor arguments can be changed with options, e.g. config_file
+class Simulation(object):
+    def __init__(self, source, clock, low_value=23, critical_value=7, minimal_value=3, update_interval=1,
+                 no_battery_remainder=0, on_sleep=None, **options):
+        self.clock = clock
+        self.__on_sleep = on_sleep
+        self.dispatcher = RecordingDispatcher(clock.time)
+        monitor_options = dict(debug=False, test=False, foreground=True, more_then_one_instance=True,
+                               lock_command='true', disable_notifications=False, critical=False,
+                               sound_file=internal_config.DEFAULT_SOUND_FILE_PATH, play_sound=False, sound_volume=1,
+                               timeout=6, battery_update_timeout=update_interval,
+                               battery_min_update_interval=update_interval,
+                               battery_max_update_interval=update_interval,
+                               device_rescan_interval=internal_config.DEFAULT_DEVICE_RESCAN_INTERVAL,
+                               battery_low_value=low_value, battery_critical_value=critical_value,
+                               battery_minimal_value=minimal_value, minimal_battery_level_command='poweroff',
+                               set_no_battery_remainder=no_battery_remainder, disable_startup_notifications=True,
+                               use_power_supply_events=False, record_history=False, history_file='',
+                               config_file='', health_file='', programs=program_index.ProgramIndex(cache_file=''))
+        monitor_options.update(options)
+        self.monitor = battery_monitor.Monitor(source=source, clock=clock.time, sleep=self.__sleep,
+                                               dispatcher=self.dispatcher, **monitor_options)
+        # startup notifications about missing programs depend on installed ones
+        del self.dispatcher.notifications[:]
+        # (timestamp, capacity, state, actions) of ticks with actions
+        self.events = []
+        self.ticks = 0
+        # seconds spent in ticks, measured with real clock
+        self.decision_time = 0.0
+
+    def __sleep(self, seconds):
+        self.clock.advance(seconds)
+        if self.__on_sleep is not None:
+            self.__on_sleep(seconds)
+
+    # one monitor check and wait for the next one, return (sample, state, actions)
+    def tick(self):
+        start = _perf_counter()
+        sample, state, actions = self.monitor.run_once()
+        self.decision_time += _perf_counter() - start
+        self.ticks += 1
+        if actions:
+            self.events.append((sample.timestamp, sample.capacity, state, actions))
+        return sample, state, actions
+
+    # mean cost of check and simulated wait per tick in seconds
+    def tick_cost(self):
+        return self.decision_time / self.ticks if self.ticks else 0.0
+
+    def close(self):
+        self.monitor.close()
+
+
+# discharge simulated battery from full until minimal battery level command is run, ac is plugged
+# and unplugged at (seconds after start, ac present) changes
+def run_discharge(hours=8, low_value=23, critical_value=7, minimal_value=3, update_interval=1, ac_changes=()):
+    clock = SimulatedClock()
+    source = power_supply_sources.FakeSource()
+    battery = SimulatedBattery(hours)
+    battery.write(source)
+    ac_changes = sorted(ac_changes)
+
+    def on_sleep(seconds):
+        battery.advance(seconds)
+        while ac_changes and ac_changes[0][0] <= battery.elapsed:
+            battery.ac_present = ac_changes.pop(0)[1]
+        battery.write(source)
+
+    simulation = Simulation(source, clock, low_value, critical_value, minimal_value, update_interval,
+                            on_sleep=on_sleep)
+    # the command is run less than a minute after battery is empty
+    end = START_TIME + hours * 3600 * 2 + max([change[0] for change in ac_changes] or [0])
+    while not simulation.dispatcher.commands and clock.now < end:
+        simulation.tick()
+    simulation.close()
+    return simulation
+
+
+# write battery and ac of trace record to fake source
+def _write_record(source, record):
+    source.set_device('BAT0', 'Battery', record.battery_values())
+    source.set_device('AC', 'Mains', record.ac_values())
+
+
+# replay recorded trace records (see power_supply_sources.read_trace), the newest record up to simulated
+# time is what monitor reads
+def run_replay(records, low_value=23, critical_value=7, minimal_value=3, update_interval=1):
+    clock = SimulatedClock(records[0].timestamp if records else START_TIME)
+    source = power_supply_sources.FakeSource()
+    pending = list(records)
+
+    def on_sleep(seconds):
+        record = None
+        while pending and pending[0].timestamp <= clock.now:
+            record = pending.pop(0)
+        if record is not None:
+            _write_record(source, record)
+
+    # devices are found when simulation starts
+    on_sleep(0)
+    simulation = Simulation(source, clock, low_value, critical_value, minimal_value, update_interval,
+                            on_sleep=on_sleep)
+    while pending:
+        simulation.tick()
+    simulation.close()
+    return simulation
+
+
+# print simulation events and cost
+def print_report(simulation, elapsed):
+    start = None
+    for timestamp, capacity, state, actions in simulation.events:
+        if start is None:
+            start = timestamp
+        minutes = (timestamp - start) / 60
+        print("%4dh %02dmin %3s%% %-12s %s" % (minutes // 60, minutes % 60, capacity, state, ', '.join(actions)))
+    for timestamp, command in simulation.dispatcher.commands:
+        minutes = (timestamp - start) / 60 if start is not None else 0
+        print("%4dh %02dmin run '%s'" % (minutes // 60, minutes % 60, command))
+    print("%d ticks in %.3f sec, %.1f us per tick"
+          % (simulation.ticks, elapsed, simulation.tick_cost() * 1000000))
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Run Battmon battery decisions on simulated or recorded battery, "
+                                             "run from Battmon directory: python -m monitor.simulation")
+    ap.add_argument("-H", "--hours", type=float, default=8, help="hours simulated battery lasts")
+    ap.add_argument("-r", "--replay", metavar="<PATH>",
+                    help="replay csv trace or battery history file instead of simulation")
+    ap.add_argument("-ef", "--energy-full", type=int, help="full energy in uWh for history file replay")
+    ap.add_argument("-ll", "--low-level-value", type=int, default=23)
+    ap.add_argument("-cl", "--critical-level-value", type=int, default=7)
+    ap.add_argument("-ml", "--minimal-level-value", type=int, default=3)
+    ap.add_argument("-i", "--update-interval", type=float, default=1, help="seconds between battery checks")
+    options = ap.parse_args()
+
+    levels = (options.low_level_value, options.critical_level_value, options.minimal_level_value,
+              options.update_interval)
+    started = _perf_counter()
+    if options.replay:
+        result = run_replay(power_supply_sources.read_trace(options.replay, options.energy_full), *levels)
+    else:
+        result = run_discharge(options.hours, *levels)
+    print_report(result, _perf_counter() - started)
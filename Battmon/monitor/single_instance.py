@@ -0,0 +1,198 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import errno
+import os
+import socket
+import time
+
+# local imports
+from values import internal_config
+
+# seconds to wait for the other side of instance socket
+SOCKET_TIMEOUT = 2.0
+
+# command keeping client connected, it gets answer line and then every published line
+SUBSCRIBE_COMMAND = 'subscribe'
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+# linux abstract socket name, one per user, it disappears with the process holding it
+def instance_address():
+    return '\0%s-%d' % (internal_config.PROGRAM_NAME, os.getuid())
+
+
+# send one line command to running instance and return its one line answer,
+# None when no instance is running
+def send_command(command, address=None):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(SOCKET_TIMEOUT)
+    try:
+        try:
+            client.connect(address or instance_address())
+        except socket.error as err:
+            if err.args[0] in (errno.ECONNREFUSED, errno.ENOENT):
+                return None
+            raise
+        client.sendall(command.encode('utf-8') + b'\n')
+        answer = b''
+        while not answer.endswith(b'\n'):
+            data = client.recv(4096)
+            if not data:
+                break
+            answer += data
+        return answer.decode('utf-8', 'replace').strip()
+    finally:
+        client.close()
+
+
+# connect to running instance, subscribe and yield every line it pushes, nothing when no instance is running
+def subscribe(address=None):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(address or instance_address())
+        except socket.error as err:
+            if err.args[0] in (errno.ECONNREFUSED, errno.ENOENT):
+                return
+            raise
+        client.sendall(SUBSCRIBE_COMMAND.encode('utf-8') + b'\n')
+        buffered = b''
+        while True:
+            data = client.recv(4096)
+            if not data:
+                return
+            buffered += data
+            while b'\n' in buffered:
+                line, buffered = buffered.split(b'\n', 1)
+                yield line.decode('utf-8', 'replace')
+    finally:
+        client.close()
+
+
+# bound abstract socket guaranteeing only one running instance, checking it takes one bind() call,
+# other instances can send commands to it, handler(command) returns answer line,
+# subscribed clients get every line given to publish(), sockets are read on event loop and never block it,
+# clients not sending their command in SOCKET_TIMEOUT seconds are dropped
+class InstanceServer(object):
+    def __init__(self, handler, event_loop, address=None):
+        self.__handler = handler
+        self.__event_loop = event_loop
+        # client socket -> (received bytes, timer dropping it)
+        self.__clients = {}
+        self.__subscribers = []
+        # seconds last publish() took
+        self.last_publish_time = 0.0
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.__socket.bind(address or instance_address())
+        except socket.error as err:
+            self.__socket.close()
+            if err.args[0] == errno.EADDRINUSE:
+                raise AlreadyRunning()
+            raise
+        self.__socket.listen(5)
+        self.__socket.setblocking(False)
+        self.__event_loop.add_reader(self.__socket, self.__accept)
+
+    # socket file descriptor
+    def fileno(self):
+        return self.__socket.fileno()
+
+    # accept one client, its command is read when it comes
+    def __accept(self):
+        try:
+            client, _ = self.__socket.accept()
+        except socket.error as err:
+            # client gave up before it was accepted
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED):
+                print("Error: instance socket: " + str(err))
+            return
+        client.setblocking(False)
+        self.__clients[client] = (b'', self.__event_loop.call_later(SOCKET_TIMEOUT, self.__drop, client))
+        self.__event_loop.add_reader(client, lambda: self.__read(client))
+
+    # read command of client and answer it, subscriber is kept, other clients are closed
+    def __read(self, client):
+        try:
+            data = client.recv(4096)
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            data = b''
+        if client in self.__subscribers:
+            # subscribers don't send anything more, empty read is closed connection
+            if not data:
+                self.__subscribers.remove(client)
+                self.__drop(client)
+            return
+        command, timer = self.__clients[client]
+        command += data
+        if data and not command.endswith(b'\n') and len(command) < 4096:
+            self.__clients[client] = (command, timer)
+            return
+        timer.cancel()
+        del self.__clients[client]
+        command = command.decode('utf-8', 'replace').strip()
+        try:
+            client.sendall(self.__handler(command).encode('utf-8') + b'\n')
+        except socket.error as err:
+            print("Error: instance socket client: " + str(err))
+            self.__drop(client)
+            return
+        if command == SUBSCRIBE_COMMAND:
+            self.__subscribers.append(client)
+        else:
+            self.__drop(client)
+
+    # stop watching client and close it
+    def __drop(self, client):
+        self.__clients.pop(client, None)
+        self.__event_loop.remove_reader(client)
+        client.close()
+
+    # number of subscribed clients
+    def subscribers(self):
+        return len(self.__subscribers)
+
+    # send line to all subscribers, closed ones and ones too slow to take whole line are dropped
+    def publish(self, line):
+        start = time.time()
+        data = line.encode('utf-8') + b'\n'
+        subscribers = []
+        for client in self.__subscribers:
+            try:
+                if client.send(data) == len(data):
+                    subscribers.append(client)
+                    continue
+            except socket.error:
+                pass
+            self.__drop(client)
+        self.__subscribers = subscribers
+        self.last_publish_time = time.time() - start
+
+    def close(self):
+        for client, (_, timer) in list(self.__clients.items()):
+            timer.cancel()
+            self.__drop(client)
+        for client in self.__subscribers:
+            self.__drop(client)
+        self.__subscribers = []
+        self.__event_loop.remove_reader(self.__socket)
+        self.__socket.close()
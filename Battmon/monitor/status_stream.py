@@ -0,0 +1,139 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import json
+import string
+import sys
+
+# local imports
+from values import formatting, internal_config, read_battery_values
+from monitor import event_loop, power_supply_events
+
+# fields usable in stream template
+TEMPLATE_FIELDS = ('capacity', 'status', 'time', 'power', 'source')
+
+# i3bar protocol header, see i3bar-protocol(7)
+I3BAR_HEADER = '{"version":1}\n[\n'
+
+
+# check stream template, return list of errors
+def check_template(template):
+    errors = []
+    try:
+        for _, field, _, _ in string.Formatter().parse(template):
+            if field is not None and field not in TEMPLATE_FIELDS:
+                errors.append("unknown field '{%s}', possible fields are: %s"
+                              % (field, ', '.join('{%s}' % name for name in TEMPLATE_FIELDS)))
+    except ValueError as err:
+        errors.append(str(err))
+    return errors
+
+
+# write status line for every sample whose formatted text differs from previous one,
+# plain text lines or i3bar json protocol
+class StatusStream(object):
+    def __init__(self, template, i3bar=False, critical_value=0, output=None):
+        self.__template = formatting.Template(template)
+        self.__i3bar = i3bar
+        self.__critical_value = critical_value
+        self.__output = output or sys.stdout
+        self.__last_line = None
+        self.__started = False
+        # number of written lines
+        self.lines_written = 0
+
+    # status text from sample
+    def format(self, sample):
+        if not sample.battery_present:
+            status = 'No battery'
+        else:
+            status = sample.status
+        return self.__template.render(capacity=sample.capacity,
+                                      status=status,
+                                      time=sample.battery_time,
+                                      power='%.1fW' % (sample.average_power / 1000000.0),
+                                      source='AC' if sample.ac_present else 'BAT')
+
+    # i3bar status block
+    def __i3bar_line(self, text, sample):
+        block = {'name': internal_config.PROGRAM_NAME, 'full_text': text}
+        if sample.is_discharging and sample.capacity <= self.__critical_value:
+            block['urgent'] = True
+        line = json.dumps([block], separators=(',', ':'))
+        # every status line after first one is next element of endless json array
+        return (',' + line) if self.__started else line
+
+    # write status when text changed, return True if something was written
+    def write(self, sample):
+        text = self.format(sample)
+        if text == self.__last_line:
+            return False
+        self.__last_line = text
+
+        if self.__i3bar:
+            if not self.__started:
+                self.__output.write(I3BAR_HEADER)
+            text = self.__i3bar_line(text, sample)
+        self.__started = True
+        self.__output.write(text + '\n')
+        self.__output.flush()
+        self.lines_written += 1
+        return True
+
+
+# sample batteries and write status lines until interrupted, status is written right after power supply
+# event and at least every update interval
+def run_stream(template, i3bar, update_interval, rescan_interval, critical_value, use_power_supply_events):
+    # stdout belongs to the bar, other messages go to stderr
+    stream = StatusStream(template, i3bar, critical_value, sys.stdout)
+    sys.stdout = sys.stderr
+
+    battery_values = read_battery_values.BatteryValues(rescan_interval)
+    loop = event_loop.EventLoop()
+    events = power_supply_events.PowerSupplyEvents.open() if use_power_supply_events else None
+
+    # power supply event came while waiting, other kernel events don't count
+    changed = [False]
+
+    # rescan devices on hotplug, next sample is taken right after power supply event
+    def on_power_supply_events():
+        power_events = events.read_events()
+        if power_events:
+            changed[0] = True
+        for action, _ in power_events:
+            if action in power_supply_events.HOTPLUG_ACTIONS:
+                battery_values.rescan()
+
+    if events is not None:
+        loop.add_reader(events, on_power_supply_events)
+    try:
+        while True:
+            stream.write(battery_values.sample())
+            deadline = loop.time() + update_interval
+            changed[0] = False
+            while not changed[0]:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                loop.run_once(timeout)
+    except KeyboardInterrupt:
+        pass
+    except IOError:
+        # bar closed its end of pipe
+        pass
+    finally:
+        if events is not None:
+            events.close()
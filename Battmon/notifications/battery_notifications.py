@@ -14,186 +14,105 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-import os
-import time
-
 # local imports
-from values import internal_config
+from notifications import notification_dispatcher, notification_queue
+from values import formatting
+
+# notification bodies, rendered only when notification is really shown
+NO_BODY = formatting.Template('')
+CAPACITY_BODY = formatting.Template("current capacity: {capacity}%\n time left: {time}")
+MINIMAL_LEVEL_BODY = formatting.Template("system will be {command} in {seconds}\n current capacity: {capacity}%\n"
+                                         " time left: {time}")
 
 
 # deal with standard battery notifications
 class BatteryNotifications(object):
-    def __init__(self, disable_notifications, notify_send, critical, sound, sound_command, timeout):
+    def __init__(self, disable_notifications, notify_send, critical, sound, sound_player, timeout, dispatcher,
+                 queue=None):
         self.__disable_notifications = disable_notifications
         self.__notify_send = notify_send
         self.__critical = critical
         self.__sound = sound
-        self.__sound_command = sound_command
+        self.__sound_player = sound_player
         self.__timeout = timeout
+        self.__dispatcher = dispatcher
+        # coalescing queue, notifications are shown right away without it
+        self.__queue = queue
+
+    # play sound and show notification or print message when notifications can't be shown,
+    # not critical notifications are skipped when only critical ones should be shown,
+    # notification goes through queue, which shows only the last one of its category,
+    # body template is rendered with body values only when notification is shown
+    def __show(self, category, summary, body, body_values, message, critical=False, timeout=None,
+               urgency=notification_dispatcher.URGENCY_NORMAL):
+        if self.__disable_notifications and not self.__sound:
+            return
+        if not self.__disable_notifications and not (critical or not self.__critical):
+            return
+
+        def show(replaces_id):
+            # if use sound only
+            if self.__sound and self.__disable_notifications:
+                self.__sound_player.play()
+                return 0
+            # notification
+            if self.__sound:
+                self.__sound_player.play()
+            if self.__notify_send:
+                return self.__dispatcher.notify(summary, body.render(**body_values),
+                                                self.__timeout if timeout is None else timeout, urgency, replaces_id)
+            print(message)
+            return 0
+
+        if self.__queue is None:
+            show(0)
+        else:
+            self.__queue.submit(category, show, urgency == notification_dispatcher.URGENCY_CRITICAL)
 
     # battery discharging notification
     def battery_discharging(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "DISCHARGING\n" "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("DISCHARGING")
+        self.__show(notification_queue.CATEGORY_POWER, "DISCHARGING",
+                    CAPACITY_BODY, {'capacity': capacity, 'time': battery_time}, "DISCHARGING")
 
     # battery low capacity notification
     def low_capacity_level(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "LOW BATTERY LEVEL\n" \
-                                     "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("LOW BATTERY LEVEL")
+        self.__show(notification_queue.CATEGORY_LEVEL, "LOW BATTERY LEVEL",
+                    CAPACITY_BODY, {'capacity': capacity, 'time': battery_time}, "LOW BATTERY LEVEL")
 
     # battery critical level notification
     def critical_battery_level(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "CRITICAL BATTERY LEVEL\n" \
-                                     "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("CRITICAL BATTERY LEVEL")
+        self.__show(notification_queue.CATEGORY_LEVEL, "CRITICAL BATTERY LEVEL",
+                    CAPACITY_BODY, {'capacity': capacity, 'time': battery_time},
+                    "CRITICAL BATTERY LEVEL", critical=True, urgency=notification_dispatcher.URGENCY_CRITICAL)
 
     # hibernate level notification
     def minimal_battery_level(self, capacity, battery_time, minimal_battery_command, notification_timeout):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            if self.__notify_send:
-                if self.__sound:
-                    os.popen(self.__sound_command)
-                message_string = "system will be %s in %s\n current capacity: %s%s\n time left: %s" \
-                                 % (minimal_battery_command, int(notification_timeout / 1000),
-                                    capacity, '%', battery_time)
-
-                notify_send_string = '''notify-send "!!! MINIMAL BATTERY LEVEL !!!\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(notification_timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! MINIMAL BATTERY LEVEL !!!")
+        self.__show(notification_queue.CATEGORY_MINIMAL, "!!! MINIMAL BATTERY LEVEL !!!", MINIMAL_LEVEL_BODY,
+                    {'command': minimal_battery_command, 'seconds': int(notification_timeout / 1000),
+                     'capacity': capacity, 'time': battery_time},
+                    "!!! MINIMAL BATTERY LEVEL !!!", critical=True, timeout=notification_timeout,
+                    urgency=notification_dispatcher.URGENCY_CRITICAL)
 
     # battery full notification
     def full_battery(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "BATTERY FULL" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("BATTERY FULL")
+        self.__show(notification_queue.CATEGORY_POWER, "BATTERY FULL", NO_BODY, {}, "BATTERY FULL")
 
     # charging notification
     def battery_charging(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "CHARGING\n" "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("CHARGING")
+        self.__show(notification_queue.CATEGORY_POWER, "CHARGING",
+                    CAPACITY_BODY, {'capacity': capacity, 'time': battery_time}, "CHARGING")
 
     # battery removed notification
     def battery_removed(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "!!! BATTERY REMOVED !!!" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! BATTERY REMOVED !!!")
+        self.__show(notification_queue.CATEGORY_BATTERY, "!!! BATTERY REMOVED !!!", NO_BODY, {},
+                    "!!! BATTERY REMOVED !!!", critical=True)
 
     # battery plugged notification
     def battery_plugged(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "BATTERY PLUGGED " %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("Battery plugged !!!")
+        self.__show(notification_queue.CATEGORY_BATTERY, "BATTERY PLUGGED", NO_BODY, {}, "Battery plugged !!!",
+                    critical=True)
 
     # no battery notification
     def no_battery(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "!!! NO BATTERY !!!" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! NO BATTERY !!!")
+        self.__show(notification_queue.CATEGORY_BATTERY, "!!! NO BATTERY !!!", NO_BODY, {}, "!!! NO BATTERY !!!",
+                    critical=True)
@@ -0,0 +1,297 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import binascii
+import os
+import socket
+import struct
+
+# message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+# header fields
+FIELD_PATH = 1
+FIELD_INTERFACE = 2
+FIELD_MEMBER = 3
+FIELD_ERROR_NAME = 4
+FIELD_REPLY_SERIAL = 5
+FIELD_DESTINATION = 6
+FIELD_SIGNATURE = 8
+
+# fixed size basic types: (struct format, alignment)
+_BASIC_TYPES = {'y': ('B', 1), 'b': ('I', 4), 'n': ('h', 2), 'q': ('H', 2), 'i': ('i', 4), 'u': ('I', 4),
+                'x': ('q', 8), 't': ('Q', 8), 'd': ('d', 8), 'h': ('I', 4)}
+
+# alignment of container types
+_CONTAINER_ALIGNMENT = {'s': 4, 'o': 4, 'g': 1, 'a': 4, '(': 8, '{': 8, 'v': 1}
+
+# message bus
+BUS_NAME = 'org.freedesktop.DBus'
+BUS_PATH = '/org/freedesktop/DBus'
+
+
+class DBusError(Exception):
+    pass
+
+
+# alignment of type starting at signature[0]
+def _alignment(signature):
+    if signature[0] in _BASIC_TYPES:
+        return _BASIC_TYPES[signature[0]][1]
+    return _CONTAINER_ALIGNMENT[signature[0]]
+
+
+# end index of single complete type starting at signature[start]
+def _type_end(signature, start):
+    code = signature[start]
+    if code == 'a':
+        return _type_end(signature, start + 1)
+    if code in '({':
+        closing = ')' if code == '(' else '}'
+        index = start + 1
+        while signature[index] != closing:
+            index = _type_end(signature, index)
+        return index + 1
+    return start + 1
+
+
+# split signature into single complete types, e.g. 'sa{sv}i' -> ['s', 'a{sv}', 'i']
+def split_signature(signature):
+    types = []
+    index = 0
+    while index < len(signature):
+        end = _type_end(signature, index)
+        types.append(signature[index:end])
+        index = end
+    return types
+
+
+# D-Bus wire format writer, values of 'v' type are (signature, value) tuples
+class _Writer(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def align(self, alignment):
+        self.data.extend(b'\0' * (-len(self.data) % alignment))
+
+    def write(self, signature, value):
+        code = signature[0]
+        self.align(_alignment(signature))
+        if code in _BASIC_TYPES:
+            self.data.extend(struct.pack('<' + _BASIC_TYPES[code][0], value))
+        elif code in 'so':
+            encoded = value.encode('utf-8')
+            self.data.extend(struct.pack('<I', len(encoded)) + encoded + b'\0')
+        elif code == 'g':
+            encoded = value.encode('ascii')
+            self.data.extend(struct.pack('<B', len(encoded)) + encoded + b'\0')
+        elif code == 'v':
+            self.write('g', value[0])
+            self.write(value[0], value[1])
+        elif code == 'a':
+            element = signature[1:]
+            length_offset = len(self.data)
+            self.data.extend(b'\0\0\0\0')
+            self.align(_alignment(element))
+            start = len(self.data)
+            items = value.items() if element[0] == '{' else value
+            for item in items:
+                self.write(element, item)
+            struct.pack_into('<I', self.data, length_offset, len(self.data) - start)
+        elif code in '({':
+            for item_signature, item in zip(split_signature(signature[1:-1]), value):
+                self.write(item_signature, item)
+        else:
+            raise DBusError("Unsupported type '%s'" % signature)
+
+
+# D-Bus wire format reader, variants are returned as their values
+class _Reader(object):
+    def __init__(self, data, offset=0, endian='<'):
+        self.data = data
+        self.offset = offset
+        self.endian = endian
+
+    def align(self, alignment):
+        self.offset += -self.offset % alignment
+
+    def __unpack(self, fmt):
+        fmt = self.endian + fmt
+        value = struct.unpack_from(fmt, self.data, self.offset)[0]
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def read(self, signature):
+        code = signature[0]
+        self.align(_alignment(signature))
+        if code in _BASIC_TYPES:
+            return self.__unpack(_BASIC_TYPES[code][0])
+        if code in 'sog':
+            length = self.__unpack('B' if code == 'g' else 'I')
+            value = bytes(self.data[self.offset:self.offset + length]).decode('utf-8')
+            self.offset += length + 1
+            return value
+        if code == 'v':
+            return self.read(self.read('g'))
+        if code == 'a':
+            element = signature[1:]
+            length = self.__unpack('I')
+            self.align(_alignment(element))
+            end = self.offset + length
+            items = []
+            while self.offset < end:
+                items.append(self.read(element))
+            return dict(items) if element[0] == '{' else items
+        if code in '({':
+            return tuple(self.read(item_signature) for item_signature in split_signature(signature[1:-1]))
+        raise DBusError("Unsupported type '%s'" % signature)
+
+
+# serialize message, fields is a list of (field code, (signature, value))
+def build_message(message_type, serial, fields, signature='', args=(), flags=0):
+    body = _Writer()
+    for item_signature, item in zip(split_signature(signature), args):
+        body.write(item_signature, item)
+    if signature:
+        fields = list(fields) + [(FIELD_SIGNATURE, ('g', signature))]
+
+    header = _Writer()
+    header.data.extend(struct.pack('<cBBBII', b'l', message_type, flags, 1, len(body.data), serial))
+    header.write('a(yv)', fields)
+    header.align(8)
+    return bytes(header.data + body.data)
+
+
+# size of whole message from its first 16 bytes
+def message_size(data):
+    endian = '<' if data[:1] == b'l' else '>'
+    body_length, _, fields_length = struct.unpack_from(endian + 'III', data, 4)
+    header_length = 16 + fields_length
+    header_length += -header_length % 8
+    return header_length + body_length
+
+
+# parse message, return (message type, {field code: value}, body values)
+def parse_message(data):
+    endian = '<' if data[:1] == b'l' else '>'
+    message_type = struct.unpack_from('B', data, 1)[0]
+    reader = _Reader(data, 12, endian)
+    fields = dict(reader.read('a(yv)'))
+    reader.align(8)
+    body = ()
+    signature = fields.get(FIELD_SIGNATURE, '')
+    if signature:
+        body = tuple(reader.read(item_signature) for item_signature in split_signature(signature))
+    return message_type, fields, body
+
+
+# socket addresses from bus address string, e.g. 'unix:path=/run/user/1000/bus'
+def parse_address(address):
+    addresses = []
+    for part in address.split(';'):
+        transport, _, options = part.partition(':')
+        if transport != 'unix':
+            continue
+        values = dict(option.partition('=')[::2] for option in options.split(',') if option)
+        if 'path' in values:
+            addresses.append(values['path'])
+        elif 'abstract' in values:
+            addresses.append('\0' + values['abstract'])
+    return addresses
+
+
+# blocking connection to message bus, authenticated with EXTERNAL mechanism
+class DBusConnection(object):
+    def __init__(self, address, timeout=1.0):
+        self.__socket = None
+        self.__buffer = b''
+        self.__serial = 0
+        error = None
+        for socket_address in parse_address(address):
+            try:
+                self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.__socket.settimeout(timeout)
+                self.__socket.connect(socket_address)
+                break
+            except socket.error as err:
+                self.__socket.close()
+                self.__socket = None
+                error = err
+        if self.__socket is None:
+            raise DBusError("Can't connect to bus '%s': %s" % (address, error))
+
+        try:
+            self.__authenticate()
+            self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_NAME, 'Hello')[0]
+        except (socket.error, DBusError, struct.error):
+            self.close()
+            raise
+
+    def __authenticate(self):
+        uid = binascii.hexlify(str(os.getuid()).encode('ascii'))
+        self.__socket.sendall(b'\0AUTH EXTERNAL ' + uid + b'\r\n')
+        line = self.__read_line()
+        if not line.startswith(b'OK'):
+            raise DBusError("Bus authentication failed: %s" % line.decode('ascii', 'replace'))
+        self.__socket.sendall(b'BEGIN\r\n')
+
+    def __receive(self):
+        data = self.__socket.recv(4096)
+        if not data:
+            raise DBusError("Bus connection closed")
+        self.__buffer += data
+
+    def __read_line(self):
+        while b'\r\n' not in self.__buffer:
+            self.__receive()
+        line, self.__buffer = self.__buffer.split(b'\r\n', 1)
+        return line
+
+    def __read_message(self):
+        while len(self.__buffer) < 16:
+            self.__receive()
+        size = message_size(self.__buffer)
+        while len(self.__buffer) < size:
+            self.__receive()
+        data, self.__buffer = self.__buffer[:size], self.__buffer[size:]
+        return parse_message(data)
+
+    # call method and wait for reply, return reply body values
+    def call(self, destination, path, interface, member, signature='', args=()):
+        self.__serial += 1
+        serial = self.__serial
+        fields = [(FIELD_PATH, ('o', path)),
+                  (FIELD_INTERFACE, ('s', interface)),
+                  (FIELD_MEMBER, ('s', member)),
+                  (FIELD_DESTINATION, ('s', destination))]
+        self.__socket.sendall(build_message(METHOD_CALL, serial, fields, signature, args))
+
+        # skip signals and replies to other calls
+        while True:
+            message_type, fields, body = self.__read_message()
+            if fields.get(FIELD_REPLY_SERIAL) != serial:
+                continue
+            if message_type == ERROR:
+                raise DBusError("%s: %s" % (fields.get(FIELD_ERROR_NAME), body[0] if body else ''))
+            return body
+
+    def close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
@@ -0,0 +1,126 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import os
+import socket
+import struct
+import time
+
+# local imports
+from notifications import dbus_connection
+from values import internal_config
+
+# freedesktop notifications service
+NOTIFICATIONS_NAME = 'org.freedesktop.Notifications'
+NOTIFICATIONS_PATH = '/org/freedesktop/Notifications'
+NOTIFY_SIGNATURE = 'susssasa{sv}i'
+
+# notification urgency levels
+URGENCY_LOW = 0
+URGENCY_NORMAL = 1
+URGENCY_CRITICAL = 2
+
+# most child processes (notify-send, sound players) running at once
+MAX_RUNNING_PROCESSES = 8
+
+
+# show notifications through freedesktop notifications service over one kept open D-Bus connection,
+# falls back to notify-send, child processes are started without shell and reaped
+class NotificationDispatcher(object):
+    def __init__(self, notify_send_path=None, bus_address=None):
+        self.__notify_send_path = notify_send_path
+        self.__bus_address = bus_address or os.environ.get('DBUS_SESSION_BUS_ADDRESS', '')
+        self.__connection = None
+        self.__use_dbus = bool(self.__bus_address)
+        self.__processes = []
+        self.__devnull = None
+
+        # seconds between notify() call and notification accepted by server (or notify-send started)
+        self.last_latency = None
+        # time when last notification was accepted
+        self.last_shown_time = None
+        # number of notifications and spawned processes
+        self.notifications_sent = 0
+        self.processes_spawned = 0
+
+    # notifications can be shown
+    def available(self):
+        return self.__use_dbus or bool(self.__notify_send_path)
+
+    # send notification over D-Bus, connect when needed, return notification id
+    def __notify_dbus(self, summary, body, timeout, urgency, replaces_id):
+        if self.__connection is None:
+            self.__connection = dbus_connection.DBusConnection(self.__bus_address)
+        hints = {'urgency': ('y', urgency)}
+        return self.__connection.call(NOTIFICATIONS_NAME, NOTIFICATIONS_PATH, NOTIFICATIONS_NAME, 'Notify',
+                                      NOTIFY_SIGNATURE, (internal_config.PROGRAM_NAME, replaces_id, '', summary,
+                                                         body, [], hints, timeout))[0]
+
+    # show notification, timeout in milliseconds (-1 server default), return notification id (0 unknown)
+    def notify(self, summary, body='', timeout=-1, urgency=URGENCY_NORMAL, replaces_id=0):
+        start = time.time()
+        notification_id = None
+        if self.__use_dbus:
+            # one reconnect, e.g. after notification daemon restart
+            for attempt in range(2):
+                try:
+                    notification_id = self.__notify_dbus(summary, body, timeout, urgency, replaces_id)
+                    break
+                except (dbus_connection.DBusError, socket.error, struct.error, IndexError) as err:
+                    self.close()
+                    if attempt:
+                        print("Error: D-Bus notification failed, using notify-send: " + str(err))
+                        self.__use_dbus = False
+
+        if notification_id is None:
+            if not self.__notify_send_path:
+                return 0
+            self.run([self.__notify_send_path, '-t', str(timeout), '-u',
+                      ('low', 'normal', 'critical')[urgency], '-a', internal_config.PROGRAM_NAME, summary, body])
+            notification_id = 0
+
+        self.last_shown_time = time.time()
+        self.last_latency = self.last_shown_time - start
+        self.notifications_sent += 1
+        return notification_id
+
+    # drop finished child processes
+    def __reap(self):
+        self.__processes = [process for process in self.__processes if process.poll() is None]
+
+    # start command (list of arguments, or string run by shell) without waiting for it,
+    # when too many are running wait for the oldest one
+    def run(self, command, shell=False):
+        # only needed without D-Bus or for sounds which can't be streamed
+        import subprocess
+        self.__reap()
+        while len(self.__processes) >= MAX_RUNNING_PROCESSES:
+            self.__processes.pop(0).wait()
+        if self.__devnull is None:
+            self.__devnull = open(os.devnull, 'r+b')
+        try:
+            self.__processes.append(subprocess.Popen(command, shell=shell, stdin=self.__devnull,
+                                                     stdout=self.__devnull, stderr=self.__devnull,
+                                                     close_fds=True))
+            self.processes_spawned += 1
+        except OSError as err:
+            print("Error: can't run '%s': %s" % (command, err))
+
+    # close D-Bus connection, it's opened again when needed
+    def close(self):
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
@@ -0,0 +1,124 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# notification categories, newer notification replaces older one of the same category
+CATEGORY_POWER = 'power'
+CATEGORY_LEVEL = 'level'
+CATEGORY_MINIMAL = 'minimal'
+CATEGORY_BATTERY = 'battery'
+
+# seconds category waits for newer notification before showing the last one, e.g. flapping ac,
+# first notification after quiet period of this length is shown right away
+DEBOUNCE = {
+    CATEGORY_POWER: 2.0,
+    CATEGORY_LEVEL: 0.0,
+    CATEGORY_MINIMAL: 0.0,
+    CATEGORY_BATTERY: 2.0,
+}
+
+# debounced notification is shown at latest this many seconds after it was first submitted
+MAX_DELAY = 10.0
+
+# token bucket, notifications per second and largest burst
+RATE = 0.2
+BURST = 3
+
+
+# coalescing notification queue with per category debounce and global token bucket rate limit,
+# notifications are callables show(replaces_id) returning notification id, so the next notification
+# of the same category replaces the shown one, critical notifications skip debounce and rate limit
+class NotificationQueue(object):
+    def __init__(self, loop, debounce=None, rate=RATE, burst=BURST):
+        self.__loop = loop
+        self.__debounce = DEBOUNCE if debounce is None else debounce
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = float(burst)
+        self.__tokens_time = loop.time()
+        # category -> show callable waiting to be shown
+        self.__pending = {}
+        # category -> (Timer, time of first submit)
+        self.__timers = {}
+        # category -> id and time of last shown notification
+        self.__ids = {}
+        self.__shown_times = {}
+        # submitted, shown and replaced by newer before shown
+        self.submitted = 0
+        self.shown = 0
+        self.coalesced = 0
+
+    # take one token if there is one, return seconds until next token otherwise
+    def __take_token(self):
+        now = self.__loop.time()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__tokens_time) * self.__rate)
+        self.__tokens_time = now
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return 0
+        return (1 - self.__tokens) / self.__rate
+
+    def __show(self, category, show):
+        self.__ids[category] = show(self.__ids.get(category, 0)) or 0
+        self.__shown_times[category] = self.__loop.time()
+        self.shown += 1
+
+    # timer of category fired, show pending notification or wait for token, time of first submit
+    # is kept, so waiting for token doesn't let newer submits delay notification past MAX_DELAY
+    def __flush(self, category, first_submit):
+        self.__timers.pop(category, None)
+        show = self.__pending.get(category)
+        if show is None:
+            return
+        wait = self.__take_token()
+        if wait:
+            self.__timers[category] = (self.__loop.call_later(wait, self.__flush, category, first_submit),
+                                       first_submit)
+            return
+        del self.__pending[category]
+        self.__show(category, show)
+
+    # queue notification, critical one is shown right away
+    def submit(self, category, show, critical=False):
+        self.submitted += 1
+        if category in self.__pending:
+            self.coalesced += 1
+        if critical:
+            self.__pending.pop(category, None)
+            timer = self.__timers.pop(category, None)
+            if timer is not None:
+                timer[0].cancel()
+            self.__show(category, show)
+            return
+
+        self.__pending[category] = show
+        now = self.__loop.time()
+        first_submit = now
+        timer = self.__timers.pop(category, None)
+        if timer is not None:
+            timer[0].cancel()
+            first_submit = timer[1]
+        debounce = self.__debounce.get(category, 0)
+        shown_time = self.__shown_times.get(category)
+        if timer is None and (shown_time is None or now - shown_time >= debounce):
+            # nothing shown lately
+            delay = 0
+        else:
+            delay = min(debounce, first_submit + MAX_DELAY - now)
+        if delay > 0:
+            self.__timers[category] = (self.__loop.call_later(delay, self.__flush, category, first_submit),
+                                       first_submit)
+        else:
+            self.__flush(category, first_submit)
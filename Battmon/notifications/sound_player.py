@@ -0,0 +1,226 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import array
+import errno
+import fcntl
+import os
+import sys
+import wave
+
+# local imports
+from values import internal_config
+
+# player is closed after this many seconds without sound, so sound card can be suspended again
+IDLE_TIMEOUT = 30.0
+
+# seconds between attempts to write rest of sound to full pipe
+FLUSH_INTERVAL = 0.1
+
+# linux fcntl for setting pipe size, not exported by python 2
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+# pipe is made big enough for this many seconds of sound
+PIPE_SECONDS = 4
+
+# array type codes of supported sample widths, 8 bit wave samples are unsigned
+_SAMPLE_TYPES = {1: 'B', 2: 'h'}
+
+
+# arguments of player reading raw pcm from stdin
+def _stream_command(player_path, sample_width, rate, channels):
+    player = os.path.basename(player_path)
+    if player in ('pacat', 'paplay'):
+        return [player_path, '--playback', '--raw', '--format=%s' % ('u8' if sample_width == 1 else 's16le'),
+                '--rate=%d' % rate, '--channels=%d' % channels, '--client-name=' + internal_config.PROGRAM_NAME]
+    if player == 'aplay':
+        return [player_path, '-q', '-t', 'raw', '-f', 'U8' if sample_width == 1 else 'S16_LE',
+                '-r', str(rate), '-c', str(channels)]
+    if player == 'play':
+        return [player_path, '-q', '-t', 'raw', '-e', 'unsigned-integer' if sample_width == 1 else 'signed-integer',
+                '-b', str(sample_width * 8), '-r', str(rate), '-c', str(channels), '-']
+    return None
+
+
+# arguments of player playing sound file once, used when sound file can't be streamed
+def _file_command(player_path, sound_file, volume):
+    if os.path.basename(player_path) in ('pacat', 'paplay'):
+        return [player_path, '--volume', str(int(65536 * _volume_factor(volume))), sound_file]
+    return [player_path, '-V1', '-q', '-v%s' % _volume_factor(volume), sound_file]
+
+
+# volume level 1-17 as linear factor, max level plays sound as it is
+def _volume_factor(volume):
+    return min(volume, internal_config.MAX_SOUND_VOLUME_LEVEL) / float(internal_config.MAX_SOUND_VOLUME_LEVEL)
+
+
+# plays sound file through one long-lived player process reading raw pcm over a pipe, the file is read
+# once and scaled once per volume level, so alert costs a pipe write, player is started on first sound
+# and closed when idle, when file isn't pcm wave every sound starts player process with the file
+class SoundPlayer(object):
+    def __init__(self, player_path, sound_file, volume, loop, dispatcher):
+        self.__player_path = player_path
+        self.__sound_file = sound_file
+        self.__volume = volume
+        self.__loop = loop
+        self.__dispatcher = dispatcher
+        self.__process = None
+        self.__closing = []
+        self.__idle_timer = None
+        self.__flush_timer = None
+        # bytes not yet accepted by pipe
+        self.__pending = b''
+        # volume level -> scaled pcm bytes
+        self.__buffers = {}
+        self.__samples = None
+        self.__sample_width = self.__rate = self.__channels = 0
+        self.__command = None
+        self.__load()
+
+        # started player processes
+        self.spawned = 0
+
+    # read wave file, sound file is played by file command when it isn't supported pcm
+    def __load(self):
+        try:
+            sound = wave.open(self.__sound_file, 'rb')
+            try:
+                sample_width, self.__rate, self.__channels = (sound.getsampwidth(), sound.getframerate(),
+                                                              sound.getnchannels())
+                frames = sound.readframes(sound.getnframes())
+            finally:
+                sound.close()
+        except (IOError, EOFError, wave.Error) as err:
+            print("Error: can't load sound file '%s', playing it with %s: %s"
+                  % (self.__sound_file, self.__player_path, err))
+            return
+        self.__command = _stream_command(self.__player_path, sample_width, self.__rate, self.__channels)
+        if self.__command is None or sample_width not in _SAMPLE_TYPES:
+            self.__command = None
+            return
+        self.__sample_width = sample_width
+        self.__samples = array.array(_SAMPLE_TYPES[sample_width])
+        if hasattr(self.__samples, 'frombytes'):
+            self.__samples.frombytes(frames)
+        else:
+            self.__samples.fromstring(frames)
+        # wave data is little endian
+        if sample_width > 1 and sys.byteorder == 'big':
+            self.__samples.byteswap()
+
+    # sound scaled to volume level as raw little endian pcm
+    def __buffer(self, volume):
+        data = self.__buffers.get(volume)
+        if data is None:
+            factor = _volume_factor(volume)
+            if self.__sample_width == 1:
+                scaled = array.array('B', [int(128 + (sample - 128) * factor) for sample in self.__samples])
+            else:
+                scaled = array.array('h', [int(sample * factor) for sample in self.__samples])
+                if sys.byteorder == 'big':
+                    scaled.byteswap()
+            data = scaled.tobytes() if hasattr(scaled, 'tobytes') else scaled.tostring()
+            self.__buffers[volume] = data
+        return data
+
+    # start player with non blocking pipe large enough for few sounds
+    def __start(self):
+        import subprocess
+        self.__reap()
+        try:
+            self.__process = subprocess.Popen(self.__command, stdin=subprocess.PIPE, close_fds=True)
+        except OSError as err:
+            print("Error: can't run '%s': %s" % (self.__player_path, err))
+            return False
+        self.spawned += 1
+        pipe_fd = self.__process.stdin.fileno()
+        try:
+            fcntl.fcntl(pipe_fd, F_SETPIPE_SZ, PIPE_SECONDS * self.__rate * self.__channels * self.__sample_width)
+        except (IOError, OSError):
+            pass
+        fcntl.fcntl(pipe_fd, fcntl.F_SETFL, fcntl.fcntl(pipe_fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        return True
+
+    # write as much of pending sound as pipe takes, the rest is written later
+    def __flush(self):
+        self.__flush_timer = None
+        if self.__process is None:
+            self.__pending = b''
+            return
+        try:
+            while self.__pending:
+                written = os.write(self.__process.stdin.fileno(), self.__pending)
+                self.__pending = self.__pending[written:]
+        except OSError as err:
+            if err.errno != errno.EAGAIN:
+                # player died, it's started again with next sound
+                self.__pending = b''
+                self.__stop()
+                return
+        if self.__pending:
+            self.__flush_timer = self.__loop.call_later(FLUSH_INTERVAL, self.__flush)
+
+    # close player's pipe, it plays what it got and exits
+    def __stop(self):
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+        if self.__process is not None:
+            try:
+                self.__process.stdin.close()
+            except (IOError, OSError):
+                pass
+            self.__closing.append(self.__process)
+            self.__process = None
+
+    # close player when no sound was played for a while
+    def __idle(self):
+        self.__idle_timer = None
+        if self.__pending:
+            self.__idle_timer = self.__loop.call_later(IDLE_TIMEOUT, self.__idle)
+            return
+        self.__stop()
+
+    # drop exited players
+    def __reap(self):
+        self.__closing = [process for process in self.__closing if process.poll() is None]
+
+    # play sound, volume level 1-17, default volume when None
+    def play(self, volume=None):
+        if volume is None:
+            volume = self.__volume
+        if self.__command is None:
+            self.__dispatcher.run(_file_command(self.__player_path, self.__sound_file, volume))
+            return
+        if self.__process is not None and self.__process.poll() is not None:
+            self.__process = None
+        if self.__process is None and not self.__start():
+            return
+        self.__pending += self.__buffer(volume)
+        if self.__flush_timer is None:
+            self.__flush()
+        if self.__idle_timer is not None:
+            self.__idle_timer.cancel()
+        self.__idle_timer = self.__loop.call_later(IDLE_TIMEOUT, self.__idle)
+
+    # stop player
+    def close(self):
+        if self.__idle_timer is not None:
+            self.__idle_timer.cancel()
+            self.__idle_timer = None
+        self.__pending = b''
+        self.__stop()
+        self.__reap()
@@ -0,0 +1,149 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import random
+import statistics
+
+import pytest
+
+from values import battery_health, read_battery_values
+
+ENERGY_FULL = 40000000
+ENERGY_FULL_DESIGN = 50000000
+START = 1000000.0
+
+
+# random values, the same every run
+def values(count, seed=1):
+    generator = random.Random(seed)
+    return [generator.uniform(1e6, 2e7) for _ in range(count)]
+
+
+def make_sample(timestamp, energy_now, discharging=True, energy_full=ENERGY_FULL):
+    battery = read_battery_values.BatteryDetail('BAT0', True, 'Discharging' if discharging else 'Charging',
+                                                read_battery_values.UNIT_ENERGY, energy_now, energy_full, 0,
+                                                energy_now * 100 // energy_full, ENERGY_FULL_DESIGN, 12)
+    return read_battery_values.BatterySample(timestamp, True, not discharging, battery.status, energy_now,
+                                             energy_full, 0, 0, battery.capacity, -1, (battery,))
+
+
+# health after discharging from full to half in an hour and charging back in half an hour, sample a minute
+def used_health():
+    health = battery_health.BatteryHealth()
+    for minute in range(61):
+        health.add(make_sample(START + minute * 60, ENERGY_FULL - minute * ENERGY_FULL // 120))
+    for minute in range(1, 31):
+        health.add(make_sample(START + 3600 + minute * 60, ENERGY_FULL // 2 + minute * ENERGY_FULL // 60,
+                               discharging=False))
+    return health
+
+
+@pytest.mark.parametrize('count', [1, 2, 10, 1000])
+def test_running_stats_match_statistics(count):
+    data = values(count)
+    stats = battery_health.RunningStats()
+    for value in data:
+        stats.add(value)
+    assert stats.count == count
+    assert stats.mean == pytest.approx(statistics.mean(data))
+    assert stats.m2 / stats.count == pytest.approx(statistics.pvariance(data))
+    assert stats.stddev == pytest.approx(statistics.stdev(data) if count > 1 else 0.0)
+    assert (stats.minimum, stats.maximum) == (min(data), max(data))
+
+
+def test_running_stats_continue_after_reload():
+    data = values(100)
+    stats = battery_health.RunningStats()
+    for value in data[:50]:
+        stats.add(value)
+    stats = battery_health.RunningStats.from_list(stats.to_list())
+    for value in data[50:]:
+        stats.add(value)
+    assert stats.mean == pytest.approx(statistics.mean(data))
+    assert stats.m2 / stats.count == pytest.approx(statistics.pvariance(data))
+
+
+def test_running_regression_slope():
+    regression = battery_health.RunningRegression()
+    assert regression.slope is None
+    regression.add(0, 100.0)
+    assert regression.slope is None
+    for day in range(1, 50):
+        regression.add(day, 100.0 - 0.02 * day + (0.5 if day % 2 else -0.5))
+    assert regression.slope == pytest.approx(-0.02, abs=0.001)
+
+
+def test_discharge_session_and_energy():
+    health = used_health()
+    report = health.report()
+    assert report['sessions'] == 1
+    assert report['session_power'] == pytest.approx(ENERGY_FULL / 2)
+    assert report['session_length'] == 3600
+    battery = report['batteries']['BAT0']
+    assert battery['discharged_energy'] == ENERGY_FULL // 2
+    assert battery['charged_energy'] == ENERGY_FULL // 2
+    assert battery['efficiency'] == 1.0
+    assert battery['health'] == pytest.approx(80.0)
+    assert battery['cycle_count'] == 12
+    assert battery['estimated_cycles'] == pytest.approx(0.4)
+    assert 'BAT0' in battery_health.format_report(report)
+
+
+def test_short_session_isnt_counted():
+    health = battery_health.BatteryHealth()
+    for minute in range(4):
+        health.add(make_sample(START + minute * 60, ENERGY_FULL - minute * 100000))
+    health.add(make_sample(START + 240, ENERGY_FULL, discharging=False))
+    assert health.report()['sessions'] == 0
+
+
+def test_capacity_fade():
+    health = battery_health.BatteryHealth()
+    for day in range(100):
+        # full capacity loses 0.1% of design capacity a day
+        energy_full = ENERGY_FULL - day * ENERGY_FULL_DESIGN // 1000
+        health.add(make_sample(START + day * battery_health.SECONDS_PER_DAY, energy_full // 2,
+                               energy_full=energy_full))
+    battery = health.report()['batteries']['BAT0']
+    assert battery['fade_per_year'] == pytest.approx(36.5)
+    assert battery['tracked_days'] == 99
+
+
+def test_health_file_round_trip(tmp_path):
+    health = used_health()
+    path = str(tmp_path / 'state' / 'health.json')
+    health.save(path)
+    loaded = battery_health.BatteryHealth.load(path)
+    assert loaded.state() == health.state()
+    assert loaded.report() == health.report()
+    # aggregates go on from loaded values
+    loaded.add(make_sample(START + 7200, ENERGY_FULL // 2))
+    loaded.add(make_sample(START + 7260, ENERGY_FULL // 2 - 1000))
+    assert loaded.report()['batteries']['BAT0']['discharged_energy'] == ENERGY_FULL // 2 + 1000
+
+
+@pytest.mark.parametrize('content', ['', '{"broken', '[]', '{"version": 0, "batteries": {"BAT0": {}}}'])
+def test_broken_health_file_starts_over(tmp_path, content):
+    path = tmp_path / 'health.json'
+    path.write_text(content)
+    health = battery_health.BatteryHealth.load(str(path))
+    assert health.batteries == {}
+    assert battery_health.format_report(health.report()) == "No battery health collected yet"
+
+
+def test_missing_health_file_starts_over(tmp_path):
+    assert battery_health.BatteryHealth.load(str(tmp_path / 'health.json')).batteries == {}
@@ -0,0 +1,77 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+from values import battery_history, power_supply_sources, read_battery_values
+
+
+def make_sample(timestamp, energy_now=1000):
+    return read_battery_values.BatterySample(timestamp, True, False, 'Discharging', energy_now, 2000, 10, 10,
+                                             50, 3600, ())
+
+
+def test_default_capacity_keeps_a_week_of_samples_taken_every_second():
+    assert battery_history.DEFAULT_CAPACITY >= 7 * 24 * 60 * 60
+
+
+def test_range_query_after_wrap(tmp_path):
+    history = battery_history.BatteryHistory(str(tmp_path / 'history.bin'), capacity=10)
+    try:
+        for second in range(25):
+            history.append(make_sample(float(second), second))
+        assert len(history) == 10
+        assert [record.energy_now for record in history.read()] == list(range(15, 25))
+        assert [record.energy_now for record in history.read(18, 21)] == [18, 19, 20]
+        assert [record.timestamp for record in history.read(end=17)] == [15.0, 16.0]
+        columns = history.read_columns(18, 21)
+        assert (list(columns.timestamp), list(columns.energy_now)) == ([18.0, 19.0, 20.0], [18, 19, 20])
+        assert [tuple(values) for values in zip(*history.read_columns())] == list(history.read_raw())
+    finally:
+        history.close()
+
+
+def test_timestamps_never_go_back(tmp_path):
+    history = battery_history.BatteryHistory(str(tmp_path / 'history.bin'), capacity=10)
+    try:
+        for timestamp in (100.0, 101.0, 50.0, 102.0):
+            history.append(make_sample(timestamp))
+        assert [record.timestamp for record in history.read()] == [100.0, 101.0, 101.0, 102.0]
+        assert len(list(history.read(101, 102))) == 2
+    finally:
+        history.close()
+
+
+def test_reopened_file_keeps_records(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    history = battery_history.BatteryHistory(path, capacity=10)
+    history.append(make_sample(1.0, 7))
+    history.close()
+    history = battery_history.BatteryHistory(path, writable=False)
+    try:
+        assert [tuple(record) for record in history.read()] == [(1.0, 7, 10, 'Discharging', False)]
+    finally:
+        history.close()
+
+
+def test_history_file_as_trace(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    history = battery_history.BatteryHistory(path, capacity=10)
+    for second in range(3):
+        history.append(make_sample(float(second), 1000 - second))
+    history.close()
+    records = power_supply_sources.read_trace(path)
+    assert [tuple(record) for record in records] == [(0.0, 1000, 1000, 10, 'Discharging', False),
+                                                     (1.0, 999, 1000, 10, 'Discharging', False),
+                                                     (2.0, 998, 1000, 10, 'Discharging', False)]
@@ -0,0 +1,153 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import pytest
+
+from values import read_battery_values
+from monitor import battery_states as bs
+
+LOW, CRITICAL, MINIMAL = 23, 7, 3
+
+
+# sample with given values, remaining time is known unless given
+def make_sample(timestamp=0, capacity=50, ac_present=False, status='Discharging', battery_present=True,
+                remaining_time=3600):
+    return read_battery_values.BatterySample(timestamp, battery_present, ac_present, status,
+                                             capacity * 1000, 100000, 1000, 1000, capacity,
+                                             remaining_time if battery_present else -1, ())
+
+
+def make_machine(no_battery_remainder=0):
+    return bs.BatteryStateMachine(LOW, CRITICAL, MINIMAL, no_battery_remainder)
+
+
+@pytest.mark.parametrize('sample, state', [
+    (make_sample(battery_present=False), bs.NO_BATTERY),
+    (make_sample(capacity=LOW + 1), bs.DISCHARGING),
+    (make_sample(capacity=LOW), bs.LOW),
+    (make_sample(capacity=CRITICAL + 1), bs.LOW),
+    (make_sample(capacity=CRITICAL), bs.CRITICAL),
+    (make_sample(capacity=MINIMAL + 1), bs.CRITICAL),
+    (make_sample(capacity=MINIMAL), bs.MINIMAL),
+    (make_sample(capacity=0), bs.MINIMAL),
+    (make_sample(capacity=50, ac_present=True, status='Charging'), bs.CHARGING),
+    (make_sample(capacity=50, ac_present=False, status='Charging'), bs.CHARGING),
+    (make_sample(capacity=5, ac_present=True, status='Not charging'), bs.CHARGING),
+    (make_sample(capacity=100, ac_present=True, status='Full'), bs.FULL),
+    (make_sample(capacity=99, ac_present=False, status='Full'), bs.FULL),
+])
+def test_classify(sample, state):
+    assert make_machine().classify(sample) == state
+
+
+# one discharge and charge cycle with battery removed and plugged again on ac,
+# (sample, expected state, expected actions) for every tick
+TRACE = [
+    (make_sample(0, 100, True, 'Full'), bs.FULL, [bs.NOTIFY_FULL]),
+    (make_sample(10, 100, True, 'Full'), bs.FULL, []),
+    (make_sample(20, 99, False, 'Discharging'), bs.DISCHARGING, [bs.NOTIFY_DISCHARGING]),
+    (make_sample(30, 50, False, 'Discharging'), bs.DISCHARGING, []),
+    (make_sample(40, LOW, False, 'Discharging'), bs.LOW, [bs.NOTIFY_LOW]),
+    (make_sample(50, LOW - 1, False, 'Discharging'), bs.LOW, []),
+    (make_sample(60, CRITICAL, False, 'Discharging'), bs.CRITICAL, [bs.NOTIFY_CRITICAL]),
+    (make_sample(70, MINIMAL, False, 'Discharging'), bs.MINIMAL, [bs.MINIMAL_LEVEL]),
+    (make_sample(80, MINIMAL - 1, False, 'Discharging'), bs.MINIMAL, []),
+    (make_sample(90, MINIMAL, True, 'Charging'), bs.CHARGING, [bs.NOTIFY_CHARGING]),
+    (make_sample(100, 60, True, 'Charging'), bs.CHARGING, []),
+    (make_sample(110, battery_present=False, ac_present=True, status=''), bs.NO_BATTERY,
+     [bs.NOTIFY_BATTERY_REMOVED, bs.NOTIFY_NO_BATTERY]),
+    (make_sample(120, battery_present=False, ac_present=True, status=''), bs.NO_BATTERY, []),
+    (make_sample(130, 60, True, 'Charging'), bs.CHARGING, [bs.NOTIFY_BATTERY_PLUGGED, bs.NOTIFY_CHARGING]),
+    (make_sample(140, 100, True, 'Full'), bs.FULL, [bs.NOTIFY_FULL]),
+]
+
+
+def test_trace_replay():
+    machine = make_machine()
+    for sample, state, actions in TRACE:
+        assert machine.update(sample) == (state, actions), sample
+
+
+def test_every_state_and_action_is_covered_by_trace():
+    states = set(state for _, state, _ in TRACE)
+    actions = set(action for _, _, tick_actions in TRACE for action in tick_actions)
+    assert states == set(bs.ENTRY_ACTIONS)
+    assert actions == (set(action for entry_actions in bs.ENTRY_ACTIONS.values() for action in entry_actions)
+                       | set(action for actions in bs.TRANSITION_ACTIONS.values() for action in actions))
+
+
+def test_battery_removed_on_battery_power_shows_no_entry_action():
+    machine = make_machine()
+    machine.update(make_sample(0, 50))
+    assert machine.update(make_sample(10, battery_present=False)) == (bs.NO_BATTERY, [bs.NOTIFY_BATTERY_REMOVED])
+
+
+def test_timed_actions_wait_one_tick_for_remaining_time():
+    machine = make_machine()
+    assert machine.update(make_sample(0, 50, remaining_time=-1)) == (bs.DISCHARGING, [])
+    assert machine.update(make_sample(10, 50, remaining_time=3600)) == (bs.DISCHARGING, [bs.NOTIFY_DISCHARGING])
+    assert machine.update(make_sample(20, 50)) == (bs.DISCHARGING, [])
+
+
+def test_deferred_actions_are_run_even_when_time_is_still_unknown():
+    machine = make_machine()
+    machine.update(make_sample(0, LOW, remaining_time=-1))
+    assert machine.update(make_sample(10, LOW, remaining_time=-1)) == (bs.LOW, [bs.NOTIFY_LOW])
+
+
+def test_deferred_actions_are_dropped_on_state_change():
+    machine = make_machine()
+    machine.update(make_sample(0, 50, remaining_time=-1))
+    assert machine.update(make_sample(10, 50, True, 'Charging')) == (bs.CHARGING, [bs.NOTIFY_CHARGING])
+    assert machine.update(make_sample(20, 50, True, 'Charging')) == (bs.CHARGING, [])
+
+
+def test_actions_without_remaining_time_are_not_deferred():
+    machine = make_machine()
+    assert machine.update(make_sample(0, 100, True, 'Full', remaining_time=-1)) == (bs.FULL, [bs.NOTIFY_FULL])
+
+
+def test_no_battery_remainder():
+    machine = make_machine(no_battery_remainder=1)
+    no_battery = dict(battery_present=False, ac_present=True, status='')
+    assert machine.update(make_sample(0, **no_battery)) == (bs.NO_BATTERY, [bs.NOTIFY_NO_BATTERY])
+    assert machine.update(make_sample(59, **no_battery)) == (bs.NO_BATTERY, [])
+    assert machine.update(make_sample(60, **no_battery)) == (bs.NO_BATTERY, [bs.NOTIFY_NO_BATTERY])
+    assert machine.update(make_sample(90, **no_battery)) == (bs.NO_BATTERY, [])
+
+
+def test_reset_runs_entry_actions_again():
+    machine = make_machine()
+    machine.update(make_sample(0, MINIMAL))
+    machine.reset()
+    assert machine.state is None
+    assert machine.update(make_sample(10, MINIMAL)) == (bs.MINIMAL, [bs.MINIMAL_LEVEL])
+
+
+def test_changed_thresholds_are_used_from_next_update():
+    machine = make_machine()
+    machine.update(make_sample(0, 30))
+    machine.low_value = 40
+    assert machine.update(make_sample(10, 30)) == (bs.LOW, [bs.NOTIFY_LOW])
+
+
+@pytest.mark.parametrize('from_state, to_state, actions', [
+    (bs.DISCHARGING, bs.NO_BATTERY, (bs.NOTIFY_BATTERY_REMOVED,)),
+    (bs.NO_BATTERY, bs.CHARGING, (bs.NOTIFY_BATTERY_PLUGGED,)),
+    (bs.DISCHARGING, bs.LOW, ()),
+])
+def test_transition_actions(from_state, to_state, actions):
+    assert bs.transition_actions(from_state, to_state) == actions
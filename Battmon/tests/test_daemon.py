@@ -0,0 +1,106 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import os
+import socket
+import time
+import uuid
+
+import pytest
+
+from monitor import daemon
+
+
+# bound datagram socket on unique abstract name, NOTIFY_SOCKET points to it
+@pytest.fixture
+def notify_socket(monkeypatch):
+    name = 'battmon-test-%d-%s' % (os.getpid(), uuid.uuid4().hex)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    server.bind('\0' + name)
+    server.settimeout(2)
+    monkeypatch.setenv('NOTIFY_SOCKET', '@' + name)
+    yield server
+    server.close()
+
+
+# fork launcher, which daemonizes and runs daemon_main(Daemon) in daemon, return launcher exit code,
+# daemon ends with os._exit(), so nothing of test process runs in it
+def launch(tmp_path, daemon_main):
+    launcher_pid = os.fork()
+    if launcher_pid == 0:
+        try:
+            started = daemon.daemonize(str(tmp_path / 'log' / 'battmon.log'), str(tmp_path / 'battmon.pid'))
+            daemon_main(started)
+        finally:
+            os._exit(3)
+    _, status = os.waitpid(launcher_pid, 0)
+    return os.WEXITSTATUS(status)
+
+
+def test_sd_notify(notify_socket):
+    assert daemon.sd_notify('READY=1')
+    assert notify_socket.recv(4096) == b'READY=1'
+
+
+def test_sd_notify_without_service_manager(monkeypatch):
+    monkeypatch.delenv('NOTIFY_SOCKET', raising=False)
+    assert not daemon.sd_notify('READY=1')
+
+
+def test_ready_writes_pid_file_and_tells_launcher(tmp_path, notify_socket):
+    read_fd, write_fd = os.pipe()
+    ready = daemon.Daemon(write_fd, str(tmp_path / 'battmon.pid'))
+    ready.ready()
+    # second call does nothing
+    ready.ready()
+    assert os.read(read_fd, 4096) == daemon.READY_MESSAGE
+    assert os.read(read_fd, 4096) == b''
+    os.close(read_fd)
+    assert (tmp_path / 'battmon.pid').read_text() == u'%d\n' % os.getpid()
+    assert notify_socket.recv(4096) == b'READY=1'
+
+
+def test_launcher_exits_when_daemon_is_ready(tmp_path):
+    def daemon_main(started):
+        # stdin is /dev/null, stdout goes to log
+        print("stdin: %r" % os.read(0, 10))
+        started.ready()
+        # second fork isn't session leader, so it never gets controlling terminal again
+        print("session leader: %s" % (os.getsid(0) == os.getpid()))
+        os._exit(0)
+
+    assert launch(tmp_path, daemon_main) == 0
+    pid = int((tmp_path / 'battmon.pid').read_text())
+    assert pid != os.getpid()
+    log_path = tmp_path / 'log' / 'battmon.log'
+    # daemon can still write after launcher exited
+    deadline = time.time() + 5
+    while b'session leader' not in log_path.read_bytes() and time.time() < deadline:
+        time.sleep(0.01)
+    assert log_path.read_text().splitlines() == ["stdin: b''", "session leader: False"]
+
+
+def test_launcher_fails_when_daemon_exits_before_ready(tmp_path, capfd):
+    def daemon_main(started):
+        print("Error: no battery found")
+        os._exit(1)
+
+    assert launch(tmp_path, daemon_main) == 1
+    assert not (tmp_path / 'battmon.pid').exists()
+    out = capfd.readouterr().out
+    assert "battmon failed to start" in out
+    assert "  Error: no battery found" in out
@@ -0,0 +1,95 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+from values import formatting
+
+
+@pytest.mark.parametrize('seconds, text', [
+    (None, 'Unknown'),
+    (-1, 'Unknown'),
+    (-3600, 'Unknown'),
+    (0, 'Unknown'),
+    (float('nan'), 'Unknown'),
+    (float('inf'), 'Unknown'),
+    (1, 'Less then minute'),
+    (59, 'Less then minute'),
+    (59.9, 'Less then minute'),
+    (60, '1min'),
+    (61, '1min'),
+    (119, '1min'),
+    (120, '2min'),
+    (3599, '59min'),
+    (3600, '1h'),
+    (3659, '1h'),
+    (3660, '1h 1min'),
+    (7200, '2h'),
+    (7260, '2h 1min'),
+    (9000, '2h 30min'),
+    (100 * 3600 + 60, '100h 1min'),
+])
+def test_format_time(seconds, text):
+    assert formatting.format_time(seconds) == text
+    # the second call comes from cache
+    assert formatting.format_time(seconds) == text
+
+
+def test_lru_cache_drops_least_recently_used():
+    cache = formatting.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c'), len(cache)) == (1, 3, 2)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_template_renders_fields():
+    template = formatting.Template("{capacity}% {time!s} {power:.1f} W {{literal}}")
+    assert template.fields == ('capacity', 'time', 'power')
+    assert template.render(capacity=50, time='1h', power=7.25) == "50% 1h 7.2 W {literal}"
+    assert template.render(capacity=50, time='1h', power=7.25) == "50% 1h 7.2 W {literal}"
+    assert template.render(capacity=49, time='55min', power=8.0) == "49% 55min 8.0 W {literal}"
+    assert template.render(capacity=50, time='1h', power=7.25) == "50% 1h 7.2 W {literal}"
+
+
+def test_template_caches_rendered_texts(monkeypatch):
+    template = formatting.Template("{capacity}%")
+    rendered = []
+    render = template._Template__render
+
+    def counting_render(values):
+        rendered.append(values['capacity'])
+        return render(values)
+
+    monkeypatch.setattr(template, '_Template__render', counting_render)
+    assert [template.render(capacity=capacity) for capacity in (50, 50, 49, 50, 49)] == \
+        ['50%', '50%', '49%', '50%', '49%']
+    assert rendered == [50, 49]
+
+
+def test_template_without_fields():
+    template = formatting.Template('')
+    assert template.fields == ()
+    assert template.render() == ''
+
+
+def test_template_needs_every_field():
+    with pytest.raises(KeyError):
+        formatting.Template("{capacity}% {time}").render(capacity=50)
@@ -0,0 +1,160 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import os
+
+import pytest
+
+from values import help_and_values_parser, ini_config, power_supply_sources, program_index
+from monitor import battery_states, simulation
+
+
+def write_config(path, **keys):
+    path.write_text('[battmon]\n' + ''.join('%s = %s\n' % (key.replace('_', '-'), value)
+                                            for key, value in sorted(keys.items())))
+
+
+def test_read_config_file(tmp_path):
+    path = tmp_path / 'battmon.ini'
+    write_config(path, low_level_value=30, play_sound='no', sound_file_path='sounds/beep.wav')
+    options, errors = ini_config.read_config_file(str(path))
+    assert errors == []
+    assert options == {'battery_low_value': 30, 'play_sound': False,
+                       'sound_file': str(tmp_path / 'sounds' / 'beep.wav')}
+
+
+def test_read_config_file_errors(tmp_path):
+    path = tmp_path / 'battmon.ini'
+    write_config(path, low_level_value=300, colour='red')
+    options, errors = ini_config.read_config_file(str(path))
+    assert options == {}
+    assert len(errors) == 2
+
+
+def test_missing_config_file_is_not_watched(tmp_path):
+    path = tmp_path / 'battmon' / 'battmon.ini'
+    assert ini_config.read_config_file(str(path)) == ({}, [])
+    assert ini_config.ConfigWatcher.open(str(path)) is None
+    assert not os.path.exists(str(path.parent))
+
+
+def test_command_line_wins_over_config_file(tmp_path):
+    path = tmp_path / 'battmon.ini'
+    write_config(path, low_level_value=30, critical_level_value=10)
+    args = help_and_values_parser.parse_args(['-c', str(path), '-ll', '40'])
+    assert (args.battery_low_value, args.battery_critical_value) == (40, 10)
+    assert args.command_line_options == {'config_file': str(path), 'battery_low_value': 40}
+
+
+@pytest.mark.parametrize('argument', ['-k', '-q', '-j', '-w', '-ss', '-pr', '--health'])
+def test_instance_commands_ignore_broken_config_file(tmp_path, argument):
+    path = tmp_path / 'battmon.ini'
+    write_config(path, low_level_value=2)
+    args = help_and_values_parser.parse_args(['-c', str(path), argument])
+    assert args.instance_command or args.health
+    with pytest.raises(SystemExit):
+        help_and_values_parser.parse_args(['-c', str(path)])
+
+
+# simulated monitor on 35% battery with config file, command line options are given as options
+@pytest.fixture
+def reload_scenario(tmp_path):
+    path = tmp_path / 'battmon.ini'
+    write_config(path, low_level_value=40)
+    source = power_supply_sources.FakeSource()
+    source.set_device('BAT0', 'Battery', {'PRESENT': 1, 'STATUS': 'Discharging', 'ENERGY_NOW': 35,
+                                          'ENERGY_FULL': 100, 'POWER_NOW': 10})
+    source.set_device('AC', 'Mains', {'ONLINE': 0})
+
+    def start(command_line_options=None):
+        args = help_and_values_parser.parse_args(['-c', str(path)])
+        options = dict((name, getattr(args, name)) for name in ('critical', 'disable_notifications', 'timeout'))
+        options.update(command_line_options or {})
+        return simulation.Simulation(source, simulation.SimulatedClock(), args.battery_low_value,
+                                     args.battery_critical_value, args.battery_minimal_value,
+                                     config_file=str(path), command_line_options=command_line_options, **options)
+
+    start.path = path
+    start.source = source
+    return start
+
+
+def test_changed_threshold_is_used_right_away(reload_scenario):
+    sim = reload_scenario()
+    try:
+        assert sim.tick()[1] == battery_states.LOW
+        write_config(reload_scenario.path, low_level_value=30)
+        sim.tick()
+        assert sim.tick()[1:] == (battery_states.DISCHARGING, [battery_states.NOTIFY_DISCHARGING])
+    finally:
+        sim.close()
+
+
+def test_removed_option_is_back_to_default(reload_scenario):
+    sim = reload_scenario()
+    try:
+        assert sim.tick()[1] == battery_states.LOW
+        write_config(reload_scenario.path)
+        sim.tick()
+        assert sim.tick()[1] == battery_states.DISCHARGING
+    finally:
+        sim.close()
+
+
+def test_command_line_wins_after_reload(reload_scenario):
+    sim = reload_scenario({'battery_low_value': 50})
+    try:
+        assert sim.tick()[1] == battery_states.LOW
+        write_config(reload_scenario.path, low_level_value=30, critical_level_value=10)
+        sim.tick()
+        assert sim.tick()[1] == battery_states.LOW
+    finally:
+        sim.close()
+
+
+def test_wrong_config_file_is_not_used(reload_scenario, capsys):
+    sim = reload_scenario()
+    try:
+        sim.tick()
+        write_config(reload_scenario.path, low_level_value=2)
+        sim.tick()
+        assert sim.tick()[1] == battery_states.LOW
+        assert "not used" in capsys.readouterr().out
+    finally:
+        sim.close()
+
+
+def test_saved_config_file_without_sound_player_isnt_a_change(reload_scenario, capsys):
+    write_config(reload_scenario.path, low_level_value=40, play_sound='yes')
+    # options of simulation, which differ from defaults, are given in command line
+    command_line = {'battery_update_timeout': 1, 'battery_min_update_interval': 1,
+                    'battery_max_update_interval': 1, 'set_no_battery_remainder': 0, 'sound_volume': 1}
+    sim = simulation.Simulation(reload_scenario.source, simulation.SimulatedClock(), 40, 7, 3, debug=True,
+                                play_sound=True, programs=program_index.ProgramIndex(path=[], cache_file=''),
+                                config_file=str(reload_scenario.path), command_line_options=command_line)
+    try:
+        sim.tick()
+        capsys.readouterr()
+        write_config(reload_scenario.path, low_level_value=40, play_sound='yes')
+        sim.tick()
+        sim.tick()
+        assert "Config file options used" not in capsys.readouterr().out
+        write_config(reload_scenario.path, low_level_value=30, play_sound='yes')
+        sim.tick()
+        sim.tick()
+        assert "Config file options used: battery_low_value=30\n" in capsys.readouterr().out
+    finally:
+        sim.close()
@@ -0,0 +1,290 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import os
+import shutil
+import socket
+import stat
+import subprocess
+import threading
+import time
+
+import pytest
+
+from notifications import dbus_connection as dbus
+from notifications import notification_dispatcher
+from values import internal_config
+
+
+# message bus and notification server in one thread, answers Hello and Notify, every Notify call
+# is kept in calls as (body, reply serial), error_names makes Notify fail with given errors first
+class FakeBus(object):
+    def __init__(self, path, error_names=()):
+        self.address = 'unix:path=' + path
+        self.calls = []
+        self.connections = 0
+        self.__error_names = list(error_names)
+        self.__next_id = 41
+        self.__server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__server.bind(path)
+        self.__server.listen(4)
+        self.__thread = threading.Thread(target=self.__serve)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __serve(self):
+        while True:
+            try:
+                client, _ = self.__server.accept()
+            except (socket.error, OSError):
+                return
+            self.connections += 1
+            try:
+                self.__serve_client(client)
+            except (socket.error, OSError, dbus.DBusError):
+                pass
+            finally:
+                client.close()
+
+    def __serve_client(self, client):
+        data = b''
+        while b'BEGIN\r\n' not in data:
+            chunk = client.recv(4096)
+            if not chunk:
+                return
+            data += chunk
+            if b'AUTH EXTERNAL' in data and b'\r\n' in data and b'OK' not in data:
+                client.sendall(b'OK 0123456789abcdef0123456789abcdef\r\n')
+                data += b'OK'
+        data = data.split(b'BEGIN\r\n', 1)[1]
+        serial = 1000
+        while True:
+            while len(data) < 16 or len(data) < dbus.message_size(data):
+                chunk = client.recv(4096)
+                if not chunk:
+                    return
+                data += chunk
+            size = dbus.message_size(data)
+            message, data = data[:size], data[size:]
+            message_type, fields, body = dbus.parse_message(message)
+            call_serial = dbus.struct.unpack_from('<I', message, 8)[0]
+            serial += 1
+            member = fields.get(dbus.FIELD_MEMBER)
+            reply_fields = [(dbus.FIELD_REPLY_SERIAL, ('u', call_serial))]
+            if member == 'Hello':
+                # signal before reply, client must skip it
+                client.sendall(dbus.build_message(dbus.SIGNAL, serial, [
+                    (dbus.FIELD_PATH, ('o', dbus.BUS_PATH)), (dbus.FIELD_INTERFACE, ('s', dbus.BUS_NAME)),
+                    (dbus.FIELD_MEMBER, ('s', 'NameAcquired'))], 's', (':1.7',)))
+                serial += 1
+                client.sendall(dbus.build_message(dbus.METHOD_RETURN, serial, reply_fields, 's', (':1.7',)))
+            elif member == 'Notify':
+                self.calls.append((body, fields))
+                if self.__error_names:
+                    client.sendall(dbus.build_message(dbus.ERROR, serial, reply_fields + [
+                        (dbus.FIELD_ERROR_NAME, ('s', self.__error_names.pop(0)))], 's', ('failed',)))
+                    # notification daemon went away, client has to connect again
+                    return
+                notification_id = body[1] or self.__next_id
+                self.__next_id += 1
+                client.sendall(dbus.build_message(dbus.METHOD_RETURN, serial, reply_fields, 'u',
+                                                  (notification_id,)))
+            else:
+                client.sendall(dbus.build_message(dbus.ERROR, serial, reply_fields + [
+                    (dbus.FIELD_ERROR_NAME, ('s', 'org.freedesktop.DBus.Error.UnknownMethod'))],
+                    's', ('unknown method',)))
+
+    def close(self):
+        self.__server.close()
+
+
+@pytest.fixture
+def fake_bus(tmp_path):
+    bus = FakeBus(str(tmp_path / 'bus'))
+    yield bus
+    bus.close()
+
+
+# notify-send replacement writing its arguments, one per line, to file
+@pytest.fixture
+def notify_send(tmp_path):
+    path = tmp_path / 'notify-send'
+    path.write_text('#!/bin/sh\nprintf "%%s\\n" "$@" > "%s.tmp" && mv "%s.tmp" "%s"\n'
+                    % ((tmp_path / 'arguments',) * 3))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def wait_for_file(path, timeout=5.0):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        assert time.time() < deadline, "'%s' wasn't written" % path
+        time.sleep(0.01)
+    with open(path) as arguments:
+        return arguments.read().splitlines()
+
+
+def test_split_signature():
+    assert dbus.split_signature('susssasa{sv}i') == ['s', 'u', 's', 's', 's', 'as', 'a{sv}', 'i']
+    assert dbus.split_signature('a(yv)(ss)') == ['a(yv)', '(ss)']
+
+
+def test_message_round_trip():
+    args = ('battmon', 7, '', 'LOW BATTERY LEVEL', 'current capacity: 20%', ['a', 'b'],
+            {'urgency': ('y', 2)}, 6000)
+    fields = [(dbus.FIELD_PATH, ('o', '/org/freedesktop/Notifications')),
+              (dbus.FIELD_MEMBER, ('s', 'Notify'))]
+    message = dbus.build_message(dbus.METHOD_CALL, 3, fields, 'susssasa{sv}i', args)
+    assert len(message) == dbus.message_size(message)
+    message_type, parsed_fields, body = dbus.parse_message(message)
+    assert message_type == dbus.METHOD_CALL
+    assert parsed_fields[dbus.FIELD_MEMBER] == 'Notify'
+    assert parsed_fields[dbus.FIELD_SIGNATURE] == 'susssasa{sv}i'
+    # variants are read as their values
+    assert body == args[:6] + ({'urgency': 2}, 6000)
+
+
+def test_parse_address():
+    assert dbus.parse_address('unix:path=/run/user/1000/bus') == ['/run/user/1000/bus']
+    assert dbus.parse_address('tcp:host=localhost;unix:abstract=/tmp/dbus-x,guid=1') == ['\0/tmp/dbus-x']
+
+
+def test_connection_hello_skips_signals(fake_bus):
+    connection = dbus.DBusConnection(fake_bus.address)
+    try:
+        assert connection.unique_name == ':1.7'
+    finally:
+        connection.close()
+
+
+def test_connection_error_reply(fake_bus):
+    connection = dbus.DBusConnection(fake_bus.address)
+    try:
+        with pytest.raises(dbus.DBusError) as error:
+            connection.call(dbus.BUS_NAME, dbus.BUS_PATH, dbus.BUS_NAME, 'NoSuchMethod')
+        assert 'UnknownMethod' in str(error.value)
+    finally:
+        connection.close()
+
+
+def test_connection_to_missing_bus(tmp_path):
+    with pytest.raises(dbus.DBusError):
+        dbus.DBusConnection('unix:path=' + str(tmp_path / 'missing'))
+
+
+def test_notify(fake_bus):
+    dispatcher = notification_dispatcher.NotificationDispatcher(bus_address=fake_bus.address)
+    try:
+        assert dispatcher.available()
+        notification_id = dispatcher.notify("LOW BATTERY LEVEL", "current capacity: 20%", 6000,
+                                            notification_dispatcher.URGENCY_CRITICAL)
+    finally:
+        dispatcher.close()
+    assert notification_id == 41
+    body, fields = fake_bus.calls[0]
+    assert fields[dbus.FIELD_DESTINATION] == notification_dispatcher.NOTIFICATIONS_NAME
+    assert fields[dbus.FIELD_PATH] == notification_dispatcher.NOTIFICATIONS_PATH
+    assert body == (internal_config.PROGRAM_NAME, 0, '', "LOW BATTERY LEVEL", "current capacity: 20%", [],
+                    {'urgency': notification_dispatcher.URGENCY_CRITICAL}, 6000)
+    assert dispatcher.notifications_sent == 1
+    assert dispatcher.processes_spawned == 0
+
+
+def test_notify_replaces_id_over_one_connection(fake_bus):
+    dispatcher = notification_dispatcher.NotificationDispatcher(bus_address=fake_bus.address)
+    try:
+        first_id = dispatcher.notify("DISCHARGING")
+        second_id = dispatcher.notify("CHARGING", replaces_id=first_id)
+    finally:
+        dispatcher.close()
+    assert second_id == first_id
+    assert [body[1] for body, _ in fake_bus.calls] == [0, first_id]
+    assert fake_bus.connections == 1
+
+
+def test_notify_reconnects_once(tmp_path):
+    bus = FakeBus(str(tmp_path / 'bus'), ['org.freedesktop.DBus.Error.ServiceUnknown'])
+    dispatcher = notification_dispatcher.NotificationDispatcher(bus_address=bus.address)
+    try:
+        assert dispatcher.notify("DISCHARGING") == 41
+    finally:
+        dispatcher.close()
+        bus.close()
+    assert len(bus.calls) == 2
+    assert dispatcher.processes_spawned == 0
+
+
+def test_notify_send_fallback_when_bus_fails(tmp_path, notify_send, capsys):
+    bus = FakeBus(str(tmp_path / 'bus'), ['org.freedesktop.DBus.Error.ServiceUnknown'] * 2)
+    dispatcher = notification_dispatcher.NotificationDispatcher(notify_send, bus.address)
+    try:
+        assert dispatcher.notify("LOW BATTERY LEVEL", "body", 6000) == 0
+        assert wait_for_file(str(tmp_path / 'arguments')) == ['-t', '6000', '-u', 'normal', '-a',
+                                                              internal_config.PROGRAM_NAME, 'LOW BATTERY LEVEL',
+                                                              'body']
+        # D-Bus isn't tried again
+        os.remove(str(tmp_path / 'arguments'))
+        dispatcher.notify("CHARGING")
+        wait_for_file(str(tmp_path / 'arguments'))
+    finally:
+        dispatcher.close()
+        bus.close()
+    assert len(bus.calls) == 2
+    assert dispatcher.processes_spawned == 2
+    assert "using notify-send" in capsys.readouterr().out
+
+
+def test_notify_send_without_bus(tmp_path, notify_send, monkeypatch):
+    monkeypatch.delenv('DBUS_SESSION_BUS_ADDRESS', raising=False)
+    dispatcher = notification_dispatcher.NotificationDispatcher(notify_send)
+    assert dispatcher.available()
+    dispatcher.notify("!!! NO BATTERY !!!", urgency=notification_dispatcher.URGENCY_CRITICAL)
+    assert wait_for_file(str(tmp_path / 'arguments'))[:4] == ['-t', '-1', '-u', 'critical']
+
+
+def test_nothing_available(monkeypatch):
+    monkeypatch.delenv('DBUS_SESSION_BUS_ADDRESS', raising=False)
+    dispatcher = notification_dispatcher.NotificationDispatcher()
+    assert not dispatcher.available()
+    assert dispatcher.notify("DISCHARGING") == 0
+    assert dispatcher.notifications_sent == 0
+
+
+# real message bus, checks authentication and marshalling against reference implementation
+@pytest.mark.skipif(not shutil.which('dbus-daemon'), reason="dbus-daemon isn't installed")
+def test_private_dbus_daemon(tmp_path):
+    config = tmp_path / 'session.conf'
+    config.write_text('<busconfig><type>session</type><listen>unix:path=%s</listen><auth>EXTERNAL</auth>'
+                      '<policy context="default"><allow send_destination="*" eavesdrop="true"/>'
+                      '<allow eavesdrop="true"/><allow own="*"/></policy></busconfig>' % (tmp_path / 'bus'))
+    daemon = subprocess.Popen(['dbus-daemon', '--config-file=%s' % config, '--nofork', '--print-address'],
+                              stdout=subprocess.PIPE)
+    try:
+        address = daemon.stdout.readline().decode('ascii').strip()
+        connection = dbus.DBusConnection(address)
+        try:
+            assert connection.unique_name.startswith(':')
+            names = connection.call(dbus.BUS_NAME, dbus.BUS_PATH, dbus.BUS_NAME, 'ListNames')[0]
+            assert connection.unique_name in names
+            with pytest.raises(dbus.DBusError) as error:
+                connection.call(dbus.BUS_NAME, dbus.BUS_PATH, dbus.BUS_NAME, 'GetNameOwner', 's',
+                                (notification_dispatcher.NOTIFICATIONS_NAME,))
+            assert 'NameHasNoOwner' in str(error.value)
+        finally:
+            connection.close()
+    finally:
+        daemon.terminate()
+        daemon.wait()
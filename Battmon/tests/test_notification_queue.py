@@ -0,0 +1,105 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import pytest
+
+from notifications import notification_queue
+from monitor import event_loop, simulation
+
+POWER = notification_queue.CATEGORY_POWER
+LEVEL = notification_queue.CATEGORY_LEVEL
+
+
+# queue on simulated clock, shown keeps (time, text, replaces_id) of shown notifications
+class QueueScenario(object):
+    def __init__(self, rate=notification_queue.RATE, burst=notification_queue.BURST):
+        self.clock = simulation.SimulatedClock(0.0)
+        self.loop = event_loop.EventLoop(self.clock.time, self.clock.advance)
+        self.queue = notification_queue.NotificationQueue(self.loop, {POWER: 2.0, LEVEL: 0.0}, rate, burst)
+        self.shown = []
+
+    def submit(self, category, text, critical=False):
+        def show(replaces_id):
+            self.shown.append((self.clock.now, text, replaces_id))
+            return len(self.shown)
+
+        self.queue.submit(category, show, critical)
+
+    def run_until(self, when):
+        while self.clock.now < when:
+            self.loop.run_once(when - self.clock.now)
+
+
+@pytest.fixture
+def scenario():
+    return QueueScenario()
+
+
+def test_first_notification_is_shown_right_away(scenario):
+    scenario.submit(POWER, 'DISCHARGING')
+    assert scenario.shown == [(0.0, 'DISCHARGING', 0)]
+
+
+def test_flapping_is_coalesced_and_replaces_shown_one(scenario):
+    scenario.submit(POWER, 'DISCHARGING')
+    for second, text in ((0.5, 'CHARGING'), (1.0, 'DISCHARGING'), (1.5, 'CHARGING')):
+        scenario.run_until(second)
+        scenario.submit(POWER, text)
+    scenario.run_until(10)
+    assert scenario.shown == [(0.0, 'DISCHARGING', 0), (3.5, 'CHARGING', 1)]
+    assert scenario.queue.coalesced == 2
+
+
+def test_debounce_ends_at_max_delay(scenario):
+    scenario.submit(POWER, 'first')
+    second = 0.0
+    while second < 20:
+        second += 1
+        scenario.run_until(second)
+        scenario.submit(POWER, 'at %d' % second)
+    # first pending notification was submitted after 1 second
+    assert scenario.shown[1] == (1 + notification_queue.MAX_DELAY, 'at 10', 1)
+
+
+def test_critical_skips_debounce_and_rate_limit():
+    scenario = QueueScenario(rate=0.01, burst=1)
+    scenario.submit(LEVEL, 'LOW')
+    scenario.submit(LEVEL, 'CRITICAL', critical=True)
+    assert [text for _, text, _ in scenario.shown] == ['LOW', 'CRITICAL']
+
+
+def test_rate_limit_waits_for_token():
+    scenario = QueueScenario(rate=0.5, burst=1)
+    scenario.submit(LEVEL, 'LOW')
+    scenario.submit(POWER, 'CHARGING')
+    scenario.run_until(10)
+    assert [(when, text) for when, text, _ in scenario.shown] == [(0.0, 'LOW'), (2.0, 'CHARGING')]
+
+
+def test_waiting_for_token_keeps_first_submit_time():
+    scenario = QueueScenario(rate=0.1, burst=1)
+    scenario.submit(LEVEL, 'LOW')
+    scenario.submit(POWER, 'DISCHARGING')
+    scenario.run_until(1)
+    scenario.submit(POWER, 'CHARGING')
+    # debounce ends at 3 seconds, but there is no token until 10 seconds
+    scenario.run_until(9)
+    scenario.submit(POWER, 'DISCHARGING again')
+    scenario.run_until(9.5)
+    scenario.submit(POWER, 'CHARGING again')
+    scenario.run_until(30)
+    assert [(when, text) for when, text, _ in scenario.shown][1] == (notification_queue.MAX_DELAY,
+                                                                     'CHARGING again')
@@ -0,0 +1,95 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+from values import read_battery_values
+from monitor import poll_scheduler
+
+LOW, CRITICAL, MINIMAL = 23, 7, 3
+MIN_INTERVAL, MAX_INTERVAL, DEFAULT_INTERVAL = 1, 120, 6
+ENERGY_FULL = 50000000
+
+
+# sample at given capacity, average power is given as hours to drain or fill the whole battery
+def make_sample(capacity, hours=5.0, ac_present=False, battery_present=True):
+    average_power = int(ENERGY_FULL / hours) if hours else 0
+    return read_battery_values.BatterySample(0, battery_present, ac_present,
+                                             'Charging' if ac_present else 'Discharging',
+                                             capacity * ENERGY_FULL // 100, ENERGY_FULL, average_power,
+                                             average_power, capacity, -1, ())
+
+
+def make_scheduler(default_interval=DEFAULT_INTERVAL):
+    return poll_scheduler.AdaptiveScheduler((LOW, CRITICAL, MINIMAL), MIN_INTERVAL, MAX_INTERVAL, default_interval)
+
+
+def test_time_to_next_threshold():
+    scheduler = make_scheduler()
+    # 1% of battery takes 3 minutes, capacity is low at 23% so 24% must be left
+    assert scheduler.time_to_next_threshold(make_sample(34)) == pytest.approx(10 * 180)
+    assert scheduler.time_to_next_threshold(make_sample(20)) == pytest.approx(12 * 180)
+    assert scheduler.time_to_next_threshold(make_sample(MINIMAL)) is None
+    assert scheduler.time_to_next_threshold(make_sample(90, ac_present=True)) == pytest.approx(9 * 180)
+    assert scheduler.time_to_next_threshold(make_sample(100, ac_present=True)) is None
+
+
+def test_interval_shortens_near_threshold():
+    scheduler = make_scheduler()
+    # 1% of battery takes 36 seconds
+    intervals = [scheduler.interval(make_sample(capacity, hours=1)) for capacity in range(30, 23, -1)]
+    assert intervals == sorted(intervals, reverse=True)
+    assert intervals[0] == MAX_INTERVAL
+    assert intervals[-1] == MIN_INTERVAL
+    # sleeps part of predicted time, so threshold isn't missed
+    assert scheduler.interval(make_sample(25, hours=1)) == pytest.approx(36 * poll_scheduler.SAFETY_FACTOR)
+
+
+def test_interval_shortens_on_state_change():
+    scheduler = make_scheduler()
+    # charging far from full, nothing to watch closely
+    charging = scheduler.interval(make_sample(24, ac_present=True))
+    # unplugged right above low level
+    discharging = scheduler.interval(make_sample(24))
+    assert charging == MAX_INTERVAL
+    assert discharging == MIN_INTERVAL
+    # battery removed, only plugging it back matters
+    assert scheduler.interval(make_sample(24, battery_present=False)) == MAX_INTERVAL
+
+
+def test_interval_lengthens_while_level_is_stable():
+    scheduler = make_scheduler()
+    fast = scheduler.interval(make_sample(26, hours=1))
+    slow = scheduler.interval(make_sample(26, hours=2))
+    assert slow == pytest.approx(2 * fast)
+    assert scheduler.interval(make_sample(26, hours=1000)) == MAX_INTERVAL
+
+
+def test_interval_without_rate_uses_default():
+    scheduler = make_scheduler()
+    assert scheduler.interval(make_sample(50, hours=0)) == DEFAULT_INTERVAL
+    # full battery on ac
+    assert scheduler.interval(make_sample(100, ac_present=True)) == DEFAULT_INTERVAL
+
+
+@pytest.mark.parametrize('default_interval', [0, 1000])
+@pytest.mark.parametrize('hours', [0, 0.01, 1000])
+@pytest.mark.parametrize('capacity', [100, 24, 4])
+@pytest.mark.parametrize('ac_present', [False, True])
+def test_interval_is_within_bounds(default_interval, hours, capacity, ac_present):
+    interval = make_scheduler(default_interval).interval(make_sample(capacity, hours, ac_present))
+    assert MIN_INTERVAL <= interval <= MAX_INTERVAL
@@ -0,0 +1,89 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+from monitor import power_supply_events
+
+AC_CHANGE = (b'change@/devices/LNXSYSTM:00/LNXSYBUS:00/ACPI0003:00/power_supply/AC\0'
+             b'ACTION=change\0'
+             b'DEVPATH=/devices/LNXSYSTM:00/LNXSYBUS:00/ACPI0003:00/power_supply/AC\0'
+             b'SUBSYSTEM=power_supply\0'
+             b'POWER_SUPPLY_NAME=AC\0'
+             b'POWER_SUPPLY_TYPE=Mains\0'
+             b'POWER_SUPPLY_ONLINE=1\0'
+             b'SEQNUM=4242\0')
+
+BATTERY_ADD = (b'add@/devices/LNXSYSTM:00/device:00/PNP0C0A:00/power_supply/BAT1\0'
+               b'ACTION=add\0'
+               b'DEVPATH=/devices/LNXSYSTM:00/device:00/PNP0C0A:00/power_supply/BAT1\0'
+               b'SUBSYSTEM=power_supply\0'
+               b'POWER_SUPPLY_NAME=BAT1\0'
+               b'POWER_SUPPLY_MODEL_NAME=45N1 \xc3\xa9\0')
+
+USB_ADD = (b'add@/devices/pci0000:00/0000:00:14.0/usb1/1-2\0'
+           b'ACTION=add\0'
+           b'DEVPATH=/devices/pci0000:00/0000:00:14.0/usb1/1-2\0'
+           b'SUBSYSTEM=usb\0'
+           b'DEVTYPE=usb_device\0')
+
+
+def test_parse_change_event():
+    action, values = power_supply_events.parse_uevent(AC_CHANGE)
+    assert action == 'change'
+    assert values['SUBSYSTEM'] == 'power_supply'
+    assert values['POWER_SUPPLY_ONLINE'] == '1'
+    assert values['SEQNUM'] == '4242'
+    # header isn't a value
+    assert len(values) == 7
+
+
+def test_parse_add_event_with_utf8_value():
+    action, values = power_supply_events.parse_uevent(BATTERY_ADD)
+    assert action == 'add'
+    assert action in power_supply_events.HOTPLUG_ACTIONS
+    assert values['POWER_SUPPLY_MODEL_NAME'] == u'45N1 \xe9'
+
+
+def test_parse_other_subsystem():
+    action, values = power_supply_events.parse_uevent(USB_ADD)
+    assert (action, values['SUBSYSTEM']) == ('add', 'usb')
+    assert power_supply_events.parse_power_supply_event(USB_ADD) is None
+
+
+@pytest.mark.parametrize('message', [AC_CHANGE, BATTERY_ADD])
+def test_power_supply_events_are_kept(message):
+    assert power_supply_events.parse_power_supply_event(message) == power_supply_events.parse_uevent(message)
+
+
+@pytest.mark.parametrize('message', [
+    b'',
+    b'\0',
+    # udev daemon messages have binary header instead of action@devpath
+    b'libudev\0\xfe\xed\xca\xfe\0\0\0\0',
+    b'change /devices/power_supply/AC\0SUBSYSTEM=power_supply\0',
+])
+def test_not_uevent(message):
+    assert power_supply_events.parse_uevent(message) is None
+    assert power_supply_events.parse_power_supply_event(message) is None
+
+
+def test_values_without_separator_are_skipped():
+    action, values = power_supply_events.parse_uevent(b'remove@/devices/power_supply/BAT0\0garbage\0'
+                                                      b'SUBSYSTEM=power_supply\0EMPTY=\0A=b=c\0')
+    assert action == 'remove'
+    assert values == {'SUBSYSTEM': 'power_supply', 'EMPTY': '', 'A': 'b=c'}
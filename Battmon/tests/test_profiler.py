@@ -0,0 +1,85 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import json
+import signal
+import time
+
+from values import power_supply_sources
+from monitor import battery_states, profiler, simulation
+
+
+# use cpu for given seconds, so profiler gets samples
+def busy_loop(seconds):
+    total = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        for i in range(1000):
+            total += i * i
+    return total
+
+
+def test_sampler_collects_stacks_and_writes_report(tmp_path):
+    previous_handler = signal.getsignal(signal.SIGPROF)
+    sampler = profiler.SamplingProfiler(interval=0.001)
+    assert sampler.toggle()
+    busy_loop(0.3)
+    assert not sampler.toggle()
+    assert sampler.samples > 10
+    # handler is given back and no more samples are taken
+    assert signal.getsignal(signal.SIGPROF) == previous_handler
+    samples = sampler.samples
+    busy_loop(0.05)
+    assert sampler.samples == samples
+
+    path = tmp_path / 'profile' / 'report.txt'
+    sampler.dump(str(path))
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith('%d samples every 1.0 ms of cpu time' % samples)
+    functions = [line.split()[2] for line in lines[2:]]
+    assert functions[0] == 'busy_loop'
+    assert 'test_sampler_collects_stacks_and_writes_report' in functions
+    own, total = [int(value) for value in lines[2].split()[:2]]
+    assert 0 < own <= total <= samples
+
+
+def test_report_limit():
+    sampler = profiler.SamplingProfiler(interval=0.001)
+    sampler.start()
+    busy_loop(0.1)
+    sampler.stop()
+    assert len(sampler.report(limit=1).splitlines()) == 3
+
+
+def test_stats_counters():
+    source = power_supply_sources.FakeSource()
+    source.set_device('BAT0', 'Battery', {'PRESENT': 1, 'STATUS': 'Discharging', 'ENERGY_NOW': 50,
+                                          'ENERGY_FULL': 100, 'POWER_NOW': 10})
+    source.set_device('AC', 'Mains', {'ONLINE': 0})
+    sim = simulation.Simulation(source, simulation.SimulatedClock())
+    try:
+        for _ in range(5):
+            sim.tick()
+        stats = json.loads(sim.monitor._Monitor__answer_instance_command('stats'))
+    finally:
+        sim.close()
+    assert stats['ticks'] == 5
+    assert stats['uptime'] == 5
+    assert stats['state_times'] == {battery_states.DISCHARGING: 5}
+    assert stats['sysfs_reads'] >= 5 * 2
+    assert stats['device_rescans'] == 1
+    assert stats['profiling'] is False
@@ -0,0 +1,79 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import json
+import os
+
+from values import program_index
+
+
+# create file in directory with given mode
+def make_file(directory, name, mode):
+    path = directory / name
+    path.write_text(u'#!/bin/sh\n')
+    os.chmod(str(path), mode)
+    return str(path)
+
+
+def test_only_executable_files_are_found(tmp_path):
+    first = tmp_path / 'first'
+    second = tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    make_file(first, 'notify-send', 0o644)
+    program = make_file(second, 'notify-send', 0o755)
+    make_file(second, 'README', 0o644)
+
+    index = program_index.ProgramIndex([str(first), str(second)], str(tmp_path / 'cache.json'))
+    assert index.find('notify-send') == program
+    assert index.find('README') is None
+
+
+def test_index_is_read_from_cache(tmp_path):
+    programs = tmp_path / 'bin'
+    programs.mkdir()
+    make_file(programs, 'aplay', 0o755)
+    cache_file = str(tmp_path / 'cache' / 'programs.json')
+
+    assert not program_index.ProgramIndex([str(programs)], cache_file).from_cache
+    index = program_index.ProgramIndex([str(programs)], cache_file)
+    assert index.from_cache
+    assert index.find('aplay') == str(programs / 'aplay')
+
+
+def test_only_looked_up_names_are_checked(tmp_path, monkeypatch):
+    for name in ('aplay', 'paplay', 'play'):
+        make_file(tmp_path, name, 0o755)
+    (tmp_path / 'notify-send').mkdir()
+    checked = []
+    access = os.access
+
+    def counting_access(path, mode):
+        checked.append(os.path.basename(path))
+        return access(path, mode)
+
+    monkeypatch.setattr(os, 'access', counting_access)
+    cache_file = tmp_path.parent / ('%s-cache.json' % tmp_path.name)
+    index = program_index.ProgramIndex([str(tmp_path)], str(cache_file))
+    assert checked == []
+    assert index.find('paplay') == str(tmp_path / 'paplay')
+    assert index.find('paplay') == str(tmp_path / 'paplay')
+    assert index.find('notify-send') is None
+    assert checked == ['paplay']
+    # cache keeps names and indexes of their directories only
+    names = json.loads(cache_file.read_text())['names']
+    assert names == {'aplay': [0], 'paplay': [0], 'play': [0], 'notify-send': [0]}
@@ -0,0 +1,86 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+from values import battery_health, power_supply_sources, read_battery_values
+
+
+# battery values of fake source with one ac adapter unplugged
+def battery_values(*batteries):
+    source = power_supply_sources.FakeSource()
+    for index, values in enumerate(batteries):
+        source.set_device('BAT%d' % index, 'Battery', dict(values, PRESENT=1, STATUS='Discharging'))
+    source.set_device('AC', 'Mains', {'ONLINE': 0})
+    return read_battery_values.BatteryValues(source=source, clock=lambda: 1000.0)
+
+
+def test_energy_batteries_are_summed():
+    sample = battery_values({'ENERGY_NOW': 30000000, 'ENERGY_FULL': 40000000, 'POWER_NOW': 10000000},
+                            {'ENERGY_NOW': 0, 'ENERGY_FULL': 20000000, 'POWER_NOW': 0}).sample()
+    assert sample.energy_now == 30000000
+    assert sample.energy_full == 60000000
+    assert sample.capacity == 50
+    assert sample.remaining_time == 3 * 60 * 60
+
+
+def test_charge_battery_without_voltage_keeps_its_unit():
+    sample = battery_values({'CHARGE_NOW': 2000000, 'CHARGE_FULL': 4000000, 'CURRENT_NOW': 1000000}).sample()
+    assert sample.batteries[0].unit == read_battery_values.UNIT_CHARGE
+    assert sample.capacity == 50
+    assert sample.remaining_time == 2 * 60 * 60
+
+
+def test_capacity_only_battery_is_kept_out_of_energy_sums():
+    sample = battery_values({'ENERGY_NOW': 30000000, 'ENERGY_FULL': 40000000, 'POWER_NOW': 10000000},
+                            {'CAPACITY': 25}).sample()
+    assert sample.batteries[1].unit == read_battery_values.UNIT_NONE
+    assert sample.batteries[1].energy_full == 0
+    assert sample.energy_full == 40000000
+    assert sample.capacity == (75 + 25) // 2
+    assert sample.remaining_time == 3 * 60 * 60
+
+
+def test_charge_battery_is_kept_out_of_energy_sums():
+    sample = battery_values({'ENERGY_NOW': 30000000, 'ENERGY_FULL': 40000000, 'POWER_NOW': 10000000},
+                            {'CHARGE_NOW': 1000000, 'CHARGE_FULL': 4000000, 'CURRENT_NOW': 1000000}).sample()
+    assert sample.energy_now == 30000000
+    assert sample.energy_full == 40000000
+    assert sample.power_now == 10000000
+    assert sample.capacity == (75 + 25) // 2
+
+
+def test_charge_battery_with_voltage_is_summed_as_energy():
+    sample = battery_values({'ENERGY_NOW': 30000000, 'ENERGY_FULL': 40000000, 'POWER_NOW': 10000000},
+                            {'CHARGE_NOW': 1000000, 'CHARGE_FULL': 4000000, 'CURRENT_NOW': 1000000,
+                             'VOLTAGE_NOW': 10000000}).sample()
+    assert sample.batteries[1].unit == read_battery_values.UNIT_ENERGY
+    assert sample.energy_full == 80000000
+    assert sample.capacity == 40000000 * 100 // 80000000
+
+
+def test_battery_sources_are_not_shared():
+    first = battery_values({'ENERGY_NOW': 1, 'ENERGY_FULL': 2})
+    second = battery_values({'CAPACITY': 40})
+    assert first.sample().batteries[0].unit == read_battery_values.UNIT_ENERGY
+    assert second.sample().batteries[0].unit == read_battery_values.UNIT_NONE
+
+
+def test_health_tracks_only_energy_batteries():
+    health = battery_health.BatteryHealth()
+    health.add(battery_values({'ENERGY_NOW': 30000000, 'ENERGY_FULL': 40000000},
+                              {'CHARGE_NOW': 1000000, 'CHARGE_FULL': 4000000},
+                              {'CAPACITY': 25}).sample())
+    assert sorted(health.batteries) == ['BAT0']
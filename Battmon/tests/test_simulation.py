@@ -0,0 +1,176 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import pytest
+
+from values import internal_config, power_supply_sources, program_index
+from monitor import battery_monitor, battery_states, simulation
+
+LOW, CRITICAL, MINIMAL = 23, 7, 3
+ENERGY_FULL = 50000000
+
+# seconds from minimal level to minimal battery level command
+COMMAND_DELAY = battery_monitor.MINIMAL_LEVEL_STEPS[-1][0]
+
+
+# write battery with given capacity and ac to fake source
+def set_battery(source, capacity, ac_present=False, power_now=10000000):
+    source.set_device('BAT0', 'Battery', {'PRESENT': 1,
+                                          'STATUS': 'Charging' if ac_present else 'Discharging',
+                                          'ENERGY_NOW': capacity * ENERGY_FULL // 100,
+                                          'ENERGY_FULL': ENERGY_FULL,
+                                          'POWER_NOW': power_now})
+    source.set_device('AC', 'Mains', {'ONLINE': 1 if ac_present else 0})
+
+
+@pytest.fixture
+def scenario():
+    source = power_supply_sources.FakeSource()
+    set_battery(source, 50)
+    sim = simulation.Simulation(source, simulation.SimulatedClock(), LOW, CRITICAL, MINIMAL)
+    sim.source = source
+    yield sim
+    sim.close()
+
+
+# summaries of shown notifications
+def summaries(sim):
+    return [notification[1] for notification in sim.dispatcher.notifications]
+
+
+def test_discharge_crosses_every_threshold():
+    sim = simulation.run_discharge(hours=1, low_value=LOW, critical_value=CRITICAL, minimal_value=MINIMAL)
+    assert [(capacity, state, actions) for _, capacity, state, actions in sim.events] == [
+        (100, battery_states.DISCHARGING, [battery_states.NOTIFY_DISCHARGING]),
+        (LOW, battery_states.LOW, [battery_states.NOTIFY_LOW]),
+        (CRITICAL, battery_states.CRITICAL, [battery_states.NOTIFY_CRITICAL]),
+        (MINIMAL, battery_states.MINIMAL, [battery_states.MINIMAL_LEVEL]),
+    ]
+    assert summaries(sim) == ["DISCHARGING", "LOW BATTERY LEVEL", "CRITICAL BATTERY LEVEL",
+                              "!!! MINIMAL BATTERY LEVEL !!!", "!!! MINIMAL BATTERY LEVEL !!!"]
+    # screen is locked, then minimal battery level command is run
+    minimal_time = sim.events[-1][0]
+    assert [command_time - minimal_time for command_time, _ in sim.dispatcher.commands] == [COMMAND_DELAY] * 2
+    assert sim.dispatcher.commands[0][1] == 'true'
+    assert 'shutdown' in sim.dispatcher.commands[1][1]
+
+
+def test_check_interval_is_kept():
+    sim = simulation.run_discharge(hours=1, update_interval=5)
+    times = [event[0] for event in sim.events]
+    assert all((timestamp - simulation.START_TIME) % 5 == 0 for timestamp in times)
+
+
+def test_ac_plugged_cancels_countdown(scenario):
+    set_battery(scenario.source, MINIMAL)
+    for _ in range(10):
+        scenario.tick()
+    set_battery(scenario.source, MINIMAL, ac_present=True)
+    for _ in range(2 * COMMAND_DELAY):
+        scenario.tick()
+    assert scenario.dispatcher.commands == []
+    assert summaries(scenario) == ["!!! MINIMAL BATTERY LEVEL !!!", "CHARGING"]
+
+
+def test_ac_plugged_right_before_command():
+    source = power_supply_sources.FakeSource()
+    set_battery(source, MINIMAL)
+    clock = simulation.SimulatedClock()
+
+    # ac is plugged while waiting for next tick, right before the command would run
+    def on_sleep(seconds):
+        if clock.now >= simulation.START_TIME + COMMAND_DELAY:
+            set_battery(source, MINIMAL, ac_present=True)
+
+    sim = simulation.Simulation(source, clock, LOW, CRITICAL, MINIMAL, on_sleep=on_sleep)
+    try:
+        for _ in range(COMMAND_DELAY):
+            sim.tick()
+        assert sim.dispatcher.commands == []
+        assert sim.tick()[1] == battery_states.CHARGING
+    finally:
+        sim.close()
+
+
+def test_countdown_warns_and_starts_over(scenario):
+    set_battery(scenario.source, MINIMAL)
+    for _ in range(COMMAND_DELAY + 2):
+        scenario.tick()
+    assert len(scenario.dispatcher.commands) == 2
+    # still on minimal level after resume, warn and count down again
+    assert summaries(scenario) == ["!!! MINIMAL BATTERY LEVEL !!!", "!!! MINIMAL BATTERY LEVEL !!!",
+                                   "!!! MINIMAL BATTERY LEVEL !!!"]
+    last_chance = scenario.dispatcher.notifications[1]
+    assert "Last chance" in last_chance[2]
+    assert last_chance[0] - scenario.dispatcher.notifications[0][0] == 12
+
+
+def test_discharging_notification_waits_for_remaining_time(scenario):
+    set_battery(scenario.source, 50, power_now=0)
+    sample, state, actions = scenario.tick()
+    assert (state, actions, summaries(scenario)) == (battery_states.DISCHARGING, [], [])
+    set_battery(scenario.source, 50, power_now=10000000)
+    sample, state, actions = scenario.tick()
+    assert actions == [battery_states.NOTIFY_DISCHARGING]
+    assert "time left: 2h 30min" in scenario.dispatcher.notifications[0][2]
+
+
+def test_flapping_ac_is_coalesced(scenario):
+    scenario.tick()
+    for second in range(1, 9):
+        set_battery(scenario.source, 50, ac_present=second % 2 == 1)
+        scenario.tick()
+    for _ in range(20):
+        scenario.tick()
+    shown = summaries(scenario)
+    assert len(shown) < 9
+    # the last shown notification is about the last change and replaces the earlier ones
+    assert shown[-1] == "DISCHARGING"
+    ids = set(notification[4] for notification in scenario.dispatcher.notifications[1:])
+    assert ids == set([1])
+
+
+def test_battery_removed_and_plugged(scenario):
+    set_battery(scenario.source, 50, ac_present=True)
+    scenario.tick()
+    scenario.source.remove_device('BAT0')
+    for _ in range(3):
+        scenario.tick()
+    # without power supply events, added battery is found by periodic device rescan
+    set_battery(scenario.source, 50, ac_present=True)
+    for _ in range(internal_config.DEFAULT_DEVICE_RESCAN_INTERVAL + 1):
+        scenario.tick()
+    assert [event[3] for event in scenario.events] == [
+        [battery_states.NOTIFY_CHARGING],
+        [battery_states.NOTIFY_BATTERY_REMOVED, battery_states.NOTIFY_NO_BATTERY],
+        [battery_states.NOTIFY_BATTERY_PLUGGED, battery_states.NOTIFY_CHARGING],
+    ]
+
+
+def test_simulation_doesnt_write_programs_cache(monkeypatch):
+    cache_files = []
+    program_index_class = program_index.ProgramIndex
+
+    def recording_program_index(path=internal_config.EXTRA_PROGRAMS_PATH,
+                                cache_file=internal_config.PROGRAM_INDEX_CACHE_FILE):
+        cache_files.append(cache_file)
+        return program_index_class(path, cache_file)
+
+    monkeypatch.setattr(program_index, 'ProgramIndex', recording_program_index)
+    source = power_supply_sources.FakeSource()
+    set_battery(source, 50)
+    simulation.Simulation(source, simulation.SimulatedClock()).close()
+    assert cache_files == ['']
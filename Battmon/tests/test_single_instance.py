@@ -0,0 +1,169 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import os
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+
+from monitor import event_loop, single_instance
+
+
+# unique abstract socket name, so tests don't meet running battmon or each other
+@pytest.fixture
+def address():
+    return '\0battmon-test-%d-%s' % (os.getpid(), uuid.uuid4().hex)
+
+
+# instance server on event loop with simulated clock, it answers commands with their upper case
+@pytest.fixture
+def server(address):
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    loop = event_loop.EventLoop(lambda: now[0], sleep)
+    instance_server = single_instance.InstanceServer(lambda command: command.upper(), loop, address)
+    instance_server.loop = loop
+    instance_server.address = address
+    yield instance_server
+    instance_server.close()
+
+
+# client connected to server, command is sent only when given
+def connect(server, command=None):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(2)
+    client.connect(server.address)
+    if command is not None:
+        client.sendall(command.encode('utf-8') + b'\n')
+    return client
+
+
+# run event loop until nothing more comes
+def run_loop(server, times=3):
+    for _ in range(times):
+        server.loop.run_once(0)
+
+
+# send_command() running in thread while server runs on event loop
+def send_in_thread(server, command):
+    answers = []
+    thread = threading.Thread(target=lambda: answers.append(single_instance.send_command(command,
+                                                                                         server.address)))
+    thread.start()
+    while thread.is_alive():
+        server.loop.run_once(0.01)
+    thread.join()
+    return answers[0]
+
+
+def test_no_instance_is_running(address):
+    assert single_instance.send_command('status', address) is None
+    assert list(single_instance.subscribe(address)) == []
+
+
+def test_second_instance_is_refused(server):
+    with pytest.raises(single_instance.AlreadyRunning):
+        single_instance.InstanceServer(lambda command: command, server.loop, server.address)
+
+
+def test_address_is_free_after_close(address):
+    loop = event_loop.EventLoop()
+    single_instance.InstanceServer(lambda command: command, loop, address).close()
+    single_instance.InstanceServer(lambda command: command, loop, address).close()
+
+
+def test_command_is_answered(server):
+    assert send_in_thread(server, 'status') == 'STATUS'
+
+
+def test_silent_client_doesnt_block_loop(server):
+    silent = connect(server)
+    run_loop(server)
+    start = time.time()
+    talking = connect(server, 'ping')
+    run_loop(server)
+    assert talking.recv(4096) == b'PING\n'
+    assert time.time() - start < 0.5
+    silent.close()
+    talking.close()
+
+
+def test_silent_client_is_dropped(server):
+    silent = connect(server)
+    run_loop(server)
+    server.loop.run_once(single_instance.SOCKET_TIMEOUT)
+    assert silent.recv(4096) == b''
+    silent.close()
+
+
+def test_command_in_pieces(server):
+    client = connect(server)
+    client.sendall(b'sta')
+    run_loop(server)
+    client.sendall(b'tus\n')
+    run_loop(server)
+    assert client.recv(4096) == b'STATUS\n'
+    client.close()
+
+
+def test_subscriber_gets_published_lines(server):
+    client = connect(server, single_instance.SUBSCRIBE_COMMAND)
+    run_loop(server)
+    assert client.recv(4096) == b'SUBSCRIBE\n'
+    assert server.subscribers() == 1
+    server.publish('{"capacity":50}')
+    assert client.recv(4096) == b'{"capacity":50}\n'
+    # the other clients are closed after answer
+    assert send_in_thread(server, 'ping') == 'PING'
+    assert server.subscribers() == 1
+    client.close()
+
+
+def test_closed_subscriber_is_dropped(server):
+    client = connect(server, single_instance.SUBSCRIBE_COMMAND)
+    run_loop(server)
+    client.close()
+    run_loop(server)
+    assert server.subscribers() == 0
+    server.publish('line')
+    assert server.subscribers() == 0
+
+
+def test_subscribe_yields_every_line(server):
+    lines = []
+
+    def follow():
+        for line in single_instance.subscribe(server.address):
+            lines.append(line)
+            if len(lines) == 3:
+                return
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    deadline = time.time() + 5
+    while server.subscribers() == 0 and time.time() < deadline:
+        server.loop.run_once(0.01)
+    server.publish('first')
+    server.publish('second')
+    thread.join(5)
+    assert lines == ['SUBSCRIBE', 'first', 'second']
@@ -0,0 +1,143 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import array
+import os
+import time
+import wave
+
+import pytest
+
+from values import internal_config
+from monitor import event_loop
+from notifications import sound_player
+
+# 16 bit mono samples of test sound
+SAMPLES = [0, 1000, -1000, 32767, -32768] * 200
+RATE = 8000
+MAX_VOLUME = internal_config.MAX_SOUND_VOLUME_LEVEL
+
+
+# dispatcher keeping commands it was asked to run
+class RecordingDispatcher(object):
+    def __init__(self):
+        self.commands = []
+
+    def run(self, command, shell=False):
+        self.commands.append(command)
+
+
+# event loop with simulated clock
+def make_loop():
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    return event_loop.EventLoop(lambda: now[0], sleep)
+
+
+# stub 'aplay' writing its arguments and every start to files and everything it reads to 'pcm' file
+@pytest.fixture
+def player(tmp_path):
+    path = tmp_path / 'aplay'
+    path.write_text(u'#!/bin/sh\necho "$@" > %s/arguments\necho start >> %s/starts\nexec cat >> %s/pcm\n'
+                    % ((tmp_path,) * 3))
+    os.chmod(str(path), 0o755)
+    sound_file = tmp_path / 'sound.wav'
+    sound = wave.open(str(sound_file), 'wb')
+    sound.setnchannels(1)
+    sound.setsampwidth(2)
+    sound.setframerate(RATE)
+    sound.writeframes(array.array('h', SAMPLES).tobytes())
+    sound.close()
+    dispatcher = RecordingDispatcher()
+    loop = make_loop()
+    sound = sound_player.SoundPlayer(str(path), str(sound_file), MAX_VOLUME, loop, dispatcher)
+    sound.directory = tmp_path
+    sound.loop = loop
+    sound.dispatcher = dispatcher
+    yield sound
+    sound.close()
+
+
+# content of file written by stub player once it has given size, waits for player to read the pipe
+def wait_for(path, size, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists() and len(path.read_bytes()) >= size:
+            break
+        time.sleep(0.01)
+    return path.read_bytes() if path.exists() else b''
+
+
+# running player process
+def process(player):
+    return player._SoundPlayer__process
+
+
+def pcm(samples):
+    return array.array('h', samples).tobytes()
+
+
+def test_player_reads_raw_pcm(player):
+    player.play()
+    assert wait_for(player.directory / 'pcm', len(pcm(SAMPLES))) == pcm(SAMPLES)
+    arguments = wait_for(player.directory / 'arguments', 1).split()
+    assert arguments == [b'-q', b'-t', b'raw', b'-f', b'S16_LE', b'-r', b'8000', b'-c', b'1']
+
+
+def test_sounds_go_to_one_player(player):
+    player.play()
+    player.play()
+    player.play(MAX_VOLUME // 2 + 1)
+    factor = (MAX_VOLUME // 2 + 1) / float(MAX_VOLUME)
+    expected = pcm(SAMPLES) * 2 + pcm([int(sample * factor) for sample in SAMPLES])
+    assert wait_for(player.directory / 'pcm', len(expected)) == expected
+    assert player.spawned == 1
+
+
+def test_player_is_started_again_after_it_died(player):
+    player.play()
+    wait_for(player.directory / 'pcm', len(pcm(SAMPLES)))
+    process(player).kill()
+    process(player).wait()
+    player.play()
+    assert wait_for(player.directory / 'pcm', 2 * len(pcm(SAMPLES))) == pcm(SAMPLES) * 2
+    assert player.spawned == 2
+    assert wait_for(player.directory / 'starts', 12) == b'start\nstart\n'
+
+
+def test_idle_player_is_closed(player):
+    player.play()
+    running = process(player)
+    player.loop.run_once(sound_player.IDLE_TIMEOUT)
+    assert process(player) is None
+    # closed pipe ends the player
+    assert running.wait() == 0
+    player.play()
+    assert player.spawned == 2
+
+
+def test_other_files_are_played_by_player_command(tmp_path):
+    sound_file = tmp_path / 'sound.ogg'
+    sound_file.write_bytes(b'OggS')
+    dispatcher = RecordingDispatcher()
+    sound = sound_player.SoundPlayer('/usr/bin/paplay', str(sound_file), MAX_VOLUME, make_loop(), dispatcher)
+    sound.play()
+    assert dispatcher.commands == [['/usr/bin/paplay', '--volume', '65536', str(sound_file)]]
+    assert sound.spawned == 0
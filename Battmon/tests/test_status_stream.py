@@ -0,0 +1,100 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import json
+
+from values import power_supply_sources, read_battery_values
+from monitor import status_stream
+
+ENERGY_FULL = 50000000
+
+
+# writer keeping written text and number of flushes
+class FakeWriter(object):
+    def __init__(self):
+        self.text = ''
+        self.flushes = 0
+
+    def write(self, text):
+        self.text += text
+
+    def flush(self):
+        self.flushes += 1
+
+
+# battery values read from fake source, set_battery() changes them and returns new sample
+class FakeBattery(object):
+    def __init__(self, battery_present=True):
+        self.source = power_supply_sources.FakeSource()
+        if battery_present:
+            self.__set_devices(50, False, 0)
+        self.values = read_battery_values.BatteryValues(source=self.source, clock=lambda: 1000.0)
+
+    def set_battery(self, capacity, ac_present=False, power_now=7500000):
+        self.__set_devices(capacity, ac_present, power_now)
+        return self.values.sample()
+
+    def __set_devices(self, capacity, ac_present, power_now):
+        self.source.set_device('BAT0', 'Battery', {'PRESENT': 1,
+                                                   'STATUS': 'Charging' if ac_present else 'Discharging',
+                                                   'ENERGY_NOW': capacity * ENERGY_FULL // 100,
+                                                   'ENERGY_FULL': ENERGY_FULL, 'POWER_NOW': power_now})
+        self.source.set_device('AC', 'Mains', {'ONLINE': 1 if ac_present else 0})
+
+
+def test_check_template():
+    assert status_stream.check_template('{capacity}% {status} {time} {power} {source}') == []
+    assert len(status_stream.check_template('{capacity}% {colour}')) == 1
+    assert len(status_stream.check_template('{capacity')) == 1
+
+
+def test_plain_lines_only_on_change():
+    battery = FakeBattery()
+    writer = FakeWriter()
+    stream = status_stream.StatusStream('{source} {capacity}% {status} {time} {power}', output=writer)
+    assert stream.write(battery.set_battery(50))
+    # the same text isn't written again
+    assert not stream.write(battery.set_battery(50))
+    assert stream.write(battery.set_battery(49))
+    assert stream.write(battery.set_battery(49, ac_present=True, power_now=15000000))
+    assert writer.text.splitlines() == ['BAT 50% Discharging 3h 20min 7.5W',
+                                        'BAT 49% Discharging 3h 16min 7.5W',
+                                        'AC 49% Charging 1h 42min 15.0W']
+    assert stream.lines_written == writer.flushes == 3
+
+
+def test_no_battery_line():
+    battery = FakeBattery(battery_present=False)
+    writer = FakeWriter()
+    stream = status_stream.StatusStream('{capacity}% {status} {time}', output=writer)
+    stream.write(battery.values.sample())
+    assert writer.text == '0% No battery Unknown\n'
+
+
+def test_i3bar_protocol():
+    battery = FakeBattery()
+    writer = FakeWriter()
+    stream = status_stream.StatusStream('{capacity}%', i3bar=True, critical_value=7, output=writer)
+    stream.write(battery.set_battery(8))
+    stream.write(battery.set_battery(8))
+    stream.write(battery.set_battery(7))
+    stream.write(battery.set_battery(7, ac_present=True))
+    assert writer.text.startswith(status_stream.I3BAR_HEADER)
+    # body is endless json array, closing it makes it valid json
+    lines = json.loads(writer.text[len('{"version":1}\n'):] + ']')
+    assert lines == [[{'name': 'battmon', 'full_text': '8%'}],
+                     [{'name': 'battmon', 'full_text': '7%', 'urgent': True}]]
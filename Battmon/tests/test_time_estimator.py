@@ -0,0 +1,116 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+from values import time_estimator
+
+SIZE = 30
+# uWh per hour, energy goes down by 1000 uWh every second
+RATE = 1000 * 60 * 60
+DISCHARGING = (False, True)
+CHARGING = (True, False)
+
+
+# add samples taken every interval seconds from start time, energy changes by rate per hour
+def add_samples(estimator, key, start, count, energy, rate, interval=10, power=RATE):
+    for i in range(count):
+        estimator.add(key, start + i * interval, energy + rate * i * interval // 3600, power)
+    return start + count * interval, energy + rate * count * interval // 3600
+
+
+def test_steady_discharge():
+    estimator = time_estimator.RateEstimator(SIZE)
+    add_samples(estimator, DISCHARGING, 1000, 20, 50000000, -RATE, power=RATE // 2)
+    assert estimator.slope() == pytest.approx(-RATE)
+    # slope wins over instantaneous power
+    assert estimator.power(True) == pytest.approx(RATE)
+
+
+def test_full_buffer_keeps_rate():
+    estimator = time_estimator.RateEstimator(SIZE)
+    add_samples(estimator, DISCHARGING, 1000, SIZE * 5, 50000000, -RATE)
+    assert estimator.slope() == pytest.approx(-RATE)
+
+
+def test_too_few_samples_use_power_now():
+    estimator = time_estimator.RateEstimator(SIZE)
+    assert estimator.power(True) == 0
+    add_samples(estimator, DISCHARGING, 1000, time_estimator.MIN_SLOPE_SAMPLES - 1, 50000000, -RATE, power=5000)
+    assert estimator.slope() is None
+    assert estimator.power(True) == 5000
+
+
+def test_too_short_span_uses_power_now():
+    estimator = time_estimator.RateEstimator(SIZE)
+    add_samples(estimator, DISCHARGING, 1000, 10, 50000000, -RATE, interval=1, power=5000)
+    assert estimator.slope() is None
+    assert estimator.power(True) == 5000
+
+
+def test_power_now_is_smoothed():
+    estimator = time_estimator.RateEstimator(SIZE)
+    estimator.add(DISCHARGING, 1000, 50000000, 1000)
+    estimator.add(DISCHARGING, 1001, 50000000, 2000)
+    assert estimator.power(True) == pytest.approx(1000 + time_estimator.POWER_SMOOTHING * 1000)
+    # unknown power_now isn't counted
+    estimator.add(DISCHARGING, 1002, 50000000, 0)
+    assert estimator.power(True) == pytest.approx(1000 + time_estimator.POWER_SMOOTHING * 1000)
+
+
+def test_ac_plugged_and_unplugged_flips_rate():
+    estimator = time_estimator.RateEstimator(SIZE)
+    now, energy = add_samples(estimator, DISCHARGING, 1000, 20, 50000000, -RATE)
+    assert estimator.slope() == pytest.approx(-RATE)
+
+    # plugged ac starts over, discharging samples aren't mixed in
+    estimator.add(CHARGING, now, energy, 7000)
+    assert estimator.slope() is None
+    assert estimator.power(False) == 7000
+    now, energy = add_samples(estimator, CHARGING, now, 20, energy, 2 * RATE)
+    assert estimator.slope() == pytest.approx(2 * RATE)
+    assert estimator.power(False) == pytest.approx(2 * RATE)
+
+    add_samples(estimator, DISCHARGING, now, 20, energy, -RATE)
+    assert estimator.slope() == pytest.approx(-RATE)
+
+
+def test_slope_against_direction_uses_power_now():
+    estimator = time_estimator.RateEstimator(SIZE)
+    # status says discharging but energy grows, e.g. driver reports status late
+    add_samples(estimator, DISCHARGING, 1000, 20, 50000000, RATE, power=5000)
+    assert estimator.slope() > 0
+    assert estimator.power(True) == 5000
+
+
+def test_outlier_step_is_damped_and_forgotten():
+    estimator = time_estimator.RateEstimator(SIZE)
+    now, energy = add_samples(estimator, DISCHARGING, 1000, SIZE, 50000000, -RATE)
+    # one wrong reading, a minute worth of energy higher, newest sample has the most weight
+    estimator.add(DISCHARGING, now, energy + RATE // 60, RATE)
+    assert abs(estimator.slope() + RATE) < 0.25 * RATE
+    # outlier leaves the buffer after SIZE more samples
+    add_samples(estimator, DISCHARGING, now + 10, SIZE, energy - 10 * RATE // 3600, -RATE)
+    assert estimator.slope() == pytest.approx(-RATE)
+
+
+def test_gap_starts_over():
+    estimator = time_estimator.RateEstimator(SIZE)
+    now, energy = add_samples(estimator, DISCHARGING, 1000, 20, 50000000, -RATE)
+    # suspended for an hour, energy kept
+    estimator.add(DISCHARGING, now + time_estimator.MAX_SAMPLE_GAP + 3600, energy, RATE)
+    assert estimator.slope() is None
@@ -0,0 +1,286 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import json
+import math
+import os
+
+# local imports
+from values import formatting, read_battery_values
+
+# format of saved health file
+HEALTH_FILE_VERSION = 1
+
+# seconds between capacity fade points, full capacity changes slowly
+FADE_SAMPLE_INTERVAL = 60 * 60
+
+# discharge sessions shorter than this many seconds aren't counted
+MIN_SESSION_LENGTH = 5 * 60
+
+# gap between samples in seconds which ends discharge session, e.g. suspend
+MAX_SESSION_GAP = 10 * 60
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+# running count, mean, variance, min and max of values in O(1) memory (Welford's algorithm)
+class RunningStats(object):
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    # sample standard deviation, 0 for less than two values
+    @property
+    def stddev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_list(self):
+        return [self.count, self.mean, self.m2, self.minimum, self.maximum]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+# running least squares line through (x, y) points in O(1) memory, Welford style co-moments
+class RunningRegression(object):
+    def __init__(self, count=0, mean_x=0.0, mean_y=0.0, m2_x=0.0, c_xy=0.0):
+        self.count = count
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.c_xy = c_xy
+
+    def add(self, x, y):
+        self.count += 1
+        delta_x = x - self.mean_x
+        self.mean_x += delta_x / self.count
+        self.mean_y += (y - self.mean_y) / self.count
+        self.m2_x += delta_x * (x - self.mean_x)
+        self.c_xy += delta_x * (y - self.mean_y)
+
+    # change of y per unit of x, None until points have different x
+    @property
+    def slope(self):
+        return self.c_xy / self.m2_x if self.m2_x > 0 else None
+
+    def to_list(self):
+        return [self.count, self.mean_x, self.mean_y, self.m2_x, self.c_xy]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+# aggregates of one battery
+class BatteryAggregates(object):
+    def __init__(self, state=None):
+        state = state or {}
+        self.first_seen = state.get('first_seen')
+        self.energy_full = state.get('energy_full', 0)
+        self.energy_full_design = state.get('energy_full_design', 0)
+        self.cycle_count = state.get('cycle_count', -1)
+        # energy which went into and out of battery in uWh, from energy_now changes
+        self.charged_energy = state.get('charged_energy', 0)
+        self.discharged_energy = state.get('discharged_energy', 0)
+        # full capacity in percent of design capacity against days since first seen
+        self.fade = RunningRegression.from_list(state.get('fade', []))
+        self.last_fade_time = state.get('last_fade_time', 0)
+        self.__last_energy = None
+
+    def add(self, battery, timestamp):
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        self.energy_full = battery.energy_full
+        if battery.energy_full_design > 0:
+            self.energy_full_design = battery.energy_full_design
+        if battery.cycle_count >= 0:
+            self.cycle_count = battery.cycle_count
+
+        if self.__last_energy is not None:
+            change = battery.energy_now - self.__last_energy
+            if change > 0:
+                self.charged_energy += change
+            else:
+                self.discharged_energy -= change
+        self.__last_energy = battery.energy_now
+
+        if self.energy_full_design > 0 and timestamp - self.last_fade_time >= FADE_SAMPLE_INTERVAL:
+            self.fade.add((timestamp - self.first_seen) / SECONDS_PER_DAY,
+                          battery.energy_full * 100.0 / self.energy_full_design)
+            self.last_fade_time = timestamp
+
+    def state(self):
+        return {'first_seen': self.first_seen,
+                'energy_full': self.energy_full,
+                'energy_full_design': self.energy_full_design,
+                'cycle_count': self.cycle_count,
+                'charged_energy': self.charged_energy,
+                'discharged_energy': self.discharged_energy,
+                'fade': self.fade.to_list(),
+                'last_fade_time': self.last_fade_time}
+
+    # derived values, None when not known
+    def report(self, timestamp):
+        full = self.energy_full_design or self.energy_full
+        fade_per_day = self.fade.slope
+        return {'energy_full': self.energy_full,
+                'energy_full_design': self.energy_full_design,
+                'health': self.energy_full * 100.0 / self.energy_full_design if self.energy_full_design else None,
+                'fade_per_year': -fade_per_day * 365 if fade_per_day is not None else None,
+                'tracked_days': (timestamp - self.first_seen) / SECONDS_PER_DAY if self.first_seen else 0,
+                'cycle_count': self.cycle_count if self.cycle_count >= 0 else None,
+                'estimated_cycles': float(self.discharged_energy) / full if full else None,
+                'charged_energy': self.charged_energy,
+                'discharged_energy': self.discharged_energy,
+                'efficiency': (float(self.discharged_energy) / self.charged_energy
+                               if self.charged_energy else None)}
+
+
+# battery health and wear tracked from sample stream, every sample costs O(1) time and memory,
+# aggregates are kept between runs in health file and report is computed from them only
+class BatteryHealth(object):
+    def __init__(self, state=None):
+        state = state or {}
+        self.batteries = dict((name, BatteryAggregates(battery_state))
+                              for name, battery_state in state.get('batteries', {}).items())
+        # average discharge power in uW and length in seconds of discharge sessions
+        self.session_power = RunningStats.from_list(state.get('session_power', []))
+        self.session_length = RunningStats.from_list(state.get('session_length', []))
+        self.updated = state.get('updated')
+        # (start time, start energy) of running discharge session
+        self.__session = None
+        self.__last_time = None
+        self.__last_energy = None
+
+    # load aggregates from health file, empty ones when it's missing or broken
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as health_file:
+                state = json.load(health_file)
+        except (IOError, ValueError):
+            return cls()
+        if not isinstance(state, dict) or state.get('version') != HEALTH_FILE_VERSION:
+            return cls()
+        return cls(state)
+
+    # count discharge session when it's long enough
+    def __end_session(self):
+        start_time, start_energy = self.__session
+        length = self.__last_time - start_time
+        if length >= MIN_SESSION_LENGTH and start_energy > self.__last_energy:
+            self.session_power.add((start_energy - self.__last_energy) * 3600.0 / length)
+            self.session_length.add(length)
+        self.__session = None
+
+    def add(self, sample):
+        if not sample.battery_present:
+            return
+        # health is kept in uWh, batteries with charge or capacity only can't be compared
+        energy_batteries = [battery for battery in sample.batteries
+                            if battery.present and battery.unit == read_battery_values.UNIT_ENERGY]
+        if not energy_batteries:
+            return
+        for battery in energy_batteries:
+            if battery.energy_full > 0:
+                if battery.name not in self.batteries:
+                    self.batteries[battery.name] = BatteryAggregates()
+                self.batteries[battery.name].add(battery, sample.timestamp)
+
+        if self.__session is not None and (not sample.is_discharging or
+                                           sample.timestamp - self.__last_time > MAX_SESSION_GAP):
+            self.__end_session()
+        if self.__session is None and sample.is_discharging:
+            self.__session = (sample.timestamp, sample.energy_now)
+        self.__last_time = sample.timestamp
+        self.__last_energy = sample.energy_now
+        self.updated = sample.timestamp
+
+    def state(self):
+        return {'version': HEALTH_FILE_VERSION,
+                'updated': self.updated,
+                'batteries': dict((name, battery.state()) for name, battery in self.batteries.items()),
+                'session_power': self.session_power.to_list(),
+                'session_length': self.session_length.to_list()}
+
+    # write aggregates to health file, running session is counted when it ends
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as health_file:
+            json.dump(self.state(), health_file, separators=(',', ':'), sort_keys=True)
+        os.rename(temporary_path, path)
+
+    # derived values of every battery and discharge sessions, as plain dict
+    def report(self):
+        timestamp = self.updated or 0
+        return {'updated': self.updated,
+                'batteries': dict((name, battery.report(timestamp)) for name, battery in self.batteries.items()),
+                'sessions': self.session_power.count,
+                'session_power': self.session_power.mean if self.session_power.count else None,
+                'session_power_stddev': self.session_power.stddev,
+                'session_power_min': self.session_power.minimum,
+                'session_power_max': self.session_power.maximum,
+                'session_length': self.session_length.mean if self.session_length.count else None}
+
+
+# report dict as text
+def format_report(report):
+    if not report['batteries']:
+        return "No battery health collected yet"
+    lines = []
+    for name in sorted(report['batteries']):
+        battery = report['batteries'][name]
+        lines.append(name)
+        if battery['health'] is not None:
+            lines.append("  capacity: %.1f Wh of %.1f Wh design (%.1f%%)"
+                         % (battery['energy_full'] / 1e6, battery['energy_full_design'] / 1e6, battery['health']))
+        else:
+            lines.append("  capacity: %.1f Wh, design capacity unknown" % (battery['energy_full'] / 1e6))
+        if battery['fade_per_year'] is not None:
+            lines.append("  capacity fade: %.1f%% per year over %.0f days"
+                         % (battery['fade_per_year'], battery['tracked_days']))
+        cycles = []
+        if battery['cycle_count'] is not None:
+            cycles.append("%d reported" % battery['cycle_count'])
+        if battery['estimated_cycles'] is not None:
+            cycles.append("%.1f estimated" % battery['estimated_cycles'])
+        if cycles:
+            lines.append("  cycles: " + ", ".join(cycles))
+        if battery['efficiency'] is not None:
+            lines.append("  energy charged: %.1f Wh, discharged: %.1f Wh (efficiency %.1f%%)"
+                         % (battery['charged_energy'] / 1e6, battery['discharged_energy'] / 1e6,
+                            battery['efficiency'] * 100))
+    if report['sessions']:
+        lines.append("discharge sessions: %d, %.1f W average (sd %.1f, %.1f-%.1f W), %s average length"
+                     % (report['sessions'], report['session_power'] / 1e6, report['session_power_stddev'] / 1e6,
+                        report['session_power_min'] / 1e6, report['session_power_max'] / 1e6,
+                        formatting.format_time(report['session_length'])))
+    return '\n'.join(lines)
@@ -0,0 +1,119 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+from collections import OrderedDict
+import string
+
+# remaining time texts kept, one per minute, a day of them
+TIME_CACHE_SIZE = 24 * 60
+
+# rendered texts kept by every template
+RENDER_CACHE_SIZE = 256
+
+# remaining time can't be calculated
+UNKNOWN_TIME = 'Unknown'
+
+
+# dict keeping only size most recently used items
+class LRUCache(object):
+    def __init__(self, size):
+        self.__size = size
+        self.__items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__items)
+
+    # value of key or None, key becomes most recently used
+    def get(self, key):
+        value = self.__items.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.__items[key] = value
+        self.hits += 1
+        return value
+
+    # store value, the least recently used item is dropped when cache is full
+    def put(self, key, value):
+        self.__items.pop(key, None)
+        if len(self.__items) >= self.__size:
+            self.__items.popitem(last=False)
+        self.__items[key] = value
+
+
+# text of whole minutes
+def _render_time(minutes):
+    if minutes == 0:
+        return 'Less then minute'
+    hours, minutes = divmod(minutes, 60)
+    if hours == 0:
+        return '%dmin' % minutes
+    if minutes == 0:
+        return '%dh' % hours
+    return '%dh %dmin' % (hours, minutes)
+
+
+_time_cache = LRUCache(TIME_CACHE_SIZE)
+
+
+# remaining time in seconds as text, e.g. '2h 1min', 'Unknown' when it's 0 or less, None or not finite
+def format_time(seconds):
+    if seconds is None or not seconds > 0:
+        return UNKNOWN_TIME
+    try:
+        minutes = int(seconds // 60)
+    except (OverflowError, ValueError):
+        return UNKNOWN_TIME
+    text = _time_cache.get(minutes)
+    if text is None:
+        text = _render_time(minutes)
+        _time_cache.put(minutes, text)
+    return text
+
+
+# str.format template parsed once, render() joins literal parts with field values and keeps
+# recently rendered texts, e.g. Template('{capacity}% {time}').render(capacity=50, time='1h')
+class Template(object):
+    def __init__(self, text):
+        self.text = text
+        # (literal text, field name or None, format spec, conversion)
+        self.__parts = tuple(string.Formatter().parse(text))
+        self.fields = tuple(field for _, field, _, _ in self.__parts if field is not None)
+        self.__cache = LRUCache(RENDER_CACHE_SIZE)
+
+    def __render(self, values):
+        parts = []
+        for literal, field, spec, conversion in self.__parts:
+            parts.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion == 'r':
+                    value = repr(value)
+                elif conversion == 's':
+                    value = str(value)
+                parts.append(format(value, spec or ''))
+        return ''.join(parts)
+
+    # text with given field values, raises KeyError when some field is missing
+    def render(self, **values):
+        key = tuple(values[field] for field in self.fields)
+        text = self.__cache.get(key)
+        if text is None:
+            text = self.__render(values)
+            self.__cache.put(key, text)
+        return text
@@ -27,9 +27,22 @@ except ImportError:
     exit(0)
 
 # local imports
-from values import internal_config
+from values import ini_config, internal_config, option_checks
 import config
 
+
+# argparse type from option check, so its message is shown for wrong value
+def argument_type(check):
+    def convert(value):
+        try:
+            return check(value)
+        except ValueError as err:
+            raise argparse.ArgumentTypeError(str(err))
+
+    convert.__name__ = check.__name__
+    return convert
+
+
 # Default values parser and command line parameters parser
 ap = argparse.ArgumentParser(usage="%(prog)s [OPTION]", description=internal_config.DESCRIPTION,
                              formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -38,9 +51,16 @@ file_group = ap.add_argument_group("File path arguments")
 battery_group = ap.add_argument_group("Battery arguments")
 sound_group = ap.add_argument_group("Sound arguments")
 notification_group = ap.add_argument_group("Notification arguments")
+stream_group = ap.add_argument_group("Stream arguments")
 
 # default options
-defaultOptions = {"debug": False,
+defaultOptions = {"config_file": config.CONFIG_FILE_PATH,
+                  "instance_command": None,
+                  "health": False,
+                  "stream": False,
+                  "stream_template": config.STREAM_TEMPLATE,
+                  "i3bar": False,
+                  "debug": False,
                   "test": False,
                   "foreground": False,
                   "more_then_one_instance": False,
@@ -52,12 +72,18 @@ defaultOptions = {"debug": False,
                   "sound_volume": config.SOUND_VOLUME,
                   "timeout": config.NOTIFICATION_TIMEOUT,
                   "battery_update_timeout": config.BATTERY_UPDATE_INTERVAL,
+                  "battery_min_update_interval": config.BATTERY_MIN_UPDATE_INTERVAL,
+                  "battery_max_update_interval": config.BATTERY_MAX_UPDATE_INTERVAL,
+                  "device_rescan_interval": config.DEVICE_RESCAN_INTERVAL,
                   "battery_low_value": config.BATTERY_LOW_LEVEL_VALUE,
                   "battery_critical_value": config.BATTERY_CRITICAL_LEVEL_VALUE,
                   "battery_minimal_value": config.BATTERY_MINIMAL_LEVEL_VALUE,
                   "minimal_battery_level_command": config.BATTERY_MINIMAL_LEVEL_COMMAND,
                   "set_no_battery_remainder": config.NO_BATTERY_REMAINDER,
-                  "disable_startup_notifications": config.DISABLE_STARTUP_NOTIFICATIONS}
+                  "disable_startup_notifications": config.DISABLE_STARTUP_NOTIFICATIONS,
+                  "use_power_supply_events": config.USE_POWER_SUPPLY_EVENTS,
+                  "record_history": config.RECORD_HISTORY,
+                  "history_file": config.HISTORY_FILE_PATH}
 
 ap.add_argument("-v", "--version",
                 action="version",
@@ -91,6 +117,71 @@ ap.add_argument("-i", "--run-more-instances",
                 default=defaultOptions['more_then_one_instance'],
                 help="run more then one instance")
 
+# config file
+file_group.add_argument("-c", "--config-file",
+                        action="store",
+                        dest="config_file",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['config_file'],
+                        help="path to ini config file, changes of thresholds, intervals, notifications and sounds "
+                             "are used by running battmon right away")
+
+# ask running instance for its status
+ap.add_argument("-q", "--query",
+                action="store_const",
+                dest="instance_command",
+                const="status",
+                default=defaultOptions['instance_command'],
+                help="print status of running instance and exit")
+
+# ask running instance for its status as json
+ap.add_argument("-j", "--json-status",
+                action="store_const",
+                dest="instance_command",
+                const="json",
+                default=defaultOptions['instance_command'],
+                help="print status of running instance as json and exit")
+
+# follow status of running instance
+ap.add_argument("-w", "--watch",
+                action="store_const",
+                dest="instance_command",
+                const="subscribe",
+                default=defaultOptions['instance_command'],
+                help="print status of running instance as json and again every time it's checked, until it stops")
+
+# ask running instance for its counters
+ap.add_argument("-ss", "--show-stats",
+                action="store_const",
+                dest="instance_command",
+                const="stats",
+                default=defaultOptions['instance_command'],
+                help="print counters of running instance as json and exit")
+
+# start or stop profiler of running instance
+ap.add_argument("-pr", "--profile",
+                action="store_const",
+                dest="instance_command",
+                const="profile",
+                default=defaultOptions['instance_command'],
+                help="start profiler of running instance, next call writes its report and stops it")
+
+# ask running instance to stop
+ap.add_argument("-k", "--kill",
+                action="store_const",
+                dest="instance_command",
+                const="stop",
+                default=defaultOptions['instance_command'],
+                help="stop running instance and exit")
+
+# print battery health, from running instance or from saved health file
+ap.add_argument("-he", "--health",
+                action="store_true",
+                dest="health",
+                default=defaultOptions['health'],
+                help="print battery health and wear and exit")
+
 # lock command setter
 file_group.add_argument("-lp", "--lock-command-path",
                         action="store",
@@ -124,6 +215,15 @@ file_group.add_argument("-sp", "--sound-file-path",
                         default=defaultOptions['sound_file'],
                         help="path to sound file")
 
+# battery history file path
+file_group.add_argument("-hp", "--history-file-path",
+                        action="store",
+                        dest="history_file",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['history_file'],
+                        help="path to battery history file")
+
 # don't play sound
 sound_group.add_argument("-ns", "--no-sound",
                          action="store_false",
@@ -132,63 +232,75 @@ sound_group.add_argument("-ns", "--no-sound",
                          help="disable sounds")
 
 
-# set sound volume level
-def set_sound_volume_level(volume_value):
-    volume_value = int(volume_value)
-    if volume_value < 1:
-        raise argparse.ArgumentError(volume_value, "Sound level must be greater then 1")
-    if volume_value > internal_config.MAX_SOUND_VOLUME_LEVEL:
-        raise argparse.ArgumentError(volume_value,
-                                     "Sound level can't be greater then %s" % internal_config.MAX_SOUND_VOLUME_LEVEL)
-    return volume_value
-
-
 # sound level volume
 sound_group.add_argument("-sl", "--set-sound-loudness",
                          dest="sound_volume",
-                         type=set_sound_volume_level,
+                         type=argument_type(option_checks.sound_volume_level),
                          metavar="<1-%d>" % internal_config.MAX_SOUND_VOLUME_LEVEL,
                          default=defaultOptions['sound_volume'],
                          help="sound volume level")
 
 
-# check if notify timeout is correct >= 0
-def set_timeout(timeout):
-    timeout = int(timeout)
-    if timeout < 0:
-        raise argparse.ArgumentError(timeout, "Notification timeout should be 0 or positive number")
-    return timeout
-
-
 # timeout
 notification_group.add_argument("-t", "--timeout",
                                 dest="timeout",
-                                type=set_timeout,
+                                type=argument_type(option_checks.notification_timeout),
                                 metavar="<SECONDS>",
                                 default=defaultOptions['timeout'],
                                 help="notification timeout (use 0 to disable)")
 
 
-# check if battery update interval is correct >= 0
-def set_battery_update_interval(update_value):
-    update_value = int(update_value)
-    if update_value <= 0:
-        raise argparse.ArgumentError(update_value, "Battery update interval should be positive number")
-    return update_value
-
-
 # battery update interval
 battery_group.add_argument("-bu", "--battery-update-interval",
                            dest="battery_update_timeout",
-                           type=set_battery_update_interval,
+                           type=argument_type(option_checks.battery_update_interval),
                            metavar="<SECONDS>",
                            default=defaultOptions['battery_update_timeout'],
-                           help="battery values update interval")
+                           help="battery values update interval, used when discharge rate is unknown")
+
+# battery minimal update interval
+battery_group.add_argument("-bn", "--battery-min-update-interval",
+                           dest="battery_min_update_interval",
+                           type=argument_type(option_checks.battery_update_interval),
+                           metavar="<SECONDS>",
+                           default=defaultOptions['battery_min_update_interval'],
+                           help="shortest adaptive battery values update interval")
+
+# battery maximal update interval
+battery_group.add_argument("-bx", "--battery-max-update-interval",
+                           dest="battery_max_update_interval",
+                           type=argument_type(option_checks.battery_update_interval),
+                           metavar="<SECONDS>",
+                           default=defaultOptions['battery_max_update_interval'],
+                           help="longest adaptive battery values update interval")
+
+
+# device rescan interval
+battery_group.add_argument("-ri", "--device-rescan-interval",
+                           dest="device_rescan_interval",
+                           type=argument_type(option_checks.device_rescan_interval),
+                           metavar="<SECONDS>",
+                           default=defaultOptions['device_rescan_interval'],
+                           help="look for added or removed batteries and ac adapters interval (use 0 to always look)")
+
+# don't listen for power supply events
+battery_group.add_argument("-ne", "--no-power-supply-events",
+                           action="store_false",
+                           dest="use_power_supply_events",
+                           default=defaultOptions['use_power_supply_events'],
+                           help="don't listen for kernel power supply events, check ac and battery every second")
+
+# record battery history
+battery_group.add_argument("-rh", "--record-history",
+                           action="store_true",
+                           dest="record_history",
+                           default=defaultOptions['record_history'],
+                           help="record battery values history to history file")
 
 # battery low level value
 battery_group.add_argument("-ll", "--low-level-value",
                            dest="battery_low_value",
-                           type=int,
+                           type=argument_type(option_checks.battery_level),
                            metavar="<1-100>",
                            default=defaultOptions['battery_low_value'],
                            help="battery low value")
@@ -196,7 +308,7 @@ battery_group.add_argument("-ll", "--low-level-value",
 # battery critical value
 battery_group.add_argument("-cl", "--critical-level-value",
                            dest="battery_critical_value",
-                           type=int,
+                           type=argument_type(option_checks.battery_level),
                            metavar="<1-100>",
                            default=defaultOptions['battery_critical_value'],
                            help="battery critical value")
@@ -204,7 +316,7 @@ battery_group.add_argument("-cl", "--critical-level-value",
 # battery minimal value
 battery_group.add_argument("-ml", "--minimal-level-value",
                            dest="battery_minimal_value",
-                           type=int,
+                           type=argument_type(option_checks.battery_level),
                            metavar="<1-100>",
                            default=defaultOptions['battery_minimal_value'],
                            help="battery minimal value")
@@ -215,24 +327,16 @@ battery_group.add_argument("-mc", "--minimal-level-command",
                            dest="minimal_battery_level_command",
                            type=str,
                            metavar="<ARG>",
-                           choices=['hibernate', 'suspend', 'poweroff'],
+                           choices=option_checks.MINIMAL_BATTERY_LEVEL_COMMANDS,
                            default=defaultOptions['minimal_battery_level_command'],
                            help='''set minimal battery value action, possible actions are: \
                                     'hibernate', 'suspend' and 'poweroff' ''')
 
 
-# set no battery notification
-def set_no_battery_remainder(remainder):
-    remainder = int(remainder)
-    if remainder < 0:
-        raise argparse.ArgumentError(remainder, "'no battery' remainder value must be greater or equal 0")
-    return remainder
-
-
 # set 'no battery' notification timeout, default 0
 notification_group.add_argument("-br", "--set_no_battery_remainder",
                                 dest="set_no_battery_remainder",
-                                type=set_no_battery_remainder,
+                                type=argument_type(option_checks.no_battery_remainder),
                                 metavar="<MINUTES>",
                                 default=defaultOptions['set_no_battery_remainder'],
                                 help="set 'no battery' remainder in minutes, 0 disables")
@@ -245,50 +349,75 @@ notification_group.add_argument("-dn", "--disable-startup-notifications",
                                 help="don't show startup notifications, like screenlock \
                                           command or minimal battery level action")
 
-# parse help
-args = ap.parse_args()
-
-
-# battery low value setter
-def check_battery_low_value(low_value):
-    low_value = int(low_value)
-    if low_value > 100 or low_value <= 0:
-        ap.error("\nLow battery level must be a positive number between 1 and 100")
-    if low_value <= args.battery_critical_value:
-        ap.error("\nLow battery level %s must be greater than %s (critical battery value)"
-                 % (args.battery_low_value, args.battery_critical_value))
-    if low_value <= args.battery_minimal_value:
-        ap.error("\nLow battery level must %s be greater than %s (minimal battery value)"
-                 % (args.battery_low_value, args.battery_minimal_value))
-
-
-# battery critical value setter
-def check_battery_critical_value(critical_value):
-    critical_value = int(critical_value)
-    if critical_value > 100 or critical_value <= 0:
-        ap.error("\nCritical battery level must be a positive number between 1 and 100")
-    if critical_value >= args.battery_low_value:
-        ap.error("\nCritical battery level %s must be smaller than %s (low battery value)"
-                 % (args.battery_critical_value, args.battery_low_value))
-    if critical_value <= args.battery_minimal_value:
-        ap.error("\nCritical battery level %s must be greater than %s (minimal battery value)"
-                 % (args.battery_low_value, args.battery_minimal_value))
-
-
-# battery minimal value setter
-def check_battery_minimal_value(minimal_value):
-    minimal_value = int(minimal_value)
-    if minimal_value > 100 or minimal_value <= 0:
-        ap.error("\nMinimal battery level must be a positive number between 1 and 100")
-    if minimal_value >= args.battery_low_value:
-        ap.error("\nEMinimal battery level %s must be smaller than %s (low battery value)"
-                 % (args.battery_minimal_value, args.battery_low_value))
-    if minimal_value >= args.battery_critical_value:
-        ap.error("\nMinimal battery level %s must be smaller than %s (critical battery value)"
-                 % (args.battery_minimal_value, args.battery_critical_value))
-
-
-# check battery arguments
-check_battery_low_value(args.battery_low_value)
-check_battery_critical_value(args.battery_critical_value)
-check_battery_minimal_value(args.battery_minimal_value)
+# stream mode, write status lines to stdout instead of monitoring
+stream_group.add_argument("-s", "--stream",
+                          action="store_true",
+                          dest="stream",
+                          default=defaultOptions['stream'],
+                          help="write battery status line to stdout every time it changes, e.g. for lemonbar, "
+                               "xmobar or dzen2")
+
+# stream template
+stream_group.add_argument("-st", "--stream-template",
+                          action="store",
+                          dest="stream_template",
+                          type=str,
+                          metavar="<TEMPLATE>",
+                          default=defaultOptions['stream_template'],
+                          help="status line template, fields are: {capacity}, {status}, {time}, {power}, {source}")
+
+# i3bar protocol
+stream_group.add_argument("-ib", "--i3bar",
+                          action="store_true",
+                          dest="i3bar",
+                          default=defaultOptions['i3bar'],
+                          help="write status lines using i3bar json protocol, implies --stream")
+
+# options given in command line, {option name: value}, argparse doesn't set defaults of options
+# which are already in namespace, so the ones still holding _NOT_GIVEN weren't given
+_NOT_GIVEN = object()
+
+
+def command_line_options(argv=None):
+    namespace = ap.parse_args(argv, argparse.Namespace(**dict.fromkeys(defaultOptions, _NOT_GIVEN)))
+    return dict((name, value) for name, value in vars(namespace).items() if value is not _NOT_GIVEN)
+
+
+# defaults, then options from config file, then options given in command line, values are checked already
+def merge_options(config_options, command_line):
+    options = dict(defaultOptions)
+    options.update(config_options)
+    options.update(command_line)
+    return options
+
+
+# parse and check command line arguments, argv defaults to sys.argv, options from config file
+# are used when they aren't given in command line, options given in command line are kept
+# in 'command_line_options', so running monitor can merge them with changed config file again,
+# instance commands and health report don't read config file, so broken one doesn't stop them
+def parse_args(argv=None):
+    command_line = command_line_options(argv)
+    if command_line.get('instance_command') or command_line.get('health'):
+        args = argparse.Namespace(**merge_options({}, command_line))
+        args.command_line_options = command_line
+        return args
+    config_file = command_line.get('config_file', defaultOptions['config_file'])
+    options, errors = ini_config.read_config_file(config_file)
+    for error in errors:
+        ap.error("\nWrong config file '%s': %s" % (config_file, error))
+    args = argparse.Namespace(**merge_options(options, command_line))
+    args.command_line_options = command_line
+
+    # check battery arguments
+    for error in option_checks.check_options(vars(args)):
+        ap.error("\n" + error)
+
+    # check stream arguments
+    if args.i3bar:
+        args.stream = True
+    if args.stream:
+        from monitor import status_stream
+
+        for error in status_stream.check_template(args.stream_template):
+            ap.error("\nWrong stream template '%s': %s" % (args.stream_template, error))
+    return args
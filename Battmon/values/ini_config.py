@@ -0,0 +1,166 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import errno
+import os
+import struct
+
+try:
+    import configparser
+except ImportError:
+    import ConfigParser as configparser
+
+# local imports
+from values import option_checks
+
+# ini section with options, keys are named like long command line options, switches take yes or no, e.g.
+#   [battmon]
+#   low-level-value = 20
+#   play-sound = no
+SECTION = 'battmon'
+
+# config file key -> (option name, value check)
+OPTIONS = {
+    'lock-command-path': ('lock_command', option_checks.text),
+    'disable-notifications': ('disable_notifications', option_checks.boolean),
+    'critical-notifications': ('critical', option_checks.boolean),
+    'sound-file-path': ('sound_file', option_checks.text),
+    'play-sound': ('play_sound', option_checks.boolean),
+    'set-sound-loudness': ('sound_volume', option_checks.sound_volume_level),
+    'timeout': ('timeout', option_checks.notification_timeout),
+    'battery-update-interval': ('battery_update_timeout', option_checks.battery_update_interval),
+    'battery-min-update-interval': ('battery_min_update_interval', option_checks.battery_update_interval),
+    'battery-max-update-interval': ('battery_max_update_interval', option_checks.battery_update_interval),
+    'device-rescan-interval': ('device_rescan_interval', option_checks.device_rescan_interval),
+    'power-supply-events': ('use_power_supply_events', option_checks.boolean),
+    'record-history': ('record_history', option_checks.boolean),
+    'history-file-path': ('history_file', option_checks.text),
+    'low-level-value': ('battery_low_value', option_checks.battery_level),
+    'critical-level-value': ('battery_critical_value', option_checks.battery_level),
+    'minimal-level-value': ('battery_minimal_value', option_checks.battery_level),
+    'minimal-level-command': ('minimal_battery_level_command', option_checks.minimal_battery_level_command),
+    'set_no_battery_remainder': ('set_no_battery_remainder', option_checks.no_battery_remainder),
+    'disable-startup-notifications': ('disable_startup_notifications', option_checks.boolean),
+}
+
+# options running monitor takes over from changed config file, others are used after restart
+RELOADABLE_OPTIONS = frozenset(['disable_notifications', 'critical', 'sound_file', 'play_sound', 'sound_volume',
+                                'timeout', 'battery_update_timeout', 'battery_min_update_interval',
+                                'battery_max_update_interval', 'battery_low_value', 'battery_critical_value',
+                                'battery_minimal_value', 'set_no_battery_remainder'])
+
+# options holding file paths, relative ones are relative to directory of config file
+PATH_OPTIONS = frozenset(['sound_file', 'history_file'])
+
+# inotify flags, see inotify(7)
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+
+# file is written or replaced by editor (moved over or deleted and created again)
+WATCHED_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event without name
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+# read config file, return (options, errors), options are {option name: checked value} of keys found
+# in file, missing file is empty config, paths are absolute
+def read_config_file(path):
+    options = {}
+    errors = []
+    parser = configparser.RawConfigParser()
+    try:
+        if not parser.read(path):
+            return options, errors
+    except configparser.Error as err:
+        return options, [str(err).strip()]
+    if not parser.has_section(SECTION):
+        return options, ["no [%s] section" % SECTION]
+    for key, value in parser.items(SECTION):
+        if key not in OPTIONS:
+            errors.append("unknown option '%s'" % key)
+            continue
+        name, check = OPTIONS[key]
+        try:
+            options[name] = check(value.strip())
+        except ValueError as err:
+            errors.append("%s: %s" % (key, err))
+            continue
+        if name in PATH_OPTIONS:
+            options[name] = os.path.join(os.path.dirname(os.path.abspath(path)), os.path.expanduser(options[name]))
+    return options, errors
+
+
+# watch config file with inotify, the directory is watched, so editors replacing file are noticed too
+class ConfigWatcher(object):
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        self.path = path
+        self.__name = os.path.basename(path).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(path))
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.__fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if libc.inotify_add_watch(self.__fd, directory.encode('utf-8'), WATCHED_EVENTS) < 0:
+            error = ctypes.get_errno()
+            os.close(self.__fd)
+            raise OSError(error, os.strerror(error))
+
+    # open watcher, return None when config file doesn't exist or inotify isn't available
+    @classmethod
+    def open(cls, path):
+        if not os.path.isfile(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, AttributeError) as err:
+            print("Can't watch config file '%s', changes are used after restart: %s" % (path, err))
+            return None
+
+    # inotify file descriptor for select()
+    def fileno(self):
+        return self.__fd
+
+    # read all pending events, return True when some of them was about config file
+    def read_events(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self.__fd, 4096)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name == self.__name and mask & WATCHED_EVENTS:
+                    changed = True
+        return changed
+
+    def close(self):
+        os.close(self.__fd)
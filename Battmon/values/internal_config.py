@@ -36,6 +36,29 @@ EPILOG = ('If you want change default screenlock command, edit DEFAULT_SCREEN_LO
 # get Battmon root directory
 PROGRAM_PATH, n = os.path.split(os.path.dirname(os.path.realpath(__file__)))
 
+# directory for battery history and other state kept between runs
+STATE_PATH = os.path.join(os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state"), PROGRAM_NAME)
+DEFAULT_HISTORY_FILE_PATH = os.path.join(STATE_PATH, "history.bin")
+
+# battery health aggregates, saved every HEALTH_SAVE_INTERVAL seconds and at exit
+HEALTH_FILE_PATH = os.path.join(STATE_PATH, "health.json")
+HEALTH_SAVE_INTERVAL = 30 * 60
+
+# config file watched for changes
+CONFIG_PATH = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), PROGRAM_NAME)
+DEFAULT_CONFIG_FILE_PATH = os.path.join(CONFIG_PATH, "battmon.ini")
+
+# log and pid file of program running in background
+LOG_FILE_PATH = os.path.join(STATE_PATH, "battmon.log")
+PID_FILE_PATH = os.path.join(STATE_PATH, "battmon.pid")
+
+# directory for caches which can be removed any time
+CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), PROGRAM_NAME)
+PROGRAM_INDEX_CACHE_FILE = os.path.join(CACHE_PATH, "programs.json")
+
+# profiler report written after second SIGUSR1, %d is process id
+PROFILE_FILE_PATH = os.path.join(STATE_PATH, "profile-%d.txt")
+
 # path's for external things
 DEFAULT_EXTRA_PROGRAMS_PATH = ":".join(['/usr/bin/',
                                         '/usr/local/bin/',
@@ -48,10 +71,16 @@ DEFAULT_EXTRA_PROGRAMS_PATH = ":".join(['/usr/bin/',
                                         PROGRAM_PATH + "/bin/"])
 EXTRA_PROGRAMS_PATH = os.environ.get("PATH", DEFAULT_EXTRA_PROGRAMS_PATH).split(":")
 
-# default play command
-DEFAULT_PLAYER_COMMAND = ['paplay', 'play']
+# sound players in order of preference, sound is streamed to them over a pipe
+DEFAULT_PLAYER_COMMAND = ['pacat', 'paplay', 'play', 'aplay']
 MAX_SOUND_VOLUME_LEVEL = 17
 DEFAULT_SOUND_FILE_PATH = PROGRAM_PATH + "/sounds/info.wav"
 
 # screenlock commands first found in this list will be used as default
 SCREEN_LOCK_COMMANDS = ['i3lock -c 000000', 'xlock', 'xtrlock -b', 'xscreensaver-command -lock']
+
+# seconds after which power supply devices are discovered again
+DEFAULT_DEVICE_RESCAN_INTERVAL = 60
+
+# samples used to smooth battery charge/discharge rate
+RATE_ESTIMATOR_SAMPLES = 30
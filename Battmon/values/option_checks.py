@@ -0,0 +1,119 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# local imports
+from values import internal_config
+
+# possible minimal battery level commands
+MINIMAL_BATTERY_LEVEL_COMMANDS = ('hibernate', 'suspend', 'poweroff')
+
+# words accepted as boolean values in config file
+_TRUE_WORDS = ('1', 'yes', 'true', 'on')
+_FALSE_WORDS = ('0', 'no', 'false', 'off')
+
+
+# rules shared by command line and config file, every check converts value and raises ValueError
+# with message when it's wrong
+def sound_volume_level(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError("Sound level must be greater then 1")
+    if value > internal_config.MAX_SOUND_VOLUME_LEVEL:
+        raise ValueError("Sound level can't be greater then %s" % internal_config.MAX_SOUND_VOLUME_LEVEL)
+    return value
+
+
+# notification timeout >= 0
+def notification_timeout(value):
+    value = int(value)
+    if value < 0:
+        raise ValueError("Notification timeout should be 0 or positive number")
+    return value
+
+
+# battery update interval > 0
+def battery_update_interval(value):
+    value = int(value)
+    if value <= 0:
+        raise ValueError("Battery update interval should be positive number")
+    return value
+
+
+# device rescan interval >= 0
+def device_rescan_interval(value):
+    value = int(value)
+    if value < 0:
+        raise ValueError("Device rescan interval should be 0 or positive number")
+    return value
+
+
+# 'no battery' remainder >= 0
+def no_battery_remainder(value):
+    value = int(value)
+    if value < 0:
+        raise ValueError("'no battery' remainder value must be greater or equal 0")
+    return value
+
+
+# battery level in percent
+def battery_level(value):
+    value = int(value)
+    if value > 100 or value <= 0:
+        raise ValueError("Battery level must be a positive number between 1 and 100")
+    return value
+
+
+def minimal_battery_level_command(value):
+    if value not in MINIMAL_BATTERY_LEVEL_COMMANDS:
+        raise ValueError("Minimal battery level command must be one of: %s"
+                         % ', '.join(MINIMAL_BATTERY_LEVEL_COMMANDS))
+    return value
+
+
+def boolean(value):
+    if isinstance(value, bool):
+        return value
+    if value.lower() in _TRUE_WORDS:
+        return True
+    if value.lower() in _FALSE_WORDS:
+        return False
+    raise ValueError("'%s' isn't a boolean, use yes or no" % value)
+
+
+def text(value):
+    return str(value)
+
+
+# check options depending on each other, options is dict with battery levels and update intervals,
+# return list of error messages
+def check_options(options):
+    errors = []
+    low_value = options['battery_low_value']
+    critical_value = options['battery_critical_value']
+    minimal_value = options['battery_minimal_value']
+    if low_value <= critical_value:
+        errors.append("Low battery level %s must be greater than %s (critical battery value)"
+                      % (low_value, critical_value))
+    if low_value <= minimal_value:
+        errors.append("Low battery level %s must be greater than %s (minimal battery value)"
+                      % (low_value, minimal_value))
+    if critical_value <= minimal_value:
+        errors.append("Critical battery level %s must be greater than %s (minimal battery value)"
+                      % (critical_value, minimal_value))
+    if options['battery_min_update_interval'] > options['battery_max_update_interval']:
+        errors.append("Battery min update interval %s must be smaller or equal than %s (max update interval)"
+                      % (options['battery_min_update_interval'], options['battery_max_update_interval']))
+    return errors
@@ -0,0 +1,122 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+from collections import namedtuple
+import csv
+import errno
+import os
+
+# local imports
+from values import battery_history
+
+# kernel power supply class directory
+SYSFS_PATH = "/sys/class/power_supply"
+
+# columns of csv trace, first line of file is header with these names
+TRACE_FIELDS = ('timestamp', 'energy_now', 'energy_full', 'power_now', 'status', 'ac_present')
+
+
+# power supply devices in sysfs like directory, every device is directory with 'type' and 'uevent' files,
+# other directory with the same layout can be used as fake sysfs
+class SysfsSource(object):
+    def __init__(self, path=SYSFS_PATH):
+        self.path = path
+
+    # sorted device ids
+    def devices(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(os.path.join(self.path, name) for name in names)
+
+    # content of device file, raises IOError when it can't be read
+    def read(self, device, name):
+        with open(os.path.join(device, name)) as value:
+            return value.read()
+
+
+# power supply devices kept in memory, e.g. for simulation and replay
+class FakeSource(object):
+    def __init__(self):
+        # device id -> {file name: content}
+        self.__devices = {}
+
+    # add or change device, values are uevent values without 'POWER_SUPPLY_' prefix, e.g. {'ONLINE': 1}
+    def set_device(self, device, device_type, values):
+        uevent = ''.join('POWER_SUPPLY_%s=%s\n' % (key, value) for key, value in sorted(values.items()))
+        self.__devices[device] = {'type': device_type + '\n', 'uevent': uevent}
+
+    def remove_device(self, device):
+        self.__devices.pop(device, None)
+
+    def devices(self):
+        return sorted(self.__devices)
+
+    def read(self, device, name):
+        try:
+            return self.__devices[device][name]
+        except KeyError:
+            raise IOError(errno.ENOENT, "No such file or directory", os.path.join(device, name))
+
+
+# one recorded battery sample
+class TraceRecord(namedtuple('TraceRecord', TRACE_FIELDS)):
+    __slots__ = ()
+
+    # uevent values of battery
+    def battery_values(self):
+        return {'PRESENT': 1, 'STATUS': self.status, 'ENERGY_NOW': self.energy_now,
+                'ENERGY_FULL': self.energy_full, 'POWER_NOW': self.power_now}
+
+    # uevent values of ac adapter
+    def ac_values(self):
+        return {'ONLINE': 1 if self.ac_present else 0}
+
+
+# records from csv file with TRACE_FIELDS header
+def _read_csv_trace(path):
+    records = []
+    with open(path) as trace:
+        for row in csv.DictReader(trace):
+            records.append(TraceRecord(float(row['timestamp']), int(row['energy_now']), int(row['energy_full']),
+                                       int(row['power_now']), row['status'],
+                                       row['ac_present'].strip().lower() in ('1', 'true', 'yes')))
+    return records
+
+
+# records from battery history file, it doesn't keep full energy, so the highest energy is used
+# when it isn't given
+def _read_history_trace(path, energy_full=None):
+    history = battery_history.BatteryHistory(path, writable=False)
+    try:
+        columns = history.read_columns()
+    finally:
+        history.close()
+    if energy_full is None:
+        energy_full = max(columns.energy_now or [0])
+    return [TraceRecord(timestamp, energy_now, energy_full, power_now,
+                        battery_history.STATUS_NAMES.get(status, 'Unknown'), bool(ac_present))
+            for timestamp, energy_now, power_now, status, ac_present in zip(*columns)]
+
+
+# read recorded trace, battery history file or csv file
+def read_trace(path, energy_full=None):
+    with open(path, 'rb') as trace:
+        magic = trace.read(len(battery_history.MAGIC))
+    if magic == battery_history.MAGIC:
+        return _read_history_trace(path, energy_full)
+    return _read_csv_trace(path)
@@ -0,0 +1,123 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import json
+import os
+
+# local imports
+from values import internal_config
+
+# cache file format, bump when its content changes
+CACHE_VERSION = 3
+
+
+# directory modification time, None when directory can't be read
+def _mtime(directory):
+    try:
+        return os.stat(directory).st_mtime
+    except OSError:
+        return None
+
+
+# names of all entries in directory, one getdents() without stat() of every entry
+def _list_names(directory):
+    try:
+        return os.listdir(directory)
+    except OSError:
+        return []
+
+
+# executable regular file (or link to it)
+def _is_program(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+# index of names found in path directories, every directory is listed once and index is kept in cache file,
+# cache is used as long as path and modification times of its directories are the same, so usual start
+# takes one stat() per directory instead of one per looked up program and directory, only names
+# which are looked up are checked to be executable files
+class ProgramIndex(object):
+    def __init__(self, path=internal_config.EXTRA_PROGRAMS_PATH,
+                 cache_file=internal_config.PROGRAM_INDEX_CACHE_FILE):
+        self.__path = [directory for directory in path if directory]
+        self.__cache_file = cache_file
+        # name -> indexes of path directories holding it, in path order
+        self.__names = {}
+        # name -> full path of program or None, for names already looked up
+        self.__found = {}
+        # index was read from cache file
+        self.from_cache = False
+        self.__load()
+
+    # read cache file, build index again if it's missing or outdated
+    def __load(self):
+        directories = [[directory, _mtime(directory)] for directory in self.__path]
+        if self.__cache_file:
+            try:
+                with open(self.__cache_file) as cache:
+                    data = json.load(cache)
+                if data.get('version') == CACHE_VERSION and data.get('directories') == directories:
+                    self.__names = data['names']
+                    self.from_cache = True
+                    return
+            except (IOError, OSError, ValueError, KeyError, AttributeError):
+                pass
+
+        for index, (directory, mtime) in enumerate(directories):
+            if mtime is None:
+                continue
+            for name in _list_names(directory):
+                self.__names.setdefault(name, []).append(index)
+        self.__save(directories)
+
+    # write cache file, index is still usable when it can't be written
+    def __save(self, directories):
+        if not self.__cache_file:
+            return
+        try:
+            directory = os.path.dirname(self.__cache_file)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            temporary_file = "%s.%d" % (self.__cache_file, os.getpid())
+            with open(temporary_file, 'w') as cache:
+                json.dump({'version': CACHE_VERSION, 'directories': directories, 'names': self.__names},
+                          cache, separators=(',', ':'))
+            os.rename(temporary_file, self.__cache_file)
+        except (IOError, OSError) as err:
+            print("Error: can't write programs cache: " + str(err))
+
+    # full path of program, None when it wasn't found, first executable one in path wins, like in shell
+    def find(self, program_name):
+        if program_name not in self.__found:
+            self.__found[program_name] = None
+            for index in self.__names.get(program_name, ()):
+                path = os.path.join(self.__path[index], program_name)
+                if _is_program(path):
+                    self.__found[program_name] = path
+                    break
+        return self.__found[program_name]
+
+    # find directories again, e.g. after program was installed
+    def rebuild(self):
+        self.__names = {}
+        self.__found = {}
+        self.from_cache = False
+        if self.__cache_file:
+            try:
+                os.remove(self.__cache_file)
+            except OSError:
+                pass
+        self.__load()
@@ -14,147 +14,316 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-import glob
+from collections import namedtuple
+import os
 import sys
+import time
 
+# local imports
+from values import formatting, internal_config, power_supply_sources, time_estimator
 
-# battery values class
-class BatteryValues(object):
-    def __init__(self):
-        self.__find_battery_and_ac()
+# monotonic clock if available, rescan timer shouldn't jump with wall clock changes
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+# convert remaining time in seconds to text
+def convert_time(battery_time):
+    return formatting.format_time(battery_time)
+
+
+# units of battery energy values, energy in uWh and power in uW, charge in uAh and current in uA
+# when voltage isn't known, no unit when battery tells only capacity in percent
+UNIT_ENERGY = 'uWh'
+UNIT_CHARGE = 'uAh'
+UNIT_NONE = ''
+
+
+# values of one battery taken at one moment, energy values are in unit, 0 without unit,
+# energy_full_design is 0 and cycle_count -1 when unknown
+class BatteryDetail(namedtuple('BatteryDetail', ['name', 'present', 'status', 'unit', 'energy_now', 'energy_full',
+                                                 'power_now', 'capacity', 'energy_full_design', 'cycle_count'])):
+    __slots__ = ()
+
+
+# immutable snapshot of all battery and ac values taken at one moment, batteries holds BatteryDetail of each
+# of them, energy values are sums over present batteries with energy in uWh (or in uAh when none has it),
+# capacity combines them with percentages of the other batteries, average_power is smoothed power_now,
+# remaining_time is in seconds calculated from summed energy and average_power, -1 when unknown
+class BatterySample(namedtuple('BatterySample', ['timestamp', 'battery_present', 'ac_present', 'status',
+                                                 'energy_now', 'energy_full', 'power_now', 'average_power',
+                                                 'capacity', 'remaining_time', 'batteries'])):
+    __slots__ = ()
+
+    # battery is discharging
+    @property
+    def is_discharging(self):
+        return self.battery_present and not self.ac_present and self.status.find("Discharging") != -1
+
+    # battery is fully charged
+    @property
+    def is_fully_charged(self):
+        return self.battery_present and self.capacity >= 99
+
+    # remaining time as text, 'Unknown' when it can't be calculated
+    @property
+    def battery_time(self):
+        return convert_time(self.remaining_time)
+
+    # plain values, e.g. for json
+    def as_dict(self):
+        values = self._asdict()
+        values['batteries'] = [battery._asdict() for battery in self.batteries]
+        values['battery_time'] = self.battery_time
+        return values
+
+
+# one status for all batteries, discharging or charging battery wins over idle ones
+def combined_status(statuses):
+    for status in ('Discharging', 'Charging'):
+        if status in statuses:
+            return status
+    if statuses and all(status == 'Full' for status in statuses):
+        return 'Full'
+    return statuses[0] if statuses else ''
+
+
+# how to get energy and power of one battery, resolved once from keys found in its uevent file,
+# charge and current are turned into energy and power with voltage when it's known
+class BatterySource(namedtuple('BatterySource', ['name', 'now_key', 'full_key', 'rate_key',
+                                                 'energy_voltage_key', 'rate_voltage_key', 'design_key'])):
+    __slots__ = ()
 
-    __path = "/sys/class/power_supply/*/"
-    __battery_path = ''
-    __ac_path = ''
-    __is_battery_found = False
-    __is_ac_found = False
+    # unit of energy values
+    @property
+    def unit(self):
+        if self.name == 'capacity':
+            return UNIT_NONE
+        if self.name == 'charge' and not self.energy_voltage_key:
+            return UNIT_CHARGE
+        return UNIT_ENERGY
+
+    # return (energy_now, energy_full, power_now, energy_full_design, capacity) from uevent values
+    def read(self, values):
+        if self.name == 'capacity':
+            return 0, 0, 0, 0, int(values.get(self.now_key) or 0)
+        energy_now = int(values.get(self.now_key) or 0)
+        energy_full = int(values.get(self.full_key) or 0)
+        capacity = int(energy_now * 100 // energy_full) if energy_full > 0 else 0
+        power_now = abs(int(values.get(self.rate_key) or 0)) if self.rate_key else 0
+        energy_full_design = int(values.get(self.design_key) or 0) if self.design_key else 0
+        if self.energy_voltage_key:
+            voltage = int(values.get(self.energy_voltage_key) or 0)
+            energy_now = energy_now * voltage // 1000000
+            energy_full = energy_full * voltage // 1000000
+            energy_full_design = energy_full_design * voltage // 1000000
+        if self.rate_voltage_key:
+            power_now = power_now * int(values.get(self.rate_voltage_key) or 0) // 1000000
+        return energy_now, energy_full, power_now, energy_full_design, capacity
+
+
+# find best battery values source: energy_* files, charge_* files or only capacity in percent,
+# None when battery isn't present and its values are unknown
+def find_battery_source(values):
+    voltage_key = 'VOLTAGE_NOW' if 'VOLTAGE_NOW' in values else None
+    if 'ENERGY_NOW' in values and 'ENERGY_FULL' in values:
+        design_key = 'ENERGY_FULL_DESIGN' if 'ENERGY_FULL_DESIGN' in values else None
+        if 'POWER_NOW' in values:
+            return BatterySource('energy', 'ENERGY_NOW', 'ENERGY_FULL', 'POWER_NOW', None, None, design_key)
+        if 'CURRENT_NOW' in values and voltage_key:
+            return BatterySource('energy', 'ENERGY_NOW', 'ENERGY_FULL', 'CURRENT_NOW', None, voltage_key, design_key)
+        return BatterySource('energy', 'ENERGY_NOW', 'ENERGY_FULL', None, None, None, design_key)
+    if 'CHARGE_NOW' in values and 'CHARGE_FULL' in values:
+        rate_key = 'CURRENT_NOW' if 'CURRENT_NOW' in values else None
+        design_key = 'CHARGE_FULL_DESIGN' if 'CHARGE_FULL_DESIGN' in values else None
+        return BatterySource('charge', 'CHARGE_NOW', 'CHARGE_FULL', rate_key, voltage_key,
+                             voltage_key if rate_key else None, design_key)
+    if 'CAPACITY' in values:
+        return BatterySource('capacity', 'CAPACITY', None, None, None, None, None)
+    return None
+
+
+# battery values class, devices are read from source (sysfs by default, see power_supply_sources),
+# clock is function returning current time in seconds, e.g. simulated clock
+class BatteryValues(object):
+    def __init__(self, rescan_interval=internal_config.DEFAULT_DEVICE_RESCAN_INTERVAL, source=None, clock=None):
+        self.__source = source or power_supply_sources.SysfsSource()
+        self.__clock = clock or time.time
+        self.__monotonic = clock or _monotonic
+        # seconds after cached devices are discovered again, 0 rescans on every query
+        self.__rescan_interval = rescan_interval
+        self.__battery_paths = ()
+        self.__ac_paths = ()
+        # battery path -> BatterySource
+        self.__battery_sources = {}
+        # number of device file reads and device discoveries
+        self.reads = 0
+        self.rescans = 0
+        self.__last_scan_time = 0
+        self.__devices_stale = True
+        self.__update_devices()
+        # smoothed charge/discharge rate
+        self.__rate_estimator = time_estimator.RateEstimator(internal_config.RATE_ESTIMATOR_SAMPLES)
 
     # get battery, ac values status
-    def __get_value(self, v):
+    def __get_value(self, device_path, name):
+        self.reads += 1
         try:
-            with open(v) as value:
-                return value.read().strip()
+            return self.__source.read(device_path, name).strip()
         except IOError as ioerr:
             print('Error: ' + str(ioerr))
+            # cached device is gone (unplugged), find devices again on next query
+            self.__devices_stale = True
             return ''
 
-    # convert remaining time
-    def __convert_time(self, battery_time):
-        if battery_time <= 0:
-            return 'Unknown'
-
-        minutes = battery_time // 60
-        hours = minutes // 60
-        minutes %= 60
-
-        if hours == 0 and minutes == 0:
-            return 'Less then minute'
-        elif hours == 0 and minutes > 1:
-            return '%smin' % minutes
-        elif hours >= 1 and minutes == 0:
-            return '%sh' % hours
-        elif hours >= 1 and minutes > 1:
-            return '%sh %smin' % (hours, minutes)
-
-    # find battery and ac-adapter
-    def __find_battery_and_ac(self):
-
-        # set values to default
-        self.__battery_path = ''
-        self.__ac_path = ''
-        self.__is_battery_found = False
-        self.__is_ac_found = False
+    # read all device values at once from uevent file, e.g. {'ENERGY_NOW': '1000', 'STATUS': 'Full'}
+    def __get_values(self, device_path):
+        values = {}
+        for line in self.__get_value(device_path, 'uevent').splitlines():
+            key, sep, value = line.partition('=')
+            if sep and key.startswith('POWER_SUPPLY_'):
+                values[key[13:]] = value
+        return values
 
-        try:
-            devices = (glob.glob(self.__path))
-        except IOError as ioe:
-            print('''Error in '__find_battery_and_ac function': find devices glob''' + str(ioe))
-            sys.exit()
+    # find all batteries and ac-adapters, peripheral batteries (mouse, keyboard) are skipped
+    def __find_battery_and_ac(self):
+        self.rescans += 1
+        battery_paths = []
+        battery_sources = {}
+        ac_paths = []
 
-        for i in devices:
+        for i in self.__source.devices():
             try:
-                with open(i + '/type') as d:
-                    d = d.read().split('\n')[0]
-                    # set battery and ac path
-                    if d == 'Battery':
-                        self.__battery_path = i
-                        self.__is_battery_found = True
-
-                    if d == 'Mains':
-                        self.__ac_path = i
-                        self.__is_ac_found = True
+                d = self.__source.read(i, 'type').split('\n')[0]
+                # set battery and ac paths
+                if d == 'Battery':
+                    values = self.__get_values(i)
+                    if values.get('SCOPE', 'System') == 'System':
+                        battery_paths.append(i)
+                        battery_sources[i] = find_battery_source(values)
+                if d == 'Mains':
+                    ac_paths.append(i)
 
             except IOError as ioe:
                 print('''Error in '__find_battery_and_ac in devices' devices iteration problem: ''' + str(ioe))
                 sys.exit()
 
-    # get battery time in seconds
-    def __get_battery_times(self):
-        bat_energy_full = 0
-        bat_energy_now = 0
-        bat_power_now = 0
-
-        # get battery values
-        if self.is_battery_present():
-            bat_energy_now = int(self.__get_value(self.__battery_path + 'energy_now'))
-            bat_energy_full = int(self.__get_value(self.__battery_path + 'energy_full'))
-            bat_power_now = int(self.__get_value(self.__battery_path + 'power_now'))
-        if bat_power_now > 0:
-            if self.is_battery_discharging():
-                remaining_time = (bat_energy_now * 60 * 60) // bat_power_now
-                return remaining_time
+        self.__battery_paths = tuple(battery_paths)
+        self.__battery_sources = battery_sources
+        self.__ac_paths = tuple(ac_paths)
+
+    # find devices only when cache is stale, rescan interval passed or device vanished
+    def __update_devices(self):
+        now = self.__monotonic()
+        if self.__devices_stale or now - self.__last_scan_time >= self.__rescan_interval:
+            self.__find_battery_and_ac()
+            self.__last_scan_time = now
+            self.__devices_stale = False
+
+    # force devices discovery on next query, e.g. after power supply was added or removed
+    def rescan(self):
+        self.__devices_stale = True
+
+    # read values of one battery
+    def __read_battery(self, battery_path):
+        battery = self.__get_values(battery_path)
+        # batteries without 'present' value are always present
+        present = battery.get('PRESENT', '1' if battery else '0').find("1") != -1
+        source = self.__battery_sources.get(battery_path)
+        if present and source is None:
+            # battery was missing when found, its values are known now
+            source = self.__battery_sources[battery_path] = find_battery_source(battery)
+        unit = UNIT_NONE
+        energy_now = energy_full = power_now = capacity = energy_full_design = 0
+        if present and source is not None:
+            unit = source.unit
+            energy_now, energy_full, power_now, energy_full_design, capacity = source.read(battery)
+        return BatteryDetail(battery.get('NAME') or os.path.basename(battery_path.rstrip('/')), present,
+                             battery.get('STATUS', ''), unit, energy_now, energy_full, power_now, capacity,
+                             energy_full_design, int(battery.get('CYCLE_COUNT') or -1))
+
+    # read every battery and ac value once and return them as one BatterySample, the sample is added
+    # to rate estimator, so take it once per tick
+    def sample(self):
+        return self.__sample(True)
+
+    # the same as sample() without adding it to rate estimator, for values needed between ticks
+    def read(self):
+        return self.__sample(False)
+
+    def __sample(self, estimate):
+        self.__update_devices()
+
+        ac_present = False
+        for ac_path in self.__ac_paths:
+            if self.__get_values(ac_path).get('ONLINE', '').find("1") != -1:
+                ac_present = True
+
+        batteries = tuple(self.__read_battery(battery_path) for battery_path in self.__battery_paths)
+        present_batteries = [battery for battery in batteries if battery.present]
+
+        battery_present = len(present_batteries) > 0
+        status = combined_status([battery.status for battery in present_batteries])
+        # energy weighted totals of batteries with the same unit, other batteries have only their capacity
+        units = set(battery.unit for battery in present_batteries)
+        unit = UNIT_ENERGY if UNIT_ENERGY in units else UNIT_CHARGE if UNIT_CHARGE in units else UNIT_NONE
+        summed_batteries = [battery for battery in present_batteries if unit and battery.unit == unit]
+        energy_now = sum(battery.energy_now for battery in summed_batteries)
+        energy_full = sum(battery.energy_full for battery in summed_batteries)
+        power_now = sum(battery.power_now for battery in summed_batteries)
+
+        # capacity of summed batteries counts once for each of them in mean with the other ones
+        capacities = [battery.capacity for battery in present_batteries if battery not in summed_batteries]
+        if energy_full > 0:
+            capacities.extend([energy_now * 100 // energy_full] * len(summed_batteries))
+        capacity = int(sum(capacities) // len(capacities)) if capacities else 0
+
+        # smoothed power, instantaneous power_now jumps with every cpu load change
+        timestamp = self.__clock()
+        discharging = not ac_present and status.find("Discharging") != -1
+        average_power = 0
+        if battery_present:
+            if estimate:
+                self.__rate_estimator.add((ac_present, discharging, unit, len(summed_batteries)), timestamp,
+                                          energy_now, power_now)
+            average_power = int(self.__rate_estimator.power(discharging))
+
+        # remaining time in seconds to empty when discharging or to full otherwise
+        remaining_time = -1
+        if battery_present and average_power > 0:
+            if discharging:
+                remaining_time = (energy_now * 60 * 60) // average_power
             else:
-                remaining_time = ((bat_energy_full - bat_energy_now) * 60 * 60) // bat_power_now
-                return remaining_time
-        else:
-            return -1
+                remaining_time = (max(0, energy_full - energy_now) * 60 * 60) // average_power
+
+        return BatterySample(timestamp, battery_present, ac_present, status, energy_now, energy_full,
+                             power_now, average_power, capacity, remaining_time, batteries)
 
     # check if battery is present
     def is_battery_present(self):
-        self.__find_battery_and_ac()
-        if self.__is_battery_found:
-            status = self.__get_value(self.__battery_path + 'present')
-            if status.find("1") != -1:
-                return True
-        else:
-            return False
+        return self.read().battery_present
 
     # check if ac is present
     def is_ac_present(self):
-        self.__find_battery_and_ac()
-        if self.__is_ac_found:
-            status = self.__get_value(self.__ac_path + 'online')
-            if status.find("1") != -1:
-                return True
-        else:
-            return False
+        return self.read().ac_present
 
     # return battery values
     def battery_time(self):
-        if self.is_battery_present():
-            return self.__convert_time(self.__get_battery_times())
+        sample = self.read()
+        if sample.battery_present:
+            return sample.battery_time
         else:
             return -1
 
     # get current battery capacity
     def battery_current_capacity(self):
-        if self.is_battery_present():
-            battery_now = float(self.__get_value(self.__battery_path + 'energy_now'))
-            battery_full = float(self.__get_value(self.__battery_path + 'energy_full'))
-            return int("%d" % (battery_now / battery_full * 100.0))
+        sample = self.read()
+        if sample.battery_present:
+            return sample.capacity
 
     # check if battery is fully charged
     def is_battery_fully_charged(self):
-        if self.is_battery_present() and self.battery_current_capacity() >= 99:
-            return True
-        else:
-            return False
+        return self.read().is_fully_charged
 
     # check if battery discharging
     def is_battery_discharging(self):
-        if self.is_battery_present() and not self.is_ac_present():
-            status = self.__get_value(self.__battery_path + 'status')
-            if status.find("Discharging") != -1:
-                return True
-        else:
-            return False
+        return self.read().is_discharging
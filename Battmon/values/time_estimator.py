@@ -0,0 +1,105 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# samples needed before least squares slope is trusted
+MIN_SLOPE_SAMPLES = 3
+
+# seconds the samples must span before least squares slope is trusted
+MIN_SLOPE_SPAN = 30
+
+# gap between samples in seconds after which old samples are dropped, e.g. after suspend
+MAX_SAMPLE_GAP = 600
+
+# weight of newest power_now in exponentially weighted average
+POWER_SMOOTHING = 0.2
+
+
+# smoothed charge/discharge rate from (timestamp, energy) samples, least squares slope over
+# a ring buffer updated in O(1) per sample, exponentially weighted power_now until the slope is known
+class RateEstimator(object):
+    def __init__(self, size):
+        self.__size = size
+        self.reset()
+
+    # forget all samples
+    def reset(self):
+        self.__times = [0.0] * self.__size
+        self.__energies = [0.0] * self.__size
+        self.__next = 0
+        self.__count = 0
+        # origin keeps sums small, so they don't lose precision
+        self.__origin = None
+        self.__sum_t = self.__sum_e = self.__sum_tt = self.__sum_te = 0.0
+        self.__last_time = None
+        self.__average_power = None
+        self.__key = None
+
+    # add sample, key changes (e.g. charging to discharging) start over
+    def add(self, key, timestamp, energy, power):
+        if key != self.__key or (self.__last_time is not None and timestamp - self.__last_time > MAX_SAMPLE_GAP):
+            self.reset()
+            self.__key = key
+            self.__origin = (timestamp, energy)
+        self.__last_time = timestamp
+
+        t = timestamp - self.__origin[0]
+        e = float(energy - self.__origin[1])
+
+        # drop oldest sample when buffer is full
+        if self.__count == self.__size:
+            old_t = self.__times[self.__next]
+            old_e = self.__energies[self.__next]
+            self.__sum_t -= old_t
+            self.__sum_e -= old_e
+            self.__sum_tt -= old_t * old_t
+            self.__sum_te -= old_t * old_e
+        else:
+            self.__count += 1
+
+        self.__times[self.__next] = t
+        self.__energies[self.__next] = e
+        self.__next = (self.__next + 1) % self.__size
+        self.__sum_t += t
+        self.__sum_e += e
+        self.__sum_tt += t * t
+        self.__sum_te += t * e
+
+        if power > 0:
+            if self.__average_power is None:
+                self.__average_power = float(power)
+            else:
+                self.__average_power += POWER_SMOOTHING * (power - self.__average_power)
+
+    # energy change per hour from least squares slope, None when not known yet
+    def slope(self):
+        n = self.__count
+        if n < MIN_SLOPE_SAMPLES:
+            return None
+        oldest = self.__times[0 if n < self.__size else self.__next]
+        newest = self.__times[(self.__next - 1) % self.__size]
+        if newest - oldest < MIN_SLOPE_SPAN:
+            return None
+        denominator = n * self.__sum_tt - self.__sum_t * self.__sum_t
+        if denominator <= 0:
+            return None
+        return (n * self.__sum_te - self.__sum_t * self.__sum_e) / denominator * 60 * 60
+
+    # smoothed power in energy units per hour, positive when charging and discharging, 0 when unknown
+    def power(self, discharging):
+        slope = self.slope()
+        if slope is not None and (slope < 0 if discharging else slope > 0):
+            return abs(slope)
+        return self.__average_power or 0